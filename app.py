@@ -24,16 +24,24 @@ from media.resources import (
     AlbumSharesResource,
     MediaShareResource,
     MediaPageViewsResource,
+    MediaSimilarResource,
+    MediaInsightsResource,
     AlbumPageViewsResource,
     PlaylistPageViewsResource,
     PopularMediaRecommendationResource,
     SimilarMediaRecommendationResource,
+    PersonalizedMediaRecommendationResource,
+    RecommendationCacheResource,
+    CounterStatsResource,
+    ExportResource,
+    SimilarMediaRecommendationBatchResource,
     PlaylistSharesResource,
     UserPlaylistResource,
     SearchResource,
     StatusResource
 )
 from mkondo import create_app, jwt, db
+from events.resources import EventListResource
 from notifications.models import Notification
 from notifications.resources import NotificationListResource, NotificationOpenedResource
 from users.models import User, ResetToken, Follower
@@ -52,6 +60,8 @@ from users.resources import (
     UserFollowerResource,
     ArtistInsightsResource,
     AudioUsersInsightsResource,
+    InsightJobListResource,
+    InsightJobResource,
     UserMediaResource,
     SimilarArtistsResource, UserSearchResource,
     VistorTokenResource
@@ -88,8 +98,15 @@ def init_app():
     api.add_resource(MediaLikResource, '/media/<string:media_id>/like')
     api.add_resource(MediaRatingResource, '/media/<string:media_id>/rating')
     api.add_resource(MediaPageViewsResource, '/media/<string:media_id>/page-views')
+    api.add_resource(MediaSimilarResource, '/media/<string:media_id>/similar')
+    api.add_resource(MediaInsightsResource, '/media/<string:media_id>/insights')
     api.add_resource(PopularMediaRecommendationResource, '/media/recommended/<string:user_id>/popular')
     api.add_resource(SimilarMediaRecommendationResource, '/media/recommended/<string:user_id>/similar')
+    api.add_resource(PersonalizedMediaRecommendationResource, '/media/recommended/<string:user_id>/personalized')
+    api.add_resource(RecommendationCacheResource, '/media/recommended/cache')
+    api.add_resource(CounterStatsResource, '/counters')
+    api.add_resource(ExportResource, '/exports/<string:table>')
+    api.add_resource(SimilarMediaRecommendationBatchResource, '/media/recommended/similar/batch')
     api.add_resource(PlaylistListResource, '/playlists')
     api.add_resource(PlaylistResource, '/playlists/<string:playlist_id>')
     api.add_resource(PlaylistPageViewsResource, '/playlists/<string:playlist_id>/page-views')
@@ -110,6 +127,9 @@ def init_app():
     api.add_resource(NotificationListResource, '/notifications')
     api.add_resource(NotificationOpenedResource, '/notifications/<string:notification_id>/opened')
     api.add_resource(AudioUsersInsightsResource, '/insights/audio/users')
+    api.add_resource(InsightJobListResource, '/insights/jobs')
+    api.add_resource(InsightJobResource, '/insights/jobs/<string:job_id>')
+    api.add_resource(EventListResource, '/events')
     api.add_resource(SearchResource, '/search')
     api.add_resource(StatusResource, '/status')
     api.add_resource(UserSearchResource, '/search/users')
@@ -0,0 +1,72 @@
+"""
+Recall and latency of MinHash/LSH similar media lookups against the exact
+SimilarityRecommender.get_similar_items.
+
+    python -m benchmarks.lsh --rows 1000000 --media 200000 --config 128:64 --config 128:128
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import generate_history
+from media.lsh import MinHashLSHIndex
+from media.recommender import SimilarityRecommender
+
+
+def similar(model, media, index=None):
+    recommended = model.get_similar_items([media], index=index)
+
+    if isinstance(recommended, int):
+        return []
+
+    return list(recommended['media_id_y'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--media', type=int, default=None)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--config', action='append', default=None,
+                        help='num_perm:bands, can be repeated (default 128:64, 128:128, 256:256)')
+    args = parser.parse_args()
+
+    history = generate_history(args.rows, media=args.media)
+    model = SimilarityRecommender()
+    model.create(history, 'user_id', 'media_id_y')
+    queries = np.random.RandomState(1).choice(model.media, size=args.queries, replace=False)
+    print(f'{len(history)} history rows, {len(model.users)} users, {len(model.media)} media')
+
+    started = time.perf_counter()
+    exact = {media: similar(model, media) for media in queries}
+    exact_latency = (time.perf_counter() - started) / len(queries)
+    print(f'exact:          {exact_latency * 1000:8.2f}ms per query')
+
+    for config in args.config or ['128:64', '128:128', '256:256']:
+        num_perm, bands = (int(value) for value in config.split(':'))
+
+        started = time.perf_counter()
+        index = MinHashLSHIndex(num_perm=num_perm, bands=bands).build(model.interactions)
+        build_time = time.perf_counter() - started
+
+        hits, total, candidates = 0, 0, 0
+        started = time.perf_counter()
+
+        for media in queries:
+            approximate = similar(model, media, index=index)
+            hits += len(set(approximate) & set(exact[media]))
+            total += len(exact[media])
+
+        latency = (time.perf_counter() - started) / len(queries)
+
+        for media in queries:
+            candidates += len(index.candidates(np.searchsorted(model.media, [media])))
+
+        print(f'lsh {num_perm:>3}:{bands:<4} recall@10 {hits / max(total, 1):.3f}  '
+              f'{latency * 1000:8.2f}ms per query  {candidates / len(queries):8.0f} candidates  '
+              f'build {build_time:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Offline benchmark and evaluation of the recommenders on synthetic history.
+
+    python -m benchmarks.recommenders --rows 10000 --rows 100000 --rows 1000000
+
+For every size it times training and per user serving, records the peak
+memory traced while training, and computes precision@10 / recall@10 on an
+80/20 held-out split. One JSON object per recommender and size is appended
+to --output so runs can be compared over time.
+"""
+import argparse
+import json
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic import generate_interactions
+from media.recommender import ImplicitALSRecommender, PopularityRecommender, SimilarityRecommender
+
+AMOUNT = 10
+
+
+def split(interactions, test_size=0.2, seed=0):
+    """
+    Hold out a random share of the events, like the old train_test_split.
+    """
+    held_out = np.random.RandomState(seed).random_sample(len(interactions)) < test_size
+
+    return interactions.subset(~held_out), interactions.subset(held_out)
+
+
+def relevant_media(test, users):
+    """
+    Map every user to the set of media positions they listened to in the test split.
+    """
+    relevant = {}
+
+    for user_code, media_code in zip(test.user_codes, test.media_codes):
+        relevant.setdefault(test.users[user_code], set()).add(test.media[media_code])
+
+    return {user: relevant.get(user, set()) for user in users}
+
+
+def precision_recall(recommended, relevant):
+    """
+    Average precision@k and recall@k over users with held-out media.
+    """
+    precisions, recalls = [], []
+
+    for user, media in recommended.items():
+        if not relevant[user]:
+            continue
+
+        hits = len(set(media[:AMOUNT]) & relevant[user])
+        precisions.append(hits / AMOUNT)
+        recalls.append(hits / len(relevant[user]))
+
+    if not precisions:
+        return 0.0, 0.0
+
+    return float(np.mean(precisions)), float(np.mean(recalls))
+
+
+def measure(fit):
+    """
+    Run fit and return (seconds, peak traced bytes).
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    fit()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def serve_popularity(model, users):
+    recommended = {}
+    started = time.perf_counter()
+
+    for user in users:
+        recommended[user] = list(model.recommend(user)[model.media_id])
+
+    return recommended, (time.perf_counter() - started) / max(len(users), 1)
+
+
+def serve_ranked(model, users):
+    recommended = {}
+    started = time.perf_counter()
+
+    for user in users:
+        recommendations = model.recommend(user)
+        recommended[user] = [] if isinstance(recommendations, int) else list(recommendations[model.media_id])
+
+    return recommended, (time.perf_counter() - started) / max(len(users), 1)
+
+
+RECOMMENDERS = {
+    'popularity': (PopularityRecommender, serve_popularity),
+    'similarity': (SimilarityRecommender, serve_ranked),
+    'als': (ImplicitALSRecommender, serve_ranked),
+}
+
+
+def evaluate(name, rows, train, test, users):
+    model_class, serve = RECOMMENDERS[name]
+    model = model_class()
+    train_seconds, train_peak = measure(lambda: model.fit(train))
+    recommended, serve_seconds = serve(model, users)
+    precision, recall = precision_recall(recommended, relevant_media(test, users))
+
+    return {
+        'recommender': name,
+        'rows': rows,
+        'train_rows': len(train),
+        'users': len(train.users),
+        'media': len(train.media),
+        'train_seconds': round(train_seconds, 4),
+        'train_peak_mb': round(train_peak / 2 ** 20, 2),
+        'serve_ms_per_user': round(serve_seconds * 1000, 3),
+        'evaluated_users': len(users),
+        f'precision@{AMOUNT}': round(precision, 4),
+        f'recall@{AMOUNT}': round(recall, 4),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, action='append', default=None,
+                        help='history size, can be repeated (default 10k, 100k and 1M, 10M is supported)')
+    parser.add_argument('--recommender', action='append', choices=sorted(RECOMMENDERS), default=None)
+    parser.add_argument('--eval-users', type=int, default=500)
+    parser.add_argument('--output', default='bench_results.jsonl')
+    args = parser.parse_args()
+
+    run = {'run_at': datetime.utcnow().isoformat(), 'revision': git_revision()}
+
+    with open(args.output, 'a') as output:
+        for rows in args.rows or [10000, 100000, 1000000]:
+            interactions = generate_interactions(rows)
+            train, test = split(interactions)
+            test_users = np.unique(test.users[test.user_codes])
+            users = np.random.RandomState(1).choice(test_users, size=min(args.eval_users, len(test_users)), replace=False)
+
+            for name in args.recommender or sorted(RECOMMENDERS):
+                result = dict(run, **evaluate(name, rows, train, test, users.tolist()))
+                output.write(json.dumps(result) + '\n')
+                output.flush()
+                print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare the sparse SimilarityRecommender against the original set based
+co-occurrence loop.
+
+    python -m benchmarks.similarity --rows 1000000
+
+The original loop re-filters the whole frame once per catalog item, so on
+large histories only ``--baseline-items`` catalog iterations are timed and
+the total is extrapolated linearly over the catalog.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import generate_history
+from media.recommender import SimilarityRecommender
+
+
+def legacy_cooccurence_matrix(train_data, user_media, all_media, user_id='user_id', media_id='media_id_y'):
+    """
+    The original per item Jaccard loop, kept as the benchmark baseline.
+    """
+    user_media_users = [
+        set(train_data[train_data[media_id] == media][user_id].unique()) for media in user_media
+    ]
+    cooccurence_matrix = np.matrix(np.zeros(shape=(len(user_media), len(all_media))), float)
+
+    for i in range(0, len(all_media)):
+        media_i_data = train_data[train_data[media_id] == all_media[i]]
+        users_i = set(media_i_data[user_id].unique())
+
+        for j in range(0, len(user_media)):
+            users_j = user_media_users[j]
+            users_intersection = users_i.intersection(users_j)
+
+            if len(users_intersection) != 0:
+                users_union = users_i.union(users_j)
+                cooccurence_matrix[j, i] = float(len(users_intersection)) / float(len(users_union))
+
+    return cooccurence_matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=None)
+    parser.add_argument('--media', type=int, default=None)
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--baseline-items', type=int, default=200)
+    parser.add_argument('--similarity', choices=('jaccard', 'cosine'), default='jaccard')
+    args = parser.parse_args()
+
+    history = generate_history(args.rows, users=args.users, media=args.media)
+    print(f'{len(history)} history rows, {history.user_id.nunique()} users, {history.media_id_y.nunique()} media')
+
+    started = time.perf_counter()
+    model = SimilarityRecommender(similarity=args.similarity)
+    model.create(history, 'user_id', 'media_id_y')
+    print(f'sparse create:          {time.perf_counter() - started:.3f}s')
+
+    query_users = np.random.RandomState(1).choice(model.users, size=args.queries, replace=False)
+
+    started = time.perf_counter()
+    for user in query_users:
+        model.recommend(user)
+    sparse_per_user = (time.perf_counter() - started) / len(query_users)
+    print(f'sparse recommend:       {sparse_per_user * 1000:.2f}ms per user')
+
+    user = query_users[0]
+    user_media = model.get_user_media(user)
+    all_media = model.get_all_media_train_data()
+    baseline_items = min(args.baseline_items, len(all_media))
+
+    started = time.perf_counter()
+    legacy_cooccurence_matrix(history, user_media, all_media[:baseline_items])
+    legacy_per_user = (time.perf_counter() - started) * len(all_media) / baseline_items
+    print(f'legacy recommend:       {legacy_per_user:.2f}s per user '
+          f'(extrapolated from {baseline_items}/{len(all_media)} items)')
+    print(f'speedup:                {legacy_per_user / sparse_per_user:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas
+
+from media.recommender import Interactions
+
+
+def generate_events(rows, users=None, media=None, clusters=50, affinity=0.8, seed=0):
+    """
+    Generate synthetic (user, media, plays) listening events as integer
+    arrays. Media popularity is long tailed (zipf like) and every user
+    belongs to a taste cluster they pick their media from with probability
+    affinity, which gives the co-listening structure similarity models rely
+    on. Repeated (user, media) pairs are dropped like the history primary
+    key, events are oversampled so roughly ``rows`` distinct pairs remain.
+    """
+    random = np.random.RandomState(seed)
+    users = users or max(rows // 20, 1)
+    media = media or max(rows // 100, 1000)
+    clusters = max(min(clusters, media), 1)
+    size = rows * 2
+
+    user_codes = random.randint(0, users, size=size)
+    media_codes = random.choice(media, size=size, p=_zipf(media))
+
+    # Media are split round robin over clusters so every cluster gets a
+    # share of the popular head. Cluster picks are re-drawn within the
+    # cluster with the same popularity skew.
+    user_clusters = user_codes % clusters
+    in_cluster = random.random_sample(size) < affinity
+    cluster_size = max(media // clusters, 1)
+    cluster_offset = random.choice(cluster_size, size=size, p=_zipf(cluster_size))
+    clustered = np.minimum(cluster_offset * clusters + user_clusters, media - 1)
+    media_codes = np.where(in_cluster, clustered, media_codes)
+
+    plays = random.geometric(0.3, size=size)
+
+    pairs = user_codes.astype(np.int64) * media + media_codes
+    _, first = np.unique(pairs, return_index=True)
+    first = np.sort(first)[:rows]
+
+    return user_codes[first], media_codes[first], plays[first]
+
+
+def generate_history(rows, users=None, media=None, clusters=50, affinity=0.8, seed=0):
+    """
+    Generate a synthetic media_user_history frame shaped like the old
+    get_train_data output, with 'media-<n>' string media ids.
+    """
+    user_codes, media_codes, plays = generate_events(rows, users, media, clusters, affinity, seed)
+
+    history = pandas.DataFrame({
+        'user_id': user_codes,
+        'media_id_y': media_codes,
+        'plays_x': plays,
+    })
+    history['media_id_y'] = 'media-' + history['media_id_y'].astype(str)
+
+    return history
+
+
+def generate_interactions(rows, users=None, media=None, clusters=50, affinity=0.8, seed=0):
+    """
+    Generate synthetic Interactions with integer user and media ids, cheap
+    enough to build for tens of millions of rows.
+    """
+    user_codes, media_codes, plays = generate_events(rows, users, media, clusters, affinity, seed)
+
+    return Interactions.from_ids(user_codes, media_codes, plays)
+
+
+def _zipf(size):
+    weights = 1.0 / np.arange(1, size + 1) ** 1.1
+
+    return weights / weights.sum()
@@ -0,0 +1,156 @@
+import logging
+from datetime import datetime, timezone
+
+from marshmallow import ValidationError
+
+from media.models import Media, Album, Playlist, ListenerSketch
+from mkondo import db, counters, recommendation_cache, write_behind, shards
+from mkondo.writebehind import apply_increments
+from users.models import User, MediaUserHistory
+from .models import PlayEvent
+from .schemas import EventSchema, EVENT_FIELDS
+
+ENTITY_MODELS = {'media': Media, 'album': Album, 'playlist': Playlist}
+
+event_schema = EventSchema()
+
+
+def ingest(events, user_id=None, user_type=None):
+    """
+    Validate and apply a batch of client events, returning a status per
+    event in request order.
+
+    Entity ids are resolved with one query per entity type and the counts
+    summed per row, so the whole batch is applied in one transaction with
+    one UPDATE per table, counter and distinct increment, plus one history
+    upsert for the plays of a signed in user and one insert into the play
+    event log. Increments of hot rows go to their counter shards. With
+    write behind counters the increments are buffered once the history and
+    log are committed.
+    """
+    results = [None] * len(events)
+    valid = {}
+
+    for index, event in enumerate(events):
+        try:
+            event = event_schema.load(event)
+        except ValidationError as e:
+            results[index] = dict(status=400, errors=e.messages)
+            continue
+
+        if event['type'] == 'like' and user_type == 'V':
+            results[index] = dict(status=403, message='Visitors can not like.')
+            continue
+
+        if EVENT_FIELDS[event['type']] not in ENTITY_MODELS[event['entity']].COUNTERS:
+            results[index] = dict(status=400, errors={'type': [f'A {event["entity"]} has no {event["type"]} counter.']})
+            continue
+
+        valid[index] = event
+
+    keys = {}
+
+    for entity, model in ENTITY_MODELS.items():
+        public_ids = {event['id'] for event in valid.values() if event['entity'] == entity}
+
+        if public_ids:
+            public_id = getattr(model, model.PUBLIC_ID)
+            category = getattr(model, 'category', db.null())
+            keys[entity] = {
+                row[0]: row[1:] for row in
+                db.session.query(public_id, model.id, model.owner_id, category).filter(public_id.in_(public_ids)).all()
+            }
+
+    user = User.query.with_entities(User.id).filter_by(user_id=user_id).first() if user_id else None
+    now = datetime.utcnow()
+    increments, sharded, plays, play_events, applied = {}, {}, {}, [], []
+
+    for index, event in valid.items():
+        model = ENTITY_MODELS[event['entity']]
+        key = keys[event['entity']].get(event['id'])
+
+        if key is None:
+            results[index] = dict(status=404, message=f'{event["entity"].capitalize()} not found')
+            continue
+
+        row_id, owner_id, category = key
+        field = EVENT_FIELDS[event['type']]
+        rollup = model.COUNTER_ROLLUPS.get(field)
+        hot = None if write_behind.enabled else shards.hot(model.__tablename__, event['id'])
+        target = sharded if hot else increments
+        rows = target.setdefault((model.__tablename__, field), {})
+        rows[row_id] = rows.get(row_id, 0) + event['count']
+
+        if rollup:
+            rows = target.setdefault((rollup[0], field), {})
+            rows[owner_id] = rows.get(owner_id, 0) + event['count']
+
+        # Client clocks are only trusted for times in the past.
+        timestamp = event['timestamp']
+
+        if timestamp is not None and timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+        event['timestamp'] = min(timestamp or now, now)
+
+        if event['type'] == 'play':
+            play_events.extend([(user.id if user else None, row_id, event['timestamp'])] * event['count'])
+
+            if user:
+                count, last_played = plays.get(row_id, (0, event['timestamp']))
+                plays[row_id] = (count + event['count'], max(last_played, event['timestamp']))
+
+        applied.append(index)
+
+    try:
+        if plays:
+            MediaUserHistory.record_plays(user.id, plays)
+
+        PlayEvent.log(play_events)
+
+        if not write_behind.enabled:
+            apply_increments(db.session, db.metadata.tables, increments)
+
+            for (table, field), rows in sharded.items():
+                for row_id, value in rows.items():
+                    shards.add(table, row_id, field, value)
+
+        db.session.commit()
+    except Exception as e:
+        logging.error(e)
+        db.session.rollback()
+
+        for index in applied:
+            results[index] = dict(status=500, message='The event could not be recorded')
+
+        return results
+
+    if write_behind.enabled:
+        # The batch is committed, so a failure here is logged rather than
+        # reported, a retry would count the history and log twice.
+        try:
+            for (table, field), rows in increments.items():
+                for row_id, value in rows.items():
+                    write_behind.add(table, row_id, field, value)
+        except Exception as e:
+            logging.error(e)
+
+    for index in applied:
+        event = valid[index]
+        model = ENTITY_MODELS[event['entity']]
+        row_id, owner_id, category = keys[event['entity']][event['id']]
+
+        if not write_behind.enabled:
+            shards.observe(model.__tablename__, event['id'], row_id, owner_id if model.COUNTER_ROLLUPS else None)
+
+        counters.add(event['entity'], event['id'], EVENT_FIELDS[event['type']], event['count'], day=event['timestamp'].date())
+
+        if event['type'] == 'play' and user:
+            ListenerSketch.record(user.id, row_id, owner_id, category, day=event['timestamp'].date())
+
+        results[index] = dict(status=202 if write_behind.enabled else 200)
+
+    if plays:
+        recommendation_cache.invalidate(user_id)
+
+    return results
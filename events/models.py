@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from mkondo import db
+
+
+class PlayEvent(db.Model):
+    """
+    Append only log of every play, the raw data for downstream aggregation.
+    Plays by visitors have no user.
+    """
+    __tablename__ = 'play_events'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    media_id = db.Column(db.Integer, db.ForeignKey('media.id', ondelete='CASCADE'), nullable=False)
+    played = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    @classmethod
+    def log(cls, events):
+        """
+        Append (user id, media id, played) events with one multi row insert,
+        the caller commits.
+        """
+        if events:
+            db.session.execute(cls.__table__.insert().values([
+                dict(user_id=user_id, media_id=media_id, played=played) for user_id, media_id, played in events
+            ]))
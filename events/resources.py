@@ -0,0 +1,34 @@
+from flask import current_app
+from flask_restful import Resource, reqparse
+from flask_jwt_extended import get_jwt_identity, get_jwt_claims
+
+from mkondo.security import authorized_users, UserType
+from .ingest import ingest
+
+
+class EventListResource(Resource):
+    parser = reqparse.RequestParser(bundle_errors=True)
+    parser.add_argument('events', type=dict, action='append', required=True, location='json')
+
+    @staticmethod
+    @authorized_users(['SA', 'A', 'C', 'U', 'V'])
+    def post():
+        json_data = EventListResource.parser.parse_args()
+        events = json_data['events']
+
+        if len(events) > current_app.config['EVENTS_MAX_BATCH']:
+            return {
+                'success': False,
+                'message': f'At most {current_app.config["EVENTS_MAX_BATCH"]} events can be sent at once'
+            }, 413
+
+        user_type = UserType(get_jwt_claims()['user_type']).name
+        results = ingest(events, user_id=get_jwt_identity(), user_type=user_type)
+        accepted = sum(result['status'] < 300 for result in results)
+
+        return {
+            'success': accepted == len(results),
+            'accepted': accepted,
+            'rejected': len(results) - accepted,
+            'events': results
+        }, 200
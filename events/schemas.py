@@ -0,0 +1,27 @@
+from marshmallow import Schema, fields, validate, validates_schema, ValidationError
+
+EVENT_FIELDS = {
+    'page_view': 'page_views',
+    'share': 'shares',
+    'like': 'likes',
+    'play': 'plays',
+}
+ENTITY_TYPES = ('media', 'album', 'playlist')
+# A user likes an entity once, like the likes endpoint counts one per request.
+SINGLE_EVENTS = ('like',)
+
+
+class EventSchema(Schema):
+    type = fields.String(required=True, validate=validate.OneOf(EVENT_FIELDS))
+    entity = fields.String(missing='media', validate=validate.OneOf(ENTITY_TYPES))
+    id = fields.String(required=True, validate=validate.Length(min=1, max=50))
+    count = fields.Integer(missing=1, validate=validate.Range(min=1, max=100))
+    timestamp = fields.DateTime(missing=None)
+
+    @validates_schema
+    def validate_counter(self, data, **kwargs):
+        if data['type'] == 'play' and data['entity'] != 'media':
+            raise ValidationError('Only media can be played.', 'type')
+
+        if data['type'] in SINGLE_EVENTS and data['count'] != 1:
+            raise ValidationError(f"The count of a {data['type']} event must be 1.", 'count')
@@ -25,5 +25,53 @@ migrate = Migrate(app=app, db=db, compare_type=True)
 manager = Manager(app=app)
 manager.add_command('db', MigrateCommand)
 
+
+@manager.command
+def train_recommender():
+  """
+  Train the recommender models and publish a new artifact version.
+  """
+  from app import init_app
+  from mkondo.tasks import train_recommender_models
+
+  with init_app().app_context():
+    print(train_recommender_models())
+
+@manager.command
+def build_geoip(csv_path):
+  """
+  Build the local GeoIP database from a start_ip,end_ip,country,region CSV.
+  """
+  from mkondo.geoip import GeoIP
+  from mkondo.settings import Config
+
+  print(GeoIP.build(csv_path, Config.GEOIP_DATABASE))
+
+@manager.command
+def export(table, path, since=None):
+  """
+  Export history, media or users to a gzip compressed CSV, incrementally
+  when since is the watermark printed by the previous export.
+  """
+  from datetime import datetime
+  from app import init_app
+  from mkondo.export import Export
+
+  with init_app().app_context():
+    table_export = Export(table, since=datetime.fromisoformat(since) if since else None)
+    rows = table_export.write(path)
+    print(f'{rows} rows, watermark {table_export.watermark.isoformat() if table_export.watermark else None}')
+
+@manager.command
+def build_listener_sketches():
+  """
+  Merge the play event log and play history into the listener sketches.
+  """
+  from app import init_app
+  from media.models import ListenerSketch
+
+  with init_app().app_context():
+    print(ListenerSketch.rebuild())
+
 if __name__ == '__main__':
   manager.run()
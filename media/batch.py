@@ -0,0 +1,32 @@
+from mkondo import artifacts
+from users.models import User
+from .recommender import SimilarityRecommender
+
+
+def recommend_similar(user_ids, amount=10, chunk_size=256):
+    """
+    Yield (user_id, media_ids) for public user ids, scored against the
+    current item similarity artifact. Ids are resolved and scored one
+    chunk at a time so memory stays bounded however many users are passed.
+    """
+    artifact = artifacts.current()
+
+    if not artifact:
+        raise LookupError('The recommendation model has not been trained yet.')
+
+    model = artifact.load(SimilarityRecommender.from_arrays, 'similarity')
+    user_ids = list(user_ids)
+
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        internal_ids = dict(
+            User.query.with_entities(User.user_id, User.id).filter(User.user_id.in_(chunk)).all()
+        )
+        recommended = dict(model.recommend_batch(
+            [internal_ids[user_id] for user_id in chunk if user_id in internal_ids],
+            amount=amount,
+            chunk_size=chunk_size
+        ))
+
+        for user_id in chunk:
+            yield user_id, recommended.get(internal_ids.get(user_id), [])
@@ -0,0 +1,122 @@
+import numpy as np
+
+
+class MinHashLSHIndex:
+    """
+    Approximate Jaccard neighbours of media from MinHash signatures of
+    their listener sets, bucketed with LSH banding.
+
+    Media sharing a bucket in any band become candidates, which are then
+    re-ranked with their exact Jaccard similarity. More bands of fewer rows
+    raise recall at the cost of more candidates: a pair with similarity s
+    becomes a candidate with probability 1 - (1 - s ** rows) ** bands.
+
+    Bucket keys carry their band number in the top byte, so all bands live
+    in a single sorted key array with the matching media positions. A
+    lookup is one binary search for every band at once, and the whole index
+    can be saved in (and memory mapped from) a recommender artifact.
+    """
+
+    PRIME = (1 << 31) - 1
+    BAND_SHIFT = np.uint64(56)
+    HASH_MASK = np.uint64((1 << 56) - 1)
+
+    def __init__(self, num_perm=128, bands=64, seed=0):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+
+        if bands > 256:
+            raise ValueError('at most 256 bands are supported')
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.seed = seed
+        self.band_hashes = None
+        self.keys = None
+        self.order = None
+
+    def build(self, interactions, chunk_size=8):
+        """
+        Build the index from a users x media listening matrix.
+        """
+        random = np.random.RandomState(self.seed)
+        a = random.randint(1, self.PRIME, size=self.num_perm).astype(np.int64)
+        b = random.randint(0, self.PRIME, size=self.num_perm).astype(np.int64)
+        coefficients = random.randint(1, 1 << 62, size=self.rows, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+
+        by_media = interactions.tocsc()
+        by_media.sort_indices()
+        listeners = np.diff(by_media.indptr)
+        listened = np.flatnonzero(listeners)
+        starts = by_media.indptr[:-1][listened]
+        users = by_media.indices.astype(np.int64)
+
+        # Min of (a * user + b) mod p over the listeners of each media, a few
+        # permutations at a time to bound the temporary users x perm arrays.
+        signatures = np.full((self.num_perm, by_media.shape[1]), self.PRIME, dtype=np.int64)
+
+        for start in range(0, self.num_perm, chunk_size):
+            stop = min(start + chunk_size, self.num_perm)
+            hashed = (a[start:stop, None] * users[None, :] + b[start:stop, None]) % self.PRIME
+
+            if len(listened):
+                signatures[start:stop, listened] = np.minimum.reduceat(hashed, starts, axis=1)
+
+        bands = signatures.reshape(self.bands, self.rows, -1).astype(np.uint64)
+        band_hashes = (bands * coefficients[None, :, None]).sum(axis=1, dtype=np.uint64) & self.HASH_MASK
+        band_hashes |= np.arange(self.bands, dtype=np.uint64)[:, None] << self.BAND_SHIFT
+
+        # Media nobody listened to are left out of the buckets entirely.
+        media_positions = np.broadcast_to(np.arange(by_media.shape[1], dtype=np.int32), band_hashes.shape)
+        bucketed = np.broadcast_to(listeners > 0, band_hashes.shape)
+        keys = band_hashes[bucketed]
+        sort = np.argsort(keys, kind='stable')
+
+        self.band_hashes = band_hashes
+        self.keys = keys[sort]
+        self.order = media_positions[bucketed][sort]
+
+        return self
+
+    def to_arrays(self):
+        """
+        Export the index as plain arrays for a recommender artifact
+        """
+        return {
+            'band_hashes': self.band_hashes,
+            'keys': self.keys,
+            'order': self.order,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, num_perm=128, bands=64, seed=0):
+        """
+        Load an index from (possibly memory mapped) artifact arrays
+        """
+        index = cls(num_perm=num_perm, bands=bands, seed=seed)
+        index.band_hashes = arrays['band_hashes']
+        index.keys = arrays['keys']
+        index.order = arrays['order']
+
+        return index
+
+    def meta(self):
+        """
+        Parameters needed to load the index back with from_arrays
+        """
+        return {'num_perm': self.num_perm, 'bands': self.bands, 'seed': self.seed}
+
+    def candidates(self, columns):
+        """
+        Return the media positions sharing at least one band bucket with
+        any of the given media positions.
+        """
+        hashes = np.asarray(self.band_hashes[:, columns]).ravel()
+        lows = np.searchsorted(self.keys, hashes, side='left')
+        lengths = np.searchsorted(self.keys, hashes, side='right') - lows
+
+        # Concatenate every [low, low + length) bucket range without a loop.
+        positions = np.arange(lengths.sum()) + np.repeat(lows - np.cumsum(lengths) + lengths, lengths)
+
+        return np.unique(self.order[positions]).astype(np.int64)
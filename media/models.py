@@ -1,8 +1,17 @@
+import math
 import uuid
+from collections import Counter
 from datetime import datetime
-from users.models import User
-from mkondo import db
-from sqlalchemy import or_, desc
+
+import numpy as np
+from users.models import User, MediaUserHistory, InsightSnapshot, media_user_favourites_table
+from mkondo import db, geoip, sketches, shards
+from sqlalchemy import or_, desc, func, select
+from sqlalchemy.dialects.postgresql import JSON, insert
+from mkondo.counters import bucket_start
+from mkondo.hll import HyperLogLog
+from mkondo.mixins import CounterMixin
+from .recommender import jaccard_neighbors
 
 playlist_song_table = db.Table('playlist_song',
                                db.Column('playlist_id', db.ForeignKey('playlists.id'), nullable=False),
@@ -22,8 +31,13 @@ genre_album_table = db.Table(
 )
 
 
-class Media(db.Model):
+class Media(CounterMixin, db.Model):
     __tablename__ = 'media'
+    PUBLIC_ID = 'media_id'
+    COUNTERS = ('plays', 'likes', 'shares', 'page_views')
+    COUNTER_ROLLUPS = {
+        field: ('artist_stats', 'artist_id', 'owner_id') for field in ('plays', 'likes', 'shares')
+    }
 
     id = db.Column(db.Integer, primary_key=True)
     media_id = db.Column(db.String(50), nullable=False, unique=True, index=True)
@@ -34,6 +48,7 @@ class Media(db.Model):
     category = db.Column(db.String(50), nullable=False)
     added = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     edited = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     plays = db.Column(db.Float, nullable=False, default=0.0)
     composer = db.Column(db.String, nullable=True)
     song_writer = db.Column(db.String, nullable=True)
@@ -157,14 +172,23 @@ class Media(db.Model):
 
     def delete(self):
         """
-        Delete a single media object permanently.
+        Delete a single media object permanently, with its comments, play
+        history and playlist and favourite entries.
         """
+        for comment in self.comments:
+            db.session.delete(comment)
+
+        MediaUserHistory.query.filter_by(media_id=self.id).delete(synchronize_session=False)
+        db.session.execute(playlist_song_table.delete().where(playlist_song_table.c.song_id == self.id))
+        db.session.execute(media_user_favourites_table.delete().where(media_user_favourites_table.c.media_id == self.id))
         db.session.delete(self)
         db.session.commit()
 
 
-class Playlist(db.Model):
+class Playlist(CounterMixin, db.Model):
     __tablename__ = 'playlists'
+    PUBLIC_ID = 'playlist_id'
+    COUNTERS = ('likes', 'shares', 'page_views')
 
     id = db.Column(db.Integer, primary_key=True)
     playlist_id = db.Column(db.String(50), nullable=False, unique=True)
@@ -219,8 +243,10 @@ class Playlist(db.Model):
         db.session.commit()
 
 
-class Album(db.Model):
+class Album(CounterMixin, db.Model):
     __tablename__ = 'albums'
+    PUBLIC_ID = 'album_id'
+    COUNTERS = ('plays', 'likes', 'shares', 'page_views')
 
     id = db.Column(db.Integer, primary_key=True)
     album_id = db.Column(db.String(50), nullable=False, unique=True)
@@ -390,3 +416,594 @@ class Genre(db.Model):
             genre.save()
         
         return genre
+
+
+class MediaPopularity(db.Model):
+    __tablename__ = 'media_popularity'
+    __table_args__ = (
+        db.PrimaryKeyConstraint('category', 'rank'),
+    )
+
+    category = db.Column(db.String(50), nullable=False)
+    rank = db.Column(db.Integer, nullable=False)
+    media_id = db.Column(db.Integer, db.ForeignKey('media.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    refreshed = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    ALL = 'all'
+
+    @classmethod
+    def top(cls, category, amount):
+        """
+        Return the top ranked media of a category, 'all' ranks across categories.
+        """
+        return Media.query.join(cls, cls.media_id == Media.id).filter(cls.category == category)\
+            .order_by(cls.rank).limit(amount).all()
+
+    @staticmethod
+    def listener_weight(half_life_days=None):
+        """
+        Time decayed weight of a listener as an SQL expression.
+        """
+        if not half_life_days:
+            return 1.0
+
+        # last_played is a naive UTC time, so is the database time it is
+        # compared to, whatever the session time zone.
+        age = func.extract('epoch', func.timezone('utc', func.now()) - MediaUserHistory.last_played)
+
+        return func.exp(-math.log(2) * age / (half_life_days * 86400.0))
+
+    @classmethod
+    def refresh(cls, half_life_days=None, amount=100):
+        """
+        Recompute the rankings from the listening history.
+
+        Every listener contributes a weight of 0.5 ** (age / half_life) where
+        age is the time since they last played the media, without a half life
+        the score is a plain listener count.
+        """
+        weight = cls.listener_weight(half_life_days)
+        scores = db.session.query(Media.id, Media.category, func.sum(weight).label('score'))\
+            .join(MediaUserHistory, MediaUserHistory.media_id == Media.id)\
+            .filter(Media.archived == False)\
+            .group_by(Media.id, Media.category).all()
+
+        rankings = {cls.ALL: []}
+
+        for media_id, category, score in sorted(scores, key=lambda s: (-s.score, s.id)):
+            for bucket in (category, cls.ALL):
+                ranking = rankings.setdefault(bucket, [])
+
+                if len(ranking) < amount:
+                    ranking.append(dict(
+                        category=bucket,
+                        rank=len(ranking) + 1,
+                        media_id=media_id,
+                        score=float(score)
+                    ))
+
+        refreshed = datetime.utcnow()
+        rows = [dict(row, refreshed=refreshed) for ranking in rankings.values() for row in ranking]
+
+        # Swap the rankings in one transaction so readers never see a partial table.
+        cls.query.delete()
+        db.session.bulk_insert_mappings(cls, rows)
+        db.session.commit()
+
+        return len(rows)
+
+
+class GenrePopularity(db.Model):
+    __tablename__ = 'genre_popularity'
+    __table_args__ = (
+        db.PrimaryKeyConstraint('genre_id', 'rank'),
+    )
+
+    genre_id = db.Column(db.Integer, db.ForeignKey('genres.id', ondelete='CASCADE'), nullable=False)
+    rank = db.Column(db.Integer, nullable=False)
+    media_id = db.Column(db.Integer, db.ForeignKey('media.id', ondelete='CASCADE'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+    refreshed = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def recommend(cls, genre_ids, amount, exclude=None):
+        """
+        Rank the precomputed top media of the given genres by genre overlap
+        weighted by popularity, i.e. the sum of their scores in those genres.
+        """
+        if not genre_ids:
+            return []
+
+        overlap = func.sum(cls.score).label('overlap')
+        query = db.session.query(cls.media_id, overlap).filter(cls.genre_id.in_(genre_ids))
+
+        if exclude:
+            query = query.filter(~cls.media_id.in_(exclude))
+
+        ranked = query.group_by(cls.media_id).order_by(desc(overlap), cls.media_id).limit(amount).all()
+        media = {m.id: m for m in Media.query.filter(Media.id.in_([media_id for media_id, _ in ranked])).all()}
+
+        return [media[media_id] for media_id, _ in ranked if media_id in media]
+
+    @classmethod
+    def refresh(cls, half_life_days=None, amount=100):
+        """
+        Recompute the top media of every genre from the listening history.
+        """
+        weight = MediaPopularity.listener_weight(half_life_days)
+        scores = db.session.query(genre_media_table.c.genre_id, Media.id, func.sum(weight).label('score'))\
+            .join(genre_media_table, genre_media_table.c.media_id == Media.id)\
+            .join(MediaUserHistory, MediaUserHistory.media_id == Media.id)\
+            .filter(Media.archived == False)\
+            .group_by(genre_media_table.c.genre_id, Media.id).all()
+
+        rankings = {}
+
+        for genre_id, media_id, score in sorted(scores, key=lambda s: (-s.score, s.id)):
+            ranking = rankings.setdefault(genre_id, [])
+
+            if len(ranking) < amount:
+                ranking.append(dict(genre_id=genre_id, rank=len(ranking) + 1, media_id=media_id, score=float(score)))
+
+        refreshed = datetime.utcnow()
+        rows = [dict(row, refreshed=refreshed) for ranking in rankings.values() for row in ranking]
+
+        cls.query.delete()
+        db.session.bulk_insert_mappings(cls, rows)
+        db.session.commit()
+
+        return len(rows)
+
+
+class MediaNeighbor(db.Model):
+    __tablename__ = 'media_neighbors'
+    __table_args__ = (
+        db.PrimaryKeyConstraint('media_id', 'rank'),
+    )
+
+    media_id = db.Column(db.Integer, db.ForeignKey('media.id', ondelete='CASCADE'), nullable=False)
+    rank = db.Column(db.Integer, nullable=False)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('media.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    refreshed = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def fetch_neighbors(cls, media_id, amount=10):
+        """
+        Return (public media id, score, refreshed) of the precomputed
+        neighbours of a media, best first.
+        """
+        source = db.session.query(Media.id).filter(Media.media_id == media_id).as_scalar()
+
+        return db.session.query(Media.media_id, cls.score, cls.refreshed)\
+            .join(cls, cls.neighbor_id == Media.id)\
+            .filter(cls.media_id == source)\
+            .order_by(cls.rank).limit(amount).all()
+
+    @classmethod
+    def refresh(cls, listeners, media_ids, amount=20, chunk_size=10000):
+        """
+        Replace the neighbours of every media with its top Jaccard neighbours
+        in a users x media listening matrix whose columns are the internal
+        media ids in media_ids, inserted chunk_size rows at a time.
+        """
+        rows, neighbors, scores = jaccard_neighbors(listeners, np.arange(len(media_ids)), amount=amount)
+        ranks = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left') + 1
+        media_ids = np.asarray(media_ids)
+        refreshed = datetime.utcnow()
+
+        # Swap the neighbours in one transaction so readers never see a partial table.
+        cls.query.delete()
+
+        for start in range(0, len(rows), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            db.session.execute(cls.__table__.insert(), [
+                dict(media_id=media_id, rank=rank, neighbor_id=neighbor_id, score=score, refreshed=refreshed)
+                for media_id, rank, neighbor_id, score in zip(
+                    media_ids[rows[chunk]].tolist(), ranks[chunk].tolist(),
+                    media_ids[neighbors[chunk]].tolist(), scores[chunk].tolist()
+                )
+            ])
+
+        db.session.commit()
+
+        return len(rows)
+
+
+class ArtistStats(db.Model):
+    __tablename__ = 'artist_stats'
+
+    artist_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    plays = db.Column(db.BigInteger, nullable=False, default=0)
+    likes = db.Column(db.BigInteger, nullable=False, default=0)
+    shares = db.Column(db.BigInteger, nullable=False, default=0)
+    comments = db.Column(db.BigInteger, nullable=False, default=0)
+    listeners = db.Column(db.BigInteger, nullable=False, default=0)
+    media_count = db.Column(db.Integer, nullable=False, default=0)
+    audience = db.Column(JSON, nullable=False, default=list)
+    reconciled = db.Column(db.DateTime, nullable=True)
+
+    COUNTERS = ('plays', 'likes', 'shares', 'comments', 'listeners', 'media_count')
+
+    @classmethod
+    def fetch_by_artist_id(cls, artist_id):
+        """
+        Fetch the statistics of an artist by their internal id.
+        """
+        return cls.query.filter_by(artist_id=artist_id).first()
+
+    @classmethod
+    def increment(cls, artist_id, **deltas):
+        """
+        Add to the counters of an artist in the current transaction, the
+        caller commits. A row created here holds only the deltas and is
+        marked unreconciled until the next reconcile.
+        """
+        values = dict({name: 0 for name in cls.COUNTERS}, **deltas)
+        statement = insert(cls.__table__).values(artist_id=artist_id, audience=[], **values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.__table__.c.artist_id],
+            set_={name: getattr(cls.__table__.c, name) + delta for name, delta in deltas.items()}
+        )
+        db.session.execute(statement)
+
+    @classmethod
+    def remove_media(cls, media):
+        """
+        Subtract every counter aggregate sums for a media about to be
+        deleted, with its shard increments not yet folded, the caller
+        commits. Its listeners who played no other media of the artist are
+        no longer listeners.
+        """
+        sharded = shards.totals('media', media.id)
+        comments = db.session.query(func.count(Comment.id)).filter(Comment.media_id == media.id).scalar()
+        others = db.session.query(MediaUserHistory.user_id)\
+            .join(Media, Media.id == MediaUserHistory.media_id)\
+            .filter(Media.owner_id == media.owner_id, Media.id != media.id)
+        listeners = db.session.query(func.count(MediaUserHistory.user_id))\
+            .filter(MediaUserHistory.media_id == media.id, ~MediaUserHistory.user_id.in_(others))\
+            .scalar()
+
+        cls.increment(
+            media.owner_id, media_count=-1, comments=-comments, listeners=-listeners,
+            **{name: -int(getattr(media, name) + sharded.get(name, 0)) for name in ('plays', 'likes', 'shares')}
+        )
+
+    @classmethod
+    def record_play(cls, media, user_id, plays=1, new_listener=False):
+        """
+        Count plays of a media, and a new listener of its artist when this
+        is the user's first play of any of the artist's media.
+        """
+        deltas = dict(plays=plays)
+
+        if new_listener:
+            listened_before = db.session.query(MediaUserHistory.media_id)\
+                .join(Media, Media.id == MediaUserHistory.media_id)\
+                .filter(MediaUserHistory.user_id == user_id, Media.owner_id == media.owner_id, Media.id != media.id)\
+                .first()
+
+            if not listened_before:
+                deltas['listeners'] = 1
+
+        cls.increment(media.owner_id, **deltas)
+
+    @classmethod
+    def aggregate(cls, artist_ids=None):
+        """
+        A select of (artist_id, *COUNTERS) recomputed from the source tables
+        with grouped queries, one row per artist with media. Plays are the
+        sum of the media's plays, which every play path increments.
+        """
+        media, history, comments = Media.__table__, MediaUserHistory.__table__, Comment.__table__
+
+        def grouped(*columns, joined=media):
+            query = select([media.c.owner_id.label('artist_id'), *columns]).select_from(joined)
+
+            if artist_ids is not None:
+                query = query.where(media.c.owner_id.in_(artist_ids))
+
+            return query.group_by(media.c.owner_id).alias()
+
+        totals = grouped(
+            func.sum(media.c.plays).label('plays'),
+            func.sum(media.c.likes).label('likes'),
+            func.sum(media.c.shares).label('shares'),
+            func.count(media.c.id).label('media_count')
+        )
+        listeners = grouped(
+            func.count(func.distinct(history.c.user_id)).label('listeners'),
+            joined=media.join(history, history.c.media_id == media.c.id)
+        )
+        commented = grouped(
+            func.count(comments.c.id).label('comments'),
+            joined=media.join(comments, comments.c.media_id == media.c.id)
+        )
+        columns = {column.name: column for subquery in (totals, listeners, commented) for column in subquery.c}
+
+        return select([totals.c.artist_id] + [
+            func.coalesce(columns[name], 0).cast(cls.__table__.c[name].type).label(name) for name in cls.COUNTERS
+        ]).select_from(
+            totals.outerjoin(listeners, listeners.c.artist_id == totals.c.artist_id)
+            .outerjoin(commented, commented.c.artist_id == totals.c.artist_id)
+        )
+
+    @staticmethod
+    def audiences(artist_ids=None):
+        """
+        The listener locations of the given artists, or every artist,
+        {artist id: [{count, country, region}]} most common first.
+        """
+        # Listener locations are resolved at signup/login, older accounts
+        # fall back to a local lookup of the address they signed up from.
+        audiences = {}
+        listeners = db.session.query(Media.owner_id, User.locality, User.geo_country, User.geo_region)\
+            .join(MediaUserHistory, MediaUserHistory.media_id == Media.id)\
+            .join(User, User.id == MediaUserHistory.user_id)\
+            .distinct(Media.owner_id, User.id)
+
+        if artist_ids is not None:
+            listeners = listeners.filter(Media.owner_id.in_(artist_ids))
+
+        for owner_id, locality, country, region in listeners.yield_per(10000):
+            audiences.setdefault(owner_id, Counter())[(country, region) if country else geoip.lookup(locality)] += 1
+
+        return {
+            artist_id: [
+                {'count': count, 'country': country, 'region': region}
+                for (country, region), count in audience.most_common()
+            ]
+            for artist_id, audience in audiences.items()
+        }
+
+    @classmethod
+    def compute(cls, artist_id):
+        """
+        The statistics of an artist recomputed without storing them, for an
+        artist not reconciled yet.
+        """
+        row = db.session.execute(cls.aggregate([artist_id])).first()
+        counters = {name: row[name] if row else 0 for name in cls.COUNTERS}
+
+        return cls(artist_id=artist_id, audience=cls.audiences([artist_id]).get(artist_id, []), **counters)
+
+    @classmethod
+    def reconcile(cls, artist_ids=None):
+        """
+        Recompute the statistics of the given artists, or every artist,
+        correcting any drift of the incremental counters and refreshing the
+        audience breakdown. The counters are upserted from the aggregate in
+        one statement, so rows are never missing while it runs, and the
+        rows of artists left without media are zeroed.
+        """
+        table = cls.__table__
+        reconciled = datetime.utcnow()
+        audiences = cls.audiences(artist_ids)
+        aggregate = cls.aggregate(artist_ids).alias('aggregate')
+
+        statement = insert(table).from_select(
+            ['artist_id', *cls.COUNTERS, 'audience', 'reconciled'],
+            select([*aggregate.c, func.json_build_array(), db.literal(reconciled)])
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.artist_id],
+            set_=dict({name: statement.excluded[name] for name in cls.COUNTERS}, reconciled=statement.excluded.reconciled)
+        ).returning(table.c.artist_id)
+        artists = [artist_id for artist_id, in db.session.execute(statement).fetchall()]
+
+        # The audience is not incremented, so it is written separately.
+        if artists:
+            db.session.execute(
+                table.update().where(table.c.artist_id == db.bindparam('b_artist_id'))
+                .values(audience=db.bindparam('b_audience')),
+                [dict(b_artist_id=artist_id, b_audience=audiences.get(artist_id, [])) for artist_id in artists]
+            )
+
+        orphaned = table.update().where(table.c.reconciled.is_distinct_from(reconciled))
+
+        if artist_ids is not None:
+            orphaned = orphaned.where(table.c.artist_id.in_(artist_ids))
+
+        db.session.execute(orphaned.values(
+            audience=[], reconciled=reconciled, **{name: 0 for name in cls.COUNTERS}
+        ))
+        db.session.commit()
+
+        return len(artists)
+
+
+class DailyCounter(db.Model):
+    __tablename__ = 'daily_counters'
+    __table_args__ = (
+        db.PrimaryKeyConstraint('entity_type', 'entity_id', 'metric', 'granularity', 'bucket'),
+    )
+
+    entity_type = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.String(50), nullable=False)
+    metric = db.Column(db.String(20), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)
+    bucket = db.Column(db.Date, nullable=False)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+    METRICS = ('plays', 'likes', 'shares', 'page_views')
+
+    @classmethod
+    def series(cls, entity_type, entity_ids, metrics, granularity, start, end):
+        """
+        Return {metric: [{'bucket', 'value'}]} summed over the entities, for
+        the buckets of the given granularity overlapping [start, end].
+        """
+        rows = db.session.query(cls.metric, cls.bucket, func.sum(cls.value))\
+            .filter(
+                cls.entity_type == entity_type,
+                cls.entity_id.in_(entity_ids),
+                cls.metric.in_(metrics),
+                cls.granularity == granularity,
+                cls.bucket >= bucket_start(start, granularity),
+                cls.bucket <= end
+            )\
+            .group_by(cls.metric, cls.bucket).order_by(cls.bucket).all()
+
+        series = {metric: [] for metric in metrics}
+
+        for metric, bucket, value in rows:
+            series[metric].append({'bucket': bucket.isoformat(), 'value': int(value)})
+
+        return series
+
+    @classmethod
+    def totals(cls, entity_type, entity_ids, metrics, granularity, start, end):
+        """
+        Return {metric: value} summed over the entities and the buckets of
+        series, the series changes only if a total does.
+        """
+        rows = db.session.query(cls.metric, func.sum(cls.value))\
+            .filter(
+                cls.entity_type == entity_type,
+                cls.entity_id.in_(entity_ids),
+                cls.metric.in_(metrics),
+                cls.granularity == granularity,
+                cls.bucket >= bucket_start(start, granularity),
+                cls.bucket <= end
+            )\
+            .group_by(cls.metric).all()
+
+        return {metric: int(value) for metric, value in rows}
+
+
+class ListenerSketch(db.Model):
+    """
+    HyperLogLog sketches of the distinct listeners of a media, an artist or
+    a media category per day. Distinct listeners over any days and keys are
+    estimated by merging their sketches instead of scanning the history.
+    """
+    __tablename__ = 'listener_sketches'
+    __table_args__ = (
+        db.PrimaryKeyConstraint('scope', 'key', 'day'),
+    )
+
+    scope = db.Column(db.String(20), nullable=False)
+    key = db.Column(db.String(50), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    registers = db.Column(db.LargeBinary, nullable=False)
+
+    SCOPES = ('media', 'artist', 'category')
+    REBUILT = 'listener_sketches'
+
+    @staticmethod
+    def record(user_id, media_id, artist_id, category=None, day=None):
+        """
+        Buffer a listen of a media by a user, with internal ids.
+        """
+        sketches.add('media', media_id, user_id, day)
+        sketches.add('artist', artist_id, user_id, day)
+
+        if category:
+            sketches.add('category', category, user_id, day)
+
+    @classmethod
+    def estimate(cls, scope, keys, start=None, end=None):
+        """
+        Estimate the distinct listeners of any of the keys between the start
+        and end days inclusive, None when there is no sketch to merge.
+        """
+        query = db.session.query(cls.registers).filter(cls.scope == scope, cls.key.in_([str(key) for key in keys]))
+
+        if start is not None:
+            query = query.filter(cls.day >= start)
+
+        if end is not None:
+            query = query.filter(cls.day <= end)
+
+        sketch = HyperLogLog.union([registers for registers, in query.all()])
+
+        return sketch.count() if sketch else None
+
+    @classmethod
+    def rebuild(cls, chunk_size=100000):
+        """
+        Merge every recorded listen into the sketches, from the play event
+        log and the last play of each history row. Merging is idempotent so
+        this can run at any time, returns the number of sketches written.
+        Once it completes the sketches are marked as covering all listens.
+        """
+        tables = db.metadata.tables
+        media, history, play_events = tables['media'], tables['media_user_history'], tables['play_events']
+
+        def listens(user_id, played, media_id):
+            return select([user_id, played, media.c.id, media.c.owner_id, media.c.category])\
+                .select_from(media_id.table.join(media, media_id == media.c.id))
+
+        sources = [
+            listens(play_events.c.user_id, play_events.c.played, play_events.c.media_id)
+            .where(play_events.c.user_id.isnot(None)),
+            listens(history.c.user_id, history.c.last_played, history.c.media_id)
+        ]
+        written = 0
+
+        with db.engine.connect() as connection:
+            for source in sources:
+                result = connection.execution_options(stream_results=True).execute(source)
+
+                while True:
+                    rows = result.fetchmany(chunk_size)
+
+                    if not rows:
+                        break
+
+                    listeners = {}
+
+                    for user_id, played, media_id, owner_id, category in rows:
+                        for key in (('media', str(media_id)), ('artist', str(owner_id)), ('category', category)):
+                            if key[1]:
+                                listeners.setdefault(key + (played.date(),), []).append(user_id)
+
+                    written += sketches.write({key: HyperLogLog().add(user_ids) for key, user_ids in listeners.items()})
+
+        InsightSnapshot.store(cls.REBUILT, dict(written=written))
+
+        return written
+
+    @classmethod
+    def rebuilt(cls):
+        """
+        Whether the sketches have been rebuilt from the history, before that
+        they only hold the listens recorded since they were introduced.
+        """
+        return InsightSnapshot.fetch(cls.REBUILT) is not None
+
+
+class HotCounter(db.Model):
+    """
+    Rows promoted to sharded counters for their write rate, until expires.
+    rollup_id is the key of the row their counters roll up to, if any.
+    """
+    __tablename__ = 'hot_counters'
+    __table_args__ = (
+        db.PrimaryKeyConstraint('table_name', 'public_id'),
+    )
+
+    table_name = db.Column(db.String(30), nullable=False)
+    public_id = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    rollup_id = db.Column(db.Integer, nullable=True)
+    promoted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class CounterShard(db.Model):
+    """
+    Counter increments of hot rows spread over shard slots, summed on read
+    and folded back into the row's column by the fold job.
+    """
+    __tablename__ = 'counter_shards'
+    __table_args__ = (
+        db.PrimaryKeyConstraint('table_name', 'row_id', 'field', 'shard'),
+    )
+
+    table_name = db.Column(db.String(30), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    field = db.Column(db.String(20), nullable=False)
+    shard = db.Column(db.SmallInteger, nullable=False)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
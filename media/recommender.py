@@ -1,5 +1,66 @@
 import numpy as np
 import pandas
+from scipy import sparse
+
+
+class Interactions:
+    """
+    Listening history as parallel arrays: every event is a (user, media)
+    pair of dense indices into the sorted users and media id arrays, with
+    its play count. When loaded from the database, media_ids holds the
+    internal id of every media, aligned with media.
+    """
+
+    def __init__(self, user_codes, media_codes, plays, users, media, media_ids=None):
+        self.user_codes = user_codes
+        self.media_codes = media_codes
+        self.plays = plays
+        self.users = users
+        self.media = media
+        self.media_ids = media_ids
+
+    def __len__(self):
+        return len(self.user_codes)
+
+    @classmethod
+    def from_ids(cls, user_ids, media_ids, plays=None):
+        """
+        Encode raw id arrays, the ids are sorted so they can be searched.
+        """
+        users, user_codes = np.unique(np.asarray(user_ids), return_inverse=True)
+        media, media_codes = np.unique(np.asarray(media_ids), return_inverse=True)
+
+        if plays is None:
+            plays = np.ones(len(user_codes), dtype=np.float32)
+
+        return cls(
+            user_codes.astype(np.int32),
+            media_codes.astype(np.int32),
+            np.asarray(plays, dtype=np.float32),
+            users,
+            media
+        )
+
+    @classmethod
+    def from_frame(cls, frame, user_id, media_id, plays=None):
+        """
+        Encode a history DataFrame.
+        """
+        frame = frame.dropna(subset=[user_id, media_id])
+
+        return cls.from_ids(
+            frame[user_id].tolist(),
+            frame[media_id].tolist(),
+            frame[plays].values if plays else None
+        )
+
+    def subset(self, mask):
+        """
+        Return the events selected by a boolean mask, keeping the id arrays.
+        """
+        return Interactions(
+            self.user_codes[mask], self.media_codes[mask], self.plays[mask], self.users, self.media, self.media_ids
+        )
 
 
 class PopularityRecommender:
@@ -13,22 +74,28 @@ class PopularityRecommender:
         self.train_data = train_data
         self.user_id = user_id
         self.media_id = media_id
+        self.fit(Interactions.from_frame(train_data, user_id, media_id))
 
-        # Get a count of user_ids for each unique song as recommendation score
-        train_data_grouped = train_data.groupby([self.media_id]).agg({self.user_id: 'count'}).reset_index()
-        train_data_grouped.rename(columns = {'user_id': 'score'},inplace=True)
+    def fit(self, interactions, amount=10):
+        """
+        Rank media by their number of listeners
+        """
+        self.media_id = self.media_id or 'media_id_y'
 
-        # Sort the songs based upon recommendation score
-        train_data_sort = train_data_grouped.sort_values(['score', self.media_id], ascending = [0,1])
+        # Get a count of listeners for each unique media as recommendation score
+        scores = np.bincount(interactions.media_codes, minlength=len(interactions.media))
 
-        # Generate a recommendation rank based upon score
-        train_data_sort['Rank'] = train_data_sort['score'].rank(ascending=0, method='first')
+        # Sort the media by score, ties by media id, and keep the top ones
+        top = np.lexsort((np.arange(len(scores)), -scores))[:amount]
 
-        #Get the top 10 recommendations
-        self.popularity_recommendations = train_data_sort.head(10)
+        self.popularity_recommendations = pandas.DataFrame({
+            self.media_id: interactions.media[top],
+            'score': scores[top],
+            'Rank': np.arange(1, len(top) + 1, dtype=float)
+        }, columns=[self.media_id, 'score', 'Rank'])
     
     def recommend(self, user_id):
-        user_recommendations = self.popularity_recommendations
+        user_recommendations = self.popularity_recommendations.copy()
         
         # Add user_id column for which the recommendations are being generated
         user_recommendations['user_id'] = user_id
@@ -41,16 +108,65 @@ class PopularityRecommender:
         return user_recommendations
 
 
+def index_of(ids, values):
+    """
+    Positions of values in the sorted ids array, -1 where a value is missing.
+    """
+    values = np.asarray(values)
+
+    if len(ids) == 0 or len(values) == 0:
+        return np.full(len(values), -1, dtype=np.int64)
+
+    positions = np.minimum(np.searchsorted(ids, values), len(ids) - 1)
+
+    return np.where(ids[positions] == values, positions, -1)
+
+
+def jaccard_neighbors(matrix, columns, amount=20, chunk_size=1024):
+    """
+    Top Jaccard neighbours of the given columns of a binary sparse matrix.
+
+    Returns parallel (column, neighbour, score) arrays with at most amount
+    neighbours per column, best first. Only columns sharing a row with
+    each other are compared, chunk_size columns at a time.
+    """
+    matrix = sparse.csc_matrix(matrix)
+    counts = np.asarray(matrix.getnnz(axis=0), dtype=np.float32)
+    results = []
+
+    for start in range(0, len(columns), chunk_size):
+        chunk = np.asarray(columns[start:start + chunk_size])
+        intersection = (matrix[:, chunk].T @ matrix).tocoo()
+        rows, neighbors, overlap = chunk[intersection.row], intersection.col, intersection.data
+        keep = rows != neighbors
+        rows, neighbors, overlap = rows[keep], neighbors[keep], overlap[keep]
+        scores = overlap / (counts[rows] + counts[neighbors] - overlap)
+
+        # Sort by column then score, and keep the first amount of every column.
+        order = np.lexsort((neighbors, -scores, rows))
+        rows, neighbors, scores = rows[order], neighbors[order], scores[order]
+        starts = np.searchsorted(rows, rows, side='left')
+        top = np.arange(len(rows)) - starts < amount
+        results.append((rows[top], neighbors[top], scores[top]))
+
+    if not results:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
 class SimilarityRecommender:
-    def __init__(self):
+    def __init__(self, similarity='jaccard'):
         self.train_data = None
         self.user_id = None
         self.media_id = None
-        self.cooccurence_matrix = None
-        self.media_dict = None
-        self.rev_media_dict = None
-        self.media_similarity_recommendations = None
-    
+        self.similarity = similarity
+        self.interactions = None
+        self.listeners = None
+        self.media_listeners = None
+        self.users = None
+        self.media = None
+
     def create(self, train_data, user_id, media_id):
         """
         Create the item similarity based recommender system model
@@ -58,149 +174,404 @@ class SimilarityRecommender:
         self.train_data = train_data
         self.user_id = user_id
         self.media_id = media_id
-    
+        self.fit(Interactions.from_frame(train_data, user_id, media_id))
+
+    def fit(self, interactions):
+        """
+        Build the binary users x media listening matrix from encoded interactions
+        """
+        self.user_id = self.user_id or 'user_id'
+        self.media_id = self.media_id or 'media_id_y'
+
+        listened = np.ones(len(interactions), dtype=np.float32)
+        matrix = sparse.csr_matrix(
+            (listened, (interactions.user_codes, interactions.media_codes)),
+            shape=(len(interactions.users), len(interactions.media))
+        )
+        matrix.sum_duplicates()
+        matrix.data[:] = 1.0
+
+        self.interactions = matrix
+        self.listeners = matrix.tocsc()
+        self.media_listeners = np.asarray(matrix.getnnz(axis=0), dtype=np.float32)
+        self.users = interactions.users
+        self.media = interactions.media
+
+    def to_arrays(self):
+        """
+        Export the model as plain arrays for a recommender artifact
+        """
+        return {
+            'users': self.users,
+            'media': self.media,
+            'indptr': self.interactions.indptr,
+            'indices': self.interactions.indices,
+            'data': self.interactions.data,
+            'listeners_indptr': self.listeners.indptr,
+            'listeners_indices': self.listeners.indices,
+            'listeners_data': self.listeners.data,
+            'media_listeners': self.media_listeners,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, similarity='jaccard', media_id='media_id_y'):
+        """
+        Load a model from (possibly memory mapped) artifact arrays without copying them
+        """
+        model = cls(similarity=similarity)
+        model.user_id = 'user_id'
+        model.media_id = media_id
+        model.users = arrays['users']
+        model.media = arrays['media']
+        model.media_listeners = arrays['media_listeners']
+        model.interactions = sparse.csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']), shape=(len(model.users), len(model.media)), copy=False
+        )
+        model.listeners = sparse.csc_matrix(
+            (arrays['listeners_data'], arrays['listeners_indices'], arrays['listeners_indptr']),
+            shape=(len(model.users), len(model.media)), copy=False
+        )
+
+        return model
+
     def get_user_media(self, user_id):
         """
         Get unique media corresponding to a given user
         """
-        user_data = self.train_data[self.train_data[self.user_id] == user_id]
-        user_media = list(user_data[self.media_id].unique())
-        
-        return user_media
+        index = index_of(self.users, [user_id])[0]
+
+        if index < 0:
+            return []
+
+        row = self.interactions.indices[self.interactions.indptr[index]:self.interactions.indptr[index + 1]]
+
+        return list(self.media[row])
 
     def get_media_users(self, media_id):
         """
         Get unique users for a given media
         """
-        media_data = self.train_data[self.train_data[self.media_id] == media_id]
-        media_users = set(media_data[self.user_id].unique())
-            
-        return media_users
+        index = index_of(self.media, [media_id])[0]
+
+        if index < 0:
+            return set()
+
+        return set(self.users[self.listeners.indices[self.listeners.indptr[index]:self.listeners.indptr[index + 1]]])
 
     def get_all_media_train_data(self):
         """
         Get unique media in the training data
         """
-        all_media = list(self.train_data[self.media_id].unique())
-            
-        return all_media
-    
-    def construct_cooccurence_matrix(self, user_media, all_media):
+        return list(self.media)
+
+    def construct_cooccurence_matrix(self, user_media, candidates=None):
         """
-        Construct cooccurence matrix
+        Construct a sparse len(user_media) x len(all media) similarity matrix,
+        or len(user_media) x len(candidates) when candidate media positions are given
         """
-        
-        # Get users for all media in user_media.
-        user_media_users = []        
-        for i in range(0, len(user_media)):
-            user_media_users.append(self.get_media_users(user_media[i]))
-            
-        # Initialize the item cooccurence matrix of size 
-        # len(user_media) X len(media)
-        cooccurence_matrix = np.matrix(np.zeros(shape=(len(user_media), len(all_media))), float)
-           
-        # Calculate similarity between user media and all unique media
-        # in the training data
-        for i in range(0,len(all_media)):
-            # Calculate unique listeners (users) of media (item) i
-            media_i_data = self.train_data[self.train_data[self.media_id] == all_media[i]]
-            users_i = set(media_i_data[self.user_id].unique())
-            
-            for j in range(0,len(user_media)):       
-                    
-                # Get unique listeners (users) of media (item) j
-                users_j = user_media_users[j]
-                    
-                # Calculate intersection of listeners of songs i and j
-                users_intersection = users_i.intersection(users_j)
-                
-                #Calculate cooccurence_matrix[i,j] as Jaccard Index
-                if len(users_intersection) != 0:
-                    #Calculate union of listeners of songs i and j
-                    users_union = users_i.union(users_j)
-                    
-                    cooccurence_matrix[j,i] = float(len(users_intersection))/float(len(users_union))
-                else:
-                    cooccurence_matrix[j,i] = 0
-                    
-        
-        return cooccurence_matrix
-    
-    def generate_top_recommendations(self, user, cooccurence_matrix, all_media, user_media):
+        columns = index_of(self.media, user_media)
+        columns = columns[columns >= 0]
+
+        # Listener overlap of every user media with every media in a single
+        # sparse product, only the non-zero intersections are materialized.
+        user_media_listeners = self.listeners[:, columns]
+
+        if candidates is None:
+            intersection = (user_media_listeners.T @ self.interactions).tocoo()
+            cols_count = self.media_listeners[intersection.col]
+            width = len(self.media)
+        else:
+            intersection = (user_media_listeners.T @ self.listeners[:, candidates]).tocoo()
+            cols_count = self.media_listeners[candidates[intersection.col]]
+            width = len(candidates)
+
+        rows_count = self.media_listeners[columns][intersection.row]
+
+        if self.similarity == 'cosine':
+            scores = intersection.data / np.sqrt(rows_count * cols_count)
+        else:
+            scores = intersection.data / (rows_count + cols_count - intersection.data)
+
+        return sparse.csr_matrix(
+            (scores, (intersection.row, intersection.col)), shape=(len(columns), width)
+        )
+
+    def generate_top_recommendations(self, user, cooccurence_matrix, user_media, amount=10, candidates=None):
         """
         Use the cooccurence matrix to make top recommendations
         """
-        print("Non zero values in cooccurence_matrix :%d" % np.count_nonzero(cooccurence_matrix))
-        
-        # Calculate a weighted average of the scores in cooccurence matrix for all user songs.
-        user_sim_scores = cooccurence_matrix.sum(axis=0)/float(cooccurence_matrix.shape[0])
-        user_sim_scores = np.array(user_sim_scores)[0].tolist()
- 
-        # Sort the indices of user_sim_scores based upon their value
-        # Also maintain the corresponding score
-        sort_index = sorted(((e,i) for i,e in enumerate(list(user_sim_scores))), reverse=True)
-    
-        # Create a dataframe from the following
-        columns = ['user_id', 'media_id_y', 'score', 'rank']
-        # index = np.arange(1) # array of numbers for the number of samples
-        df = pandas.DataFrame(columns=columns)
-         
-        # Fill the dataframe with top 10 item based recommendations
-        rank = 1 
-        for i in range(0,len(sort_index)):
-            if ~np.isnan(sort_index[i][0]) and all_media[sort_index[i][1]] not in user_media and rank <= 10:
-                df.loc[len(df)]=[user,all_media[sort_index[i][1]],sort_index[i][0],rank]
-                rank = rank+1
-        
-        # Handle the case where there are no recommendations
-        if df.shape[0] == 0:
-            print("The current user has no songs for training the item similarity based recommendation model.")
+        if cooccurence_matrix.shape[0] == 0:
             return -1
-        else:
-            return df
-    
-    def recommend(self, user):
+
+        # Average the similarity of every media to all of the user media.
+        user_sim_scores = np.asarray(cooccurence_matrix.sum(axis=0)).ravel() / float(cooccurence_matrix.shape[0])
+        positions = np.arange(len(self.media)) if candidates is None else candidates
+        user_sim_scores[np.isin(positions, index_of(self.media, user_media))] = -np.inf
+
+        eligible = np.flatnonzero(np.isfinite(user_sim_scores))
+
+        if len(eligible) == 0:
+            return -1
+
+        if len(eligible) > amount:
+            eligible = eligible[np.argpartition(-user_sim_scores[eligible], amount - 1)[:amount]]
+
+        top = eligible[np.argsort(-user_sim_scores[eligible], kind='stable')]
+
+        return pandas.DataFrame({
+            'user_id': [user] * len(top),
+            self.media_id: self.media[positions[top]],
+            'score': user_sim_scores[top],
+            'rank': np.arange(1, len(top) + 1)
+        }, columns=['user_id', self.media_id, 'score', 'rank'])
+
+    def recommend(self, user, index=None):
         """
-        Use the item similarity based recommender system model to 
-        make recommendations
+        Use the item similarity based recommender system model to
+        make recommendations. With a MinHashLSHIndex only the media sharing
+        an LSH bucket with the user's media are scored.
         """
-        
-        # Get all unique songs for this user
-        user_media = self.get_user_media(user)    
-            
-        print("No. of unique songs for the user: %d" % len(user_media))
-        
-        # Get all unique items (songs) in the training data
-        all_media = self.get_all_media_train_data()
-        
-        print("no. of unique songs in the training set: %d" % len(all_media))
-         
-        # Construct item cooccurence matrix of size 
-        # len(user_songs) X len(songs)
-        cooccurence_matrix = self.construct_cooccurence_matrix(user_media, all_media)
-        
-        # Use the cooccurence matrix to make recommendations
-        df_recommendations = self.generate_top_recommendations(user, cooccurence_matrix, all_media, user_media)
-                
-        return df_recommendations
+        user_media = self.get_user_media(user)
+        candidates = None
+
+        if index is not None:
+            columns = index_of(self.media, user_media)
+            candidates = index.candidates(columns[columns >= 0])
+
+        cooccurence_matrix = self.construct_cooccurence_matrix(user_media, candidates)
 
-    def get_similar_items(self, media_list):
+        return self.generate_top_recommendations(user, cooccurence_matrix, user_media, candidates=candidates)
+
+    def recommend_batch(self, users, amount=10, chunk_size=256):
         """
-        Get similar items to given items
+        Yield (user, media) recommendations for many users, scoring each
+        chunk of users with one sparse product. Memory is bounded by
+        chunk_size x len(all media).
         """
-        user_media = media_list
-        
-        # Get all unique items (media) in the training data
-        all_media = self.get_all_media_train_data()
-        
-        print("no. of unique songs in the training set: %d" % len(all_media))
-         
-        # Construct item cooccurence matrix of size 
-        # len(user_songs) X len(songs)
-        cooccurence_matrix = self.construct_cooccurence_matrix(user_media, all_media)
-        
-        # Use the cooccurence matrix to make recommendations
-        user = ""
-        df_recommendations = self.generate_top_recommendations(user, cooccurence_matrix, all_media, user_media)
-         
-        return df_recommendations
+        users = list(users)
+
+        for start in range(0, len(users), chunk_size):
+            chunk = users[start:start + chunk_size]
+            rows = index_of(self.users, chunk)
+            known = rows >= 0
+            listened = self.interactions[rows[known]]
+
+            if listened.shape[0] == 0:
+                for user in chunk:
+                    yield user, []
+                continue
+
+            # Similarity of every media listened to in the chunk with the
+            # whole catalog, then averaged per user with a second product.
+            columns = np.unique(listened.indices)
+            similarity = self.construct_cooccurence_matrix(self.media[columns])
+            scores = (listened[:, columns] @ similarity).toarray()
+            scores /= np.maximum(listened.getnnz(axis=1), 1)[:, None]
+            scores[listened.nonzero()] = -np.inf
+
+            top_count = min(amount, scores.shape[1])
+            top = np.argpartition(-scores, top_count - 1, axis=1)[:, :top_count]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            recommended = iter(zip(top, top_scores))
+
+            for user, is_known in zip(chunk, known):
+                if not is_known:
+                    yield user, []
+                    continue
+
+                media, media_scores = next(recommended)
+                yield user, list(self.media[media[np.isfinite(media_scores)]])
+
+    def get_similar_items(self, media_list, index=None):
+        """
+        Get similar items to given items. With a MinHashLSHIndex only the
+        media sharing an LSH bucket with them are scored.
+        """
+        if index is None:
+            cooccurence_matrix = self.construct_cooccurence_matrix(media_list)
+
+            return self.generate_top_recommendations('', cooccurence_matrix, media_list)
+
+        columns = index_of(self.media, media_list)
+        candidates = index.candidates(columns[columns >= 0])
+        cooccurence_matrix = self.construct_cooccurence_matrix(media_list, candidates)
+
+        return self.generate_top_recommendations('', cooccurence_matrix, media_list, candidates=candidates)
+
+
+class ImplicitALSRecommender:
+    """
+    Matrix factorization of implicit feedback (Hu, Koren and Volinsky).
+
+    Every (user, media) pair gets a confidence of 1 + alpha * log(1 + plays)
+    that the user likes the media, so repeated plays count for more than a
+    single listen. User and media factors are fitted with alternating least
+    squares, each half step solved approximately with a few conjugate
+    gradient iterations for all users (or media) at once, warm started from
+    the previous factors.
+    """
+
+    def __init__(self, factors=32, regularization=0.05, alpha=10.0, iterations=10, cg_steps=3, seed=0):
+        self.user_id = 'user_id'
+        self.media_id = 'media_id_y'
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.seed = seed
+        self.interactions = None
+        self.user_factors = None
+        self.media_factors = None
+        self.users = None
+        self.media = None
+
+    def create(self, train_data, user_id, media_id, plays=None):
+        """
+        Create the matrix factorization model from a history DataFrame
+        """
+        self.user_id = user_id
+        self.media_id = media_id
+        self.fit(Interactions.from_frame(train_data, user_id, media_id, plays))
+
+    def fit(self, interactions):
+        """
+        Fit the user and media factors to the users x media plays matrix
+        """
+        plays = sparse.csr_matrix(
+            (interactions.plays, (interactions.user_codes, interactions.media_codes)),
+            shape=(len(interactions.users), len(interactions.media))
+        )
+        plays.sum_duplicates()
+
+        # Confidence minus one, the part that differs from the unobserved pairs.
+        confidence = plays.copy()
+        confidence.data = (self.alpha * np.log1p(confidence.data)).astype(np.float32)
+        by_media = confidence.T.tocsr()
+
+        random = np.random.RandomState(self.seed)
+        self.user_factors = (random.standard_normal((plays.shape[0], self.factors)) * 0.01).astype(np.float32)
+        self.media_factors = (random.standard_normal((plays.shape[1], self.factors)) * 0.01).astype(np.float32)
+
+        for _ in range(self.iterations):
+            self._least_squares(confidence, self.user_factors, self.media_factors)
+            self._least_squares(by_media, self.media_factors, self.user_factors)
+
+        plays.data[:] = 1.0
+        self.interactions = plays
+        self.users = interactions.users
+        self.media = interactions.media
+
+    def _least_squares(self, confidence, X, Y):
+        """
+        Improve X in place towards argmin of the weighted squared error with
+        Y fixed. Row u solves (YtY + Yt Cu Y + reg I) x = Yt (1 + Cu) pu,
+        where Cu is the confidence row, with cg_steps conjugate gradient steps.
+        """
+        rows = np.repeat(np.arange(confidence.shape[0]), np.diff(confidence.indptr))
+        columns = confidence.indices
+        YtY = Y.T @ Y + self.regularization * np.eye(self.factors, dtype=np.float32)
+
+        def product(P):
+            # (YtY + reg I) p + Yt Cu (Y p) for every row without a dense users x media array.
+            weights = np.einsum('ij,ij->i', P[rows], Y[columns]) * confidence.data
+            return P @ YtY + sparse.csr_matrix((weights, columns, confidence.indptr), shape=confidence.shape) @ Y
+
+        targets = sparse.csr_matrix((confidence.data + 1.0, columns, confidence.indptr), shape=confidence.shape) @ Y
+        residual = targets - product(X)
+        direction = residual.copy()
+        residual_norm = np.einsum('ij,ij->i', residual, residual)
+
+        for _ in range(self.cg_steps):
+            applied = product(direction)
+            curvature = np.einsum('ij,ij->i', direction, applied)
+            step = np.divide(residual_norm, curvature, out=np.zeros_like(residual_norm), where=curvature > 1e-12)
+            X += step[:, None] * direction
+            residual -= step[:, None] * applied
+            new_norm = np.einsum('ij,ij->i', residual, residual)
+            ratio = np.divide(new_norm, residual_norm, out=np.zeros_like(new_norm), where=residual_norm > 1e-12)
+            direction = residual + ratio[:, None] * direction
+            residual_norm = new_norm
+
+    def to_arrays(self):
+        """
+        Export the model as plain arrays for a recommender artifact
+        """
+        return {
+            'users': self.users,
+            'media': self.media,
+            'user_factors': self.user_factors,
+            'media_factors': self.media_factors,
+            'indptr': self.interactions.indptr,
+            'indices': self.interactions.indices,
+        }
+
+    def meta(self):
+        """
+        Parameters saved next to the artifact arrays
+        """
+        return {'factors': self.factors, 'regularization': self.regularization, 'alpha': self.alpha}
+
+    @classmethod
+    def from_arrays(cls, arrays, media_id='media_id_y', **params):
+        """
+        Load a model from (possibly memory mapped) artifact arrays without copying them
+        """
+        model = cls(**params)
+        model.media_id = media_id
+        model.users = arrays['users']
+        model.media = arrays['media']
+        model.user_factors = arrays['user_factors']
+        model.media_factors = arrays['media_factors']
+        indices = arrays['indices']
+        model.interactions = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, arrays['indptr']),
+            shape=(len(model.users), len(model.media)), copy=False
+        )
+
+        return model
+
+    def get_user_media(self, user_id):
+        """
+        Get unique media corresponding to a given user
+        """
+        index = index_of(self.users, [user_id])[0]
+
+        if index < 0:
+            return []
+
+        return list(self.media[self.interactions.indices[self.interactions.indptr[index]:self.interactions.indptr[index + 1]]])
+
+    def recommend(self, user, amount=10):
+        """
+        Score every media with one dot product of the precomputed factors
+        and keep the top ones the user has not listened to yet
+        """
+        index = index_of(self.users, [user])[0]
+
+        if index < 0:
+            return -1
+
+        scores = self.media_factors @ self.user_factors[index]
+        scores[self.interactions.indices[self.interactions.indptr[index]:self.interactions.indptr[index + 1]]] = -np.inf
+
+        eligible = np.flatnonzero(np.isfinite(scores))
+
+        if len(eligible) == 0:
+            return -1
+
+        if len(eligible) > amount:
+            eligible = eligible[np.argpartition(-scores[eligible], amount - 1)[:amount]]
+
+        top = eligible[np.argsort(-scores[eligible], kind='stable')]
+
+        return pandas.DataFrame({
+            'user_id': [user] * len(top),
+            self.media_id: self.media[top],
+            'score': scores[top],
+            'rank': np.arange(1, len(top) + 1)
+        }, columns=['user_id', self.media_id, 'score', 'rank'])
@@ -1,10 +1,12 @@
+import json
 import os
 import uuid
+from datetime import datetime
 
 import logging
 import dotenv
-from flask import request
-from flask_restful import Resource, reqparse
+from flask import request, Response, stream_with_context, current_app
+from flask_restful import Resource, reqparse, inputs
 from sqlalchemy import exc
 from botocore.exceptions import ClientError
 from werkzeug.datastructures import FileStorage
@@ -12,11 +14,19 @@ from werkzeug.datastructures import FileStorage
 import vimeo
 from mkondo.s3 import client
 from .schemas import MediaSchema, PlaylistSchema, AlbumSchema, CommentSchema
-from .models import Media, Playlist, Album, Comment
-from users.models import User, MediaUserHistory
+from .models import (
+    Media, Playlist, Album, Comment, MediaPopularity, GenrePopularity, MediaNeighbor, ArtistStats, DailyCounter,
+    ListenerSketch
+)
+from users.models import User
 from users.schemas import UserSchema
+from users.insights import range_parser, time_range
+from mkondo import artifacts, recommendation_cache, counters, write_behind, shards
+from mkondo.export import Export
 from mkondo.security import authorized_users
-from .recommender import PopularityRecommender, SimilarityRecommender
+from .lsh import MinHashLSHIndex
+from .recommender import ImplicitALSRecommender, SimilarityRecommender
+from .batch import recommend_similar
 from mkondo.tasks import send_mail
 
 dotenv.load_dotenv()
@@ -129,6 +139,7 @@ class MediaListResource(Resource):
         del media_data['owner']
         del media_data['album']
         media = Media(**media_data)
+        ArtistStats.increment(media.owner_id, media_count=1)
 
         try:
             media.save()
@@ -194,6 +205,7 @@ class MediaResource(Resource):
                        'message': 'Media not found.'
                    }, 404
 
+        ArtistStats.remove_media(media)
         media.delete()
 
         return {
@@ -249,11 +261,9 @@ class MediaResource(Resource):
 class PopularMediaRecommendationResource(Resource):
     @staticmethod
     def get(user_id):
-        train_data = MediaUserHistory.get_train_data()
-        popularity_recommender = PopularityRecommender()
-        popularity_recommender.create(train_data, 'user_id', 'media_id_y')
-        recommendations = popularity_recommender.recommend(user_id)
-        media = Media.fetch_by_ids(list(recommendations['media_id_y']))
+        category = request.args.get('category', MediaPopularity.ALL)
+        amount = request.args.get('amount', 10, type=int)
+        media = MediaPopularity.top(category, amount)
 
         if len(media) == 0:
             return {
@@ -269,25 +279,203 @@ class PopularMediaRecommendationResource(Resource):
 class SimilarMediaRecommendationResource(Resource):
     @staticmethod
     def get(user_id):
-        train_data = MediaUserHistory.get_train_data()
-        is_model = SimilarityRecommender()
-        is_model.create(train_data, 'user_id', 'media_id_y')
-        user_media = is_model.get_user_media(user_id)
+        amount = request.args.get('amount', 10, type=int)
+        artifact = artifacts.current()
+        version = artifact.version if artifact else None
+        media_ids = recommendation_cache.get('similar', user_id, version) if artifact else None
 
-        if len(user_media) == 0:
+        if media_ids is not None:
+            return {
+                'success': True,
+                'strategy': 'similar',
+                'media': media_list_schema.dump(Media.fetch_by_ids(media_ids))
+            }, 200
+
+        user = User.fetch_by_id(user_id)
+
+        if not user:
+            return {
+                'success': False,
+                'message': 'User not found'
+            }, 404
+
+        user_media = []
+
+        if artifact:
+            is_model = artifact.load(SimilarityRecommender.from_arrays, 'similarity')
+            user_media = is_model.get_user_media(user.id)
+
+            if len(user_media) > 0:
+                # Approximate, from the LSH candidates, only when enabled and
+                # the artifact has an index, exact scoring is the default.
+                use_index = current_app.config['RECOMMENDER_LSH'] and 'lsh' in artifact.meta
+                index = artifact.load(MinHashLSHIndex.from_arrays, 'lsh') if use_index else None
+                recommended = is_model.recommend(user.id, index=index)
+
+                if not isinstance(recommended, int):
+                    media_ids = list(recommended['media_id_y'])
+                    recommendation_cache.set('similar', user_id, media_ids, version)
+
+                    return {
+                        'success': True,
+                        'strategy': 'similar',
+                        'media': media_list_schema.dump(Media.fetch_by_ids(media_ids))
+                    }, 200
+
+        # Cold start: new users have no history yet, rank the precomputed top
+        # media of their genres and fall back to the overall most popular.
+        exclude = [media.id for media in Media.fetch_by_ids(user_media)] if user_media else None
+        strategy, media = 'genre', GenrePopularity.recommend([genre.id for genre in user.genres], amount, exclude)
+
+        if len(media) == 0:
+            strategy, media = 'popular', MediaPopularity.top(MediaPopularity.ALL, amount)
+
+        if len(media) == 0:
+            return {
+                'success': False,
+                'message': 'There is no media to recommend'
+            }, 404
+
+        return {
+            'success': True,
+            'strategy': strategy,
+            'media': media_list_schema.dump(media)
+        }, 200
+
+
+class MediaSimilarResource(Resource):
+    @staticmethod
+    def get(media_id):
+        amount = request.args.get('amount', 10, type=int)
+        neighbors = MediaNeighbor.fetch_neighbors(media_id, amount)
+
+        if len(neighbors) == 0:
             return {
                 'success': False,
-                'message': 'The current user has no songs for training the item similarity based recommendation model.'
+                'message': 'No similar media found'
             }, 404
 
-        recommended = is_model.recommend(user_id)
-        media = Media.fetch_by_ids(list(recommended['media_id_y']))
+        media = {m.media_id: m for m in Media.fetch_by_ids([neighbor.media_id for neighbor in neighbors])}
+        refreshed = neighbors[0].refreshed
+
+        return {
+            'success': True,
+            'media': media_list_schema.dump([media[n.media_id] for n in neighbors if n.media_id in media]),
+            'refreshed': refreshed.isoformat(),
+            'age_seconds': int((datetime.utcnow() - refreshed).total_seconds())
+        }, 200
+
+
+class PersonalizedMediaRecommendationResource(Resource):
+    @staticmethod
+    def get(user_id):
+        artifact = artifacts.current()
+
+        if not artifact or 'als' not in artifact.meta:
+            return {
+                'success': False,
+                'message': 'The recommendation model has not been trained yet.'
+            }, 503
+
+        media_ids = recommendation_cache.get('personalized', user_id, artifact.version)
+
+        if media_ids is None:
+            user = User.fetch_by_id(user_id)
+
+            if not user:
+                return {
+                    'success': False,
+                    'message': 'User not found'
+                }, 404
+
+            als_model = artifact.load(ImplicitALSRecommender.from_arrays, 'als')
+            recommended = als_model.recommend(user.id)
+
+            if isinstance(recommended, int):
+                return {
+                    'success': False,
+                    'message': 'The current user has no songs for training the personalized recommendation model.'
+                }, 404
+
+            media_ids = list(recommended['media_id_y'])
+            recommendation_cache.set('personalized', user_id, media_ids, artifact.version)
+
+        media = Media.fetch_by_ids(media_ids)
 
         return {
             'success': True,
             'media': media_list_schema.dump(media)
         }, 200
 
+
+class SimilarMediaRecommendationBatchResource(Resource):
+    parser = reqparse.RequestParser(trim=True, bundle_errors=True)
+    parser.add_argument('user_ids', type=str, action='append', required=True, location='json')
+    parser.add_argument('amount', type=inputs.int_range(1, 100, argument='amount'), required=False, default=10, location='json')
+
+    @staticmethod
+    @authorized_users(['SA', 'A'])
+    def post():
+        json_data = SimilarMediaRecommendationBatchResource.parser.parse_args()
+
+        if not artifacts.current():
+            return {
+                'success': False,
+                'message': 'The recommendation model has not been trained yet.'
+            }, 503
+
+        def generate():
+            for user_id, media_ids in recommend_similar(json_data['user_ids'], amount=json_data['amount']):
+                yield json.dumps({'user_id': user_id, 'media_ids': media_ids}) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+class RecommendationCacheResource(Resource):
+    @staticmethod
+    @authorized_users(['SA'])
+    def get():
+        return {
+            'success': True,
+            'cache': recommendation_cache.stats()
+        }, 200
+
+
+class CounterStatsResource(Resource):
+    @staticmethod
+    @authorized_users(['SA'])
+    def get():
+        return {
+            'success': True,
+            'counters': write_behind.stats()
+        }, 200
+
+
+class ExportResource(Resource):
+    parser = reqparse.RequestParser(trim=True)
+    parser.add_argument('since', type=inputs.datetime_from_iso8601, required=False, location='args')
+
+    @staticmethod
+    @authorized_users(['SA'])
+    def get(table):
+        args = ExportResource.parser.parse_args()
+
+        try:
+            export = Export(table, since=args['since'])
+        except KeyError as e:
+            return {
+                'success': False,
+                'message': str(e.args[0])
+            }, 404
+
+        headers = {
+            'Content-Disposition': f'attachment; filename={table}.csv.gz',
+            'X-Export-Watermark': export.watermark.isoformat() if export.watermark else '',
+        }
+
+        return Response(stream_with_context(iter(export)), mimetype='application/gzip', headers=headers)
+
+
 class MediaNewRealseResource(Resource):
     @staticmethod
     @authorized_users(['SA', 'A', 'C', 'U', 'V'])
@@ -420,7 +608,13 @@ class PlaylistResource(Resource):
 class PlaylistSharesResource(Resource):
     @staticmethod
     def post(playlist_id):
-        playlist = Playlist.fetch_by_id(playlist_id)
+        try:
+            playlist = Playlist.increment(playlist_id, 'shares')
+        except:
+            return {
+                       'success': False,
+                       'message': 'Something went wrong while updatating the playlist shares'
+                   }, 500
 
         if not playlist:
             return {
@@ -428,20 +622,12 @@ class PlaylistSharesResource(Resource):
                        'message': 'playlist not found'
                    }, 404
 
-        playlist.shares = playlist.shares + 1
-
-        try:
-            playlist.save()
-        except:
-            return {
-                       'success': False,
-                       'message': 'Something went wrong while updatating the playlist shares'
-                   }, 500
+        counters.add('playlist', playlist_id, 'shares')
 
         return {
             'success': True,
             'message': 'playlist shares updated'
-        }
+        }, 202 if write_behind.enabled else 200
 
 
 class UserPlaylistResource(Resource):
@@ -756,6 +942,7 @@ class CommentListResource(Resource):
         del comment_data['media']
         del comment_data['user']
         comment = Comment(**comment_data)
+        ArtistStats.increment(media.owner_id, comments=1)
         
         try:
             comment.save()
@@ -831,6 +1018,8 @@ class CommentResource(Resource):
                        'message': 'Comment not found'
                    }, 404
 
+        ArtistStats.increment(comment.media.owner_id, comments=-1)
+
         try:
             comment.delete()
         except:
@@ -904,7 +1093,13 @@ class MediaLikResource(Resource):
     @staticmethod
     @authorized_users(['SA', 'A', 'C', 'U'])
     def post(media_id):
-        media = Media.fetch_by_id(media_id)
+        try:
+            media = Media.increment(media_id, 'likes')
+        except:
+            return {
+                       'success': False,
+                       'message': 'Likes could not be updated'
+                   }, 500
 
         if not media:
             return {
@@ -912,20 +1107,12 @@ class MediaLikResource(Resource):
                        'message': 'media not found'
                    }, 404
 
-        media.likes = media.likes + 1
-
-        try:
-            media.save()
-        except:
-            return {
-                       'success': False,
-                       'message': 'Likes could not be updated'
-                   }, 500
+        counters.add('media', media_id, 'likes')
 
         return {
                    'success': True,
                    'message': 'Media likes updated'
-               }, 200
+               }, 202 if write_behind.enabled else 200
 
 
 class MediaRatingResource(Resource):
@@ -935,35 +1122,39 @@ class MediaRatingResource(Resource):
     @staticmethod
     def post(media_id):
         json_data = MediaRatingResource.parser.parse_args()
-        
-        media = Media.fetch_by_id(media_id)
-
-        if not media:
-            return {
-                       'success': False,
-                       'message': 'media not found'
-                   }, 404
-
-        media.plays = media.plays + json_data['plays']
 
         try:
-            media.save()
+            media = Media.increment(media_id, 'plays', json_data['plays'])
         except:
             return {
                        'success': False,
                        'message': 'Plays could not be updated'
                    }, 500
 
+        if not media:
+            return {
+                       'success': False,
+                       'message': 'media not found'
+                   }, 404
+
+        counters.add('media', media_id, 'plays', json_data['plays'])
+
         return {
                    'success': True,
                    'message': 'Plays updated success fully'
-               }, 201
+               }, 202 if write_behind.enabled else 201
 
 
 class AlbumSharesResource(Resource):
     @staticmethod
     def post(album_id):
-        album = Album.fetch_by_id(album_id)
+        try:
+            album = Album.increment(album_id, 'shares')
+        except:
+            return {
+                       'success': True,
+                       'message': 'There was an issue updating the album shares'
+                   }, 500
 
         if not album:
             return {
@@ -971,26 +1162,24 @@ class AlbumSharesResource(Resource):
                        'message': 'Album not found'
                    }, 404
 
-        album.shares = album.shares + 1
-
-        try:
-            album.save()
-        except:
-            return {
-                       'success': True,
-                       'message': 'There was an issue updating the album shares'
-                   }, 500
+        counters.add('album', album_id, 'shares')
 
         return {
                    'success': True,
                    'message': 'Album shares updated successfully'
-               }, 201
+               }, 202 if write_behind.enabled else 201
 
 
 class MediaShareResource(Resource):
     @staticmethod
     def post(media_id):
-        media = Media.fetch_by_id(media_id)
+        try:
+            media = Media.increment(media_id, 'shares')
+        except:
+            return {
+                       'success': False,
+                       'message': 'There was an error updating the number of shares'
+                   }, 500
 
         if not media:
             return {
@@ -998,26 +1187,24 @@ class MediaShareResource(Resource):
                        'message': 'Media not found'
                    }, 404
 
-        media.shares = media.shares + 1
-
-        try:
-            media.save()
-        except:
-            return {
-                       'success': False,
-                       'message': 'There was an error updating the number of shares'
-                   }, 500
+        counters.add('media', media_id, 'shares')
 
         return {
                    'success': True,
                    'message': 'Media shares updated successfully'
-               }, 201
+               }, 202 if write_behind.enabled else 201
 
 
 class MediaPageViewsResource(Resource):
     @staticmethod
     def post(media_id):
-        media = Media.fetch_by_id(media_id)
+        try:
+            media = Media.increment(media_id, 'page_views')
+        except:
+            return {
+                       'success': False,
+                       'message': 'There was an error updating the number of page views'
+                   }, 500
 
         if not media:
             return {
@@ -1025,53 +1212,77 @@ class MediaPageViewsResource(Resource):
                        'message': 'Media not found'
                    }, 404
 
-        media.page_views = media.page_views + 1
-
-        try:
-            media.save()
-        except:
-            return {
-                       'success': False,
-                       'message': 'There was an error updating the number of page views'
-                   }, 500
+        counters.add('media', media_id, 'page_views')
 
         return {
                    'success': True,
                    'message': 'Media page views updated successfully'
-               }, 201
+               }, 202 if write_behind.enabled else 201
 
 
-class AlbumPageViewsResource(Resource):
+class MediaInsightsResource(Resource):
     @staticmethod
-    def post(album_id):
-        album = Album.fetch_by_id(album_id)
+    def get(media_id):
+        media = Media.fetch_by_id(media_id)
 
-        if not album:
+        if not media:
             return {
                        'success': False,
-                       'message': 'Album not found'
+                       'message': 'Media not found'
                    }, 404
 
-        album.page_views = album.page_views + 1
+        start, end, granularity = time_range(range_parser.parse_args())
+        sharded = shards.totals('media', media.id)
+
+        return {
+                   'success': True,
+                   'plays': media.plays + sharded.get('plays', 0),
+                   'likes': media.likes + sharded.get('likes', 0),
+                   'shares': media.shares + sharded.get('shares', 0),
+                   'page_views': media.page_views + sharded.get('page_views', 0),
+                   'listeners': ListenerSketch.estimate('media', [media.id], start, end) or 0,
+                   'granularity': granularity,
+                   'start': start.isoformat(),
+                   'end': end.isoformat(),
+                   'series': DailyCounter.series('media', [media.media_id], DailyCounter.METRICS, granularity, start, end)
+               }, 200
 
+
+class AlbumPageViewsResource(Resource):
+    @staticmethod
+    def post(album_id):
         try:
-            album.save()
+            album = Album.increment(album_id, 'page_views')
         except:
             return {
                        'success': True,
                        'message': 'There was an issue updating the album page views'
                    }, 500
 
+        if not album:
+            return {
+                       'success': False,
+                       'message': 'Album not found'
+                   }, 404
+
+        counters.add('album', album_id, 'page_views')
+
         return {
                    'success': True,
                    'message': 'Album page views updated successfully'
-               }, 201
+               }, 202 if write_behind.enabled else 201
 
 
 class PlaylistPageViewsResource(Resource):
     @staticmethod
     def post(playlist_id):
-        playlist = Playlist.fetch_by_id(playlist_id)
+        try:
+            playlist = Playlist.increment(playlist_id, 'page_views')
+        except:
+            return {
+                       'success': False,
+                       'message': 'Something went wrong while updatating the playlist page views'
+                   }, 500
 
         if not playlist:
             return {
@@ -1079,20 +1290,12 @@ class PlaylistPageViewsResource(Resource):
                        'message': 'playlist not found'
                    }, 404
 
-        playlist.page_views = playlist.page_views + 1
-
-        try:
-            playlist.save()
-        except:
-            return {
-                       'success': False,
-                       'message': 'Something went wrong while updatating the playlist page views'
-                   }, 500
+        counters.add('playlist', playlist_id, 'page_views')
 
         return {
             'success': True,
             'message': 'playlist page views updated'
-        }
+        }, 202 if write_behind.enabled else 200
 
 class StatusResource(Resource):
     parser =reqparse.RequestParser(trim=True)
@@ -1,8 +1,9 @@
 from mkondo import marshmallow
 from .models import Media, Playlist, Album, Comment, Genre
 from marshmallow import fields
+from mkondo.mixins import CounterSchemaMixin
 
-class MediaSchema(marshmallow.SQLAlchemySchema):
+class MediaSchema(CounterSchemaMixin, marshmallow.SQLAlchemySchema):
     composer = fields.String(allow_none=True)
     cover_url = fields.String(allow_none=True)
     release_date = fields.String(allow_none=True)
@@ -28,7 +29,7 @@ class MediaSchema(marshmallow.SQLAlchemySchema):
         dump_only = ('owner_name',)
 
 
-class PlaylistSchema(marshmallow.SQLAlchemySchema):
+class PlaylistSchema(CounterSchemaMixin, marshmallow.SQLAlchemySchema):
     songs = marshmallow.Nested(MediaSchema, many=True)
     owner_user_id = fields.String(attribute='owner.user_id')
 
@@ -39,7 +40,7 @@ class PlaylistSchema(marshmallow.SQLAlchemySchema):
         dump_only = ('songs', 'owner_user_id')
 
 
-class AlbumSchema(marshmallow.SQLAlchemySchema):
+class AlbumSchema(CounterSchemaMixin, marshmallow.SQLAlchemySchema):
     songs = marshmallow.Nested(MediaSchema, many=True)
     release_date = fields.String(allow_none=True)
     record_label = fields.String(allow_none=True)
@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+
+
+class Artifact:
+    """
+    A read only, memory mapped model version.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.version = os.path.basename(path)
+
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            self.meta = json.load(meta_file)
+
+        self.arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+            for name in self.meta['arrays']
+        }
+        self.models = {}
+
+    def section(self, prefix):
+        """
+        Return the arrays saved under a prefix, without the prefix.
+        """
+        start = len(prefix) + 1
+
+        return {name[start:]: array for name, array in self.arrays.items() if name.startswith(prefix + '.')}
+
+    def load(self, loader, prefix):
+        """
+        Build a model from the arrays under prefix once per artifact version.
+        """
+        key = (loader, prefix)
+
+        if key not in self.models:
+            self.models[key] = loader(self.section(prefix), **self.meta.get(prefix, {}))
+
+        return self.models[key]
+
+
+class ArtifactStore:
+    """
+    Versioned model artifacts on local disk.
+
+    Each version is a directory of .npy files that every worker maps read
+    only, so the pages are shared through the OS page cache instead of being
+    copied into each process. Publishing a version atomically replaces the
+    ``current`` symlink, workers pick it up on their next read.
+    """
+
+    CURRENT = 'current'
+
+    def __init__(self, app=None):
+        self.root = None
+        self.keep = 3
+        self._artifact = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config['RECOMMENDER_ARTIFACT_DIR']
+        self.keep = app.config.get('RECOMMENDER_ARTIFACT_KEEP', 3)
+
+    def publish(self, arrays, meta=None):
+        """
+        Write a new artifact version and make it the current one.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        version = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+        staging = os.path.join(self.root, f'.{version}')
+        os.makedirs(staging)
+
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f'{name}.npy'), np.ascontiguousarray(array), allow_pickle=False)
+
+        with open(os.path.join(staging, 'meta.json'), 'w') as meta_file:
+            json.dump(dict(meta or {}, arrays=sorted(arrays), version=version), meta_file)
+
+        os.rename(staging, os.path.join(self.root, version))
+
+        link = os.path.join(self.root, f'.{self.CURRENT}-{version}')
+        os.symlink(version, link)
+        os.replace(link, os.path.join(self.root, self.CURRENT))
+
+        self.prune()
+
+        return version
+
+    def versions(self):
+        """
+        List the published versions, oldest first.
+        """
+        if not os.path.isdir(self.root):
+            return []
+
+        return sorted(
+            name for name in os.listdir(self.root)
+            if not name.startswith('.') and name != self.CURRENT
+        )
+
+    def prune(self):
+        """
+        Remove all but the latest versions. Workers still mapping a removed
+        version keep reading it until they swap to the current one.
+        """
+        for version in self.versions()[:-self.keep]:
+            shutil.rmtree(os.path.join(self.root, version), ignore_errors=True)
+
+    def current(self):
+        """
+        Return the current artifact, remapping it when a new version was published.
+        """
+        try:
+            version = os.readlink(os.path.join(self.root, self.CURRENT))
+        except OSError:
+            return None
+
+        if self._artifact is None or self._artifact.version != version:
+            self._artifact = Artifact(os.path.join(self.root, version))
+
+        return self._artifact
@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class RecommendationCache:
+    """
+    Per process LRU cache of recommended media ids, evicted per user.
+
+    Entries expire after a TTL and are tagged with the model version that
+    produced them and the user's invalidation stamp, so publishing a new
+    model or recording a play for the user (via invalidate) makes the next
+    lookup a miss. Every uwsgi worker holds its own cache, the stamps are
+    kept in shared memory allocated when the app is created, so a play
+    recorded through any worker invalidates the entries of all of them.
+    Users are hashed to a fixed number of stamps, a collision only costs
+    an extra miss. The hit, miss and size counters are kept in shared
+    memory too, so the stats cover every worker.
+    """
+
+    COUNTS = ('hits', 'misses', 'expired', 'evictions', 'invalidations', 'size')
+
+    def __init__(self, app=None):
+        self.max_size = 10000
+        self.ttl = 300
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counts = np.zeros(len(self.COUNTS), dtype=np.int64)
+        self.stamps = np.zeros(1, dtype=np.int64)
+        self.shared_lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_size = app.config['RECOMMENDATION_CACHE_SIZE']
+        self.ttl = app.config['RECOMMENDATION_CACHE_TTL']
+
+        # Allocated before uwsgi forks the workers, which then share it.
+        slots = 1 << max(int(app.config['RECOMMENDATION_CACHE_STAMPS']) - 1, 1).bit_length()
+        self.stamps = np.frombuffer(multiprocessing.RawArray('q', slots), dtype=np.int64)
+        self.counts = np.frombuffer(multiprocessing.RawArray('q', len(self.COUNTS)), dtype=np.int64)
+        self.shared_lock = multiprocessing.Lock()
+
+    def count(self, name, value=1):
+        with self.shared_lock:
+            self.counts[self.COUNTS.index(name)] += value
+
+    def stamp(self, user_id):
+        """
+        The position of a user's invalidation stamp.
+        """
+        return zlib.crc32(str(user_id).encode()) & (len(self.stamps) - 1)
+
+    def get(self, strategy, user_id, version=None):
+        """
+        Return the cached media ids or None.
+        """
+        with self.lock:
+            entry = self.entries.get(user_id, {}).get(strategy)
+
+            if entry is None:
+                self.count('misses')
+                return None
+
+            expires, entry_version, stamp, media_ids = entry
+
+            if expires < time.monotonic() or entry_version != version or stamp != self.stamps[self.stamp(user_id)]:
+                del self.entries[user_id][strategy]
+                self.count('expired')
+                self.count('misses')
+                return None
+
+            self.entries.move_to_end(user_id)
+            self.count('hits')
+
+            return media_ids
+
+    def set(self, strategy, user_id, media_ids, version=None):
+        """
+        Cache the media ids recommended to a user.
+        """
+        with self.lock:
+            if user_id not in self.entries:
+                self.count('size')
+
+            self.entries.setdefault(user_id, {})[strategy] = (
+                time.monotonic() + self.ttl, version, int(self.stamps[self.stamp(user_id)]), list(media_ids)
+            )
+            self.entries.move_to_end(user_id)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.count('evictions')
+                self.count('size', -1)
+
+    def invalidate(self, user_id):
+        """
+        Drop every cached strategy for a user, in every worker.
+        """
+        with self.shared_lock:
+            self.stamps[self.stamp(user_id)] += 1
+
+        with self.lock:
+            if self.entries.pop(user_id, None) is not None:
+                self.count('invalidations')
+                self.count('size', -1)
+
+    def stats(self):
+        """
+        Return the hit/miss counters and size summed over every worker,
+        with this worker's pid and size.
+        """
+        with self.shared_lock:
+            counts = dict(zip(self.COUNTS, self.counts.tolist()))
+
+        lookups = counts['hits'] + counts['misses']
+
+        return dict(
+            counts,
+            max_size=self.max_size,
+            ttl=self.ttl,
+            hit_ratio=counts['hits'] / lookups if lookups else 0.0,
+            worker=dict(pid=os.getpid(), size=len(self.entries))
+        )
@@ -0,0 +1,163 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.postgresql import insert
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def bucket_start(day, granularity):
+    """
+    First day of the day, week (starting Monday) or month bucket holding day.
+    """
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+
+    if granularity == 'month':
+        return day.replace(day=1)
+
+    return day
+
+
+class PeriodicFlusher:
+    """
+    One daemon thread per worker flushing the registered buffers once their
+    flush_interval has passed, checked every interval seconds, so buffered
+    writes reach the database even when no new ones arrive. It is started
+    by the first add in each worker, needs uwsgi enable-threads.
+    """
+
+    def __init__(self, interval=1):
+        self.interval = interval
+        self.buffers = []
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def register(self, buffer):
+        if buffer not in self.buffers:
+            self.buffers.append(buffer)
+
+    def start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+
+            self.pid = os.getpid()
+
+        threading.Thread(target=self.run, name='buffer-flusher', daemon=True).start()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.tick()
+
+    def tick(self):
+        """
+        Flush the buffers that are due, returns the number of rows written.
+        """
+        written = 0
+
+        for buffer in self.buffers:
+            if buffer.pending and time.monotonic() - buffer.last_flush >= buffer.flush_interval:
+                try:
+                    written += buffer.flush()
+                except Exception as e:
+                    logging.error(e)
+
+        return written
+
+
+flusher = PeriodicFlusher()
+
+
+class CounterBuffer:
+    """
+    Per process write buffer for the daily_counters time series.
+
+    Increments are summed in memory per (entity, metric, UTC day) and
+    written by the flusher thread once flush_interval seconds have passed,
+    once max_size keys are pending, or at exit, as a single multi row upsert
+    into the day, week and month buckets. A crash loses the increments
+    buffered since the last successful flush, at most about flush_interval
+    seconds of them while the database is reachable.
+    """
+
+    def __init__(self, db, app=None):
+        self.app = None
+        self.db = db
+        self.flush_interval = 10
+        self.max_size = 1000
+        self.pending = {}
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config['COUNTER_FLUSH_INTERVAL']
+        self.max_size = app.config['COUNTER_BUFFER_SIZE']
+        flusher.register(self)
+        atexit.register(self.flush)
+
+    def add(self, entity_type, entity_id, metric, value=1, day=None):
+        """
+        Count value for an entity's metric today, flushing when due.
+        """
+        flusher.start()
+        key = (entity_type, str(entity_id), metric, day or datetime.utcnow().date())
+
+        with self.lock:
+            self.pending[key] = self.pending.get(key, 0) + value
+            due = len(self.pending) >= self.max_size or time.monotonic() - self.last_flush >= self.flush_interval
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the pending increments, returns the number of rows upserted.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+
+        if not pending or self.app is None:
+            return 0
+
+        rows = {}
+
+        for (entity_type, entity_id, metric, day), value in pending.items():
+            for granularity in GRANULARITIES:
+                key = (entity_type, entity_id, metric, granularity, bucket_start(day, granularity))
+                rows[key] = rows.get(key, 0) + value
+
+        table = self.db.metadata.tables['daily_counters']
+        statement = insert(table).values([
+            dict(entity_type=entity_type, entity_id=entity_id, metric=metric, granularity=granularity, bucket=bucket, value=value)
+            for (entity_type, entity_id, metric, granularity, bucket), value in rows.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.entity_type, table.c.entity_id, table.c.metric, table.c.granularity, table.c.bucket],
+            set_={'value': table.c.value + statement.excluded.value}
+        )
+
+        try:
+            with self.db.get_engine(self.app).begin() as connection:
+                connection.execute(statement)
+        except Exception as e:
+            logging.error(e)
+
+            # Keep the increments for the next flush rather than dropping them.
+            with self.lock:
+                for key, value in pending.items():
+                    self.pending[key] = self.pending.get(key, 0) + value
+
+            return 0
+
+        return len(rows)
@@ -0,0 +1,133 @@
+import csv
+import io
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import select, func
+
+from mkondo import db, shards
+
+GZIP_WINDOW = 16 + zlib.MAX_WBITS
+
+
+def export_tables():
+    """
+    The exportable tables as (columns, watermark column). Only analytics
+    columns are exported, never contact details or credentials. The
+    watermark is the updated column, set on every write including the
+    counter statements and upserts, so changed rows are exported again.
+    """
+    tables = db.metadata.tables
+    history, media, users = tables['media_user_history'], tables['media'], tables['users']
+
+    return {
+        'history': (
+            [history.c.user_id, history.c.media_id, history.c.plays, history.c.last_played, history.c.updated],
+            history.c.updated
+        ),
+        'media': (
+            [media.c.id, media.c.media_id, media.c.name, media.c.category, media.c.duration, media.c.owner_id,
+             media.c.album_id, media.c.plays, media.c.likes, media.c.shares, media.c.page_views, media.c.archived,
+             media.c.added, media.c.edited, media.c.updated],
+            media.c.updated
+        ),
+        'users': (
+            [users.c.id, users.c.user_id, users.c.user_type, users.c.country, users.c.geo_country,
+             users.c.geo_region, users.c.archived, users.c.joined, users.c.last_active, users.c.updated],
+            users.c.updated
+        ),
+    }
+
+
+class Export:
+    """
+    A gzip compressed CSV export of one table, streamed through a server
+    side cursor a chunk of rows at a time so memory use stays constant.
+
+    Incremental exports pass the watermark of the previous export as since,
+    only rows with since < watermark column <= watermark are exported, the
+    upper bound being fixed when the export starts. The counter shards are
+    folded first so the exported counters include them.
+
+    The watermark column is set by the application before its transaction
+    commits, so the watermark trails the database clock by lag seconds and
+    newer rows wait for the next export. A row is only missed when its
+    transaction commits more than lag seconds after setting it, or when the
+    application and database clocks differ by more than that.
+    """
+
+    def __init__(self, table, since=None, chunk_size=10000, lag=None):
+        tables = export_tables()
+
+        if table not in tables:
+            raise KeyError(f'Unknown export table {table}, choices are {", ".join(sorted(tables))}')
+
+        # Timestamps are stored as naive UTC.
+        if since is not None and since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+        self.table = table
+        self.columns, self.watermark_column = tables[table]
+        self.since = since
+        self.chunk_size = chunk_size
+        self.rows = 0
+
+        if shards.enabled:
+            shards.fold()
+
+        if lag is None:
+            lag = current_app.config['EXPORT_WATERMARK_LAG']
+
+        settled = func.timezone('utc', func.statement_timestamp()) - timedelta(seconds=lag)
+        watermark = db.session.query(func.least(func.max(self.watermark_column), settled)).scalar()
+        self.watermark = max(watermark, since) if since is not None else watermark
+
+    def query(self):
+        query = select(self.columns)
+
+        if self.since is not None:
+            query = query.where(self.watermark_column > self.since)
+
+        if self.watermark is not None:
+            query = query.where(self.watermark_column <= self.watermark)
+
+        return query
+
+    def __iter__(self):
+        """
+        Yield the compressed file in chunks.
+        """
+        compressor = zlib.compressobj(wbits=GZIP_WINDOW)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([column.name for column in self.columns])
+
+        with db.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(self.query())
+
+            while True:
+                rows = result.fetchmany(self.chunk_size)
+
+                if not rows:
+                    break
+
+                writer.writerows(
+                    [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows
+                )
+                self.rows += len(rows)
+                yield compressor.compress(buffer.getvalue().encode())
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield compressor.compress(buffer.getvalue().encode()) + compressor.flush()
+
+    def write(self, path):
+        """
+        Write the export to a file, returns the number of rows exported.
+        """
+        with open(path, 'wb') as export_file:
+            for chunk in self:
+                export_file.write(chunk)
+
+        return self.rows
@@ -0,0 +1,121 @@
+import csv
+import ipaddress
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+
+class GeoIP:
+    """
+    Local IPv4 geolocation from a memory mapped table of address ranges.
+
+    The database is a directory of sorted range starts and ends (uint32)
+    with an index into a list of (country, region) names, built once from a
+    CSV export with build. A lookup is a binary search over the starts, and
+    recent addresses are kept in an LRU cache once the database is loaded.
+    """
+
+    UNKNOWN = (None, None)
+
+    def __init__(self, app=None):
+        self.path = None
+        self.cache_size = 65536
+        self.starts = None
+        self.ends = None
+        self.locations = None
+        self.names = None
+        self.cached_lookup = lru_cache(maxsize=self.cache_size)(self._lookup)
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config['GEOIP_DATABASE']
+        self.cache_size = app.config.get('GEOIP_CACHE_SIZE', 65536)
+        self.cached_lookup = lru_cache(maxsize=self.cache_size)(self._lookup)
+
+    def load(self):
+        """
+        Map the database, returns False when it has not been built.
+        """
+        if self.starts is not None:
+            return True
+
+        if not self.path or not os.path.exists(os.path.join(self.path, 'names.json')):
+            return False
+
+        with open(os.path.join(self.path, 'names.json')) as names_file:
+            self.names = [tuple(name) for name in json.load(names_file)]
+
+        self.ends = np.load(os.path.join(self.path, 'ends.npy'), mmap_mode='r')
+        self.locations = np.load(os.path.join(self.path, 'locations.npy'), mmap_mode='r')
+        self.starts = np.load(os.path.join(self.path, 'starts.npy'), mmap_mode='r')
+
+        return True
+
+    def lookup(self, ip_address):
+        """
+        Return the (country, region) of an IPv4 address, (None, None) when
+        unknown. Nothing is cached until the database has been built, so
+        addresses looked up before are resolved once it is.
+        """
+        if not self.load():
+            return self.UNKNOWN
+
+        return self.cached_lookup(ip_address)
+
+    def _lookup(self, ip_address):
+        try:
+            address = int(ipaddress.IPv4Address(ip_address))
+        except (ipaddress.AddressValueError, ValueError, TypeError):
+            return self.UNKNOWN
+
+        position = int(np.searchsorted(self.starts, address, side='right')) - 1
+
+        if position < 0 or address > self.ends[position]:
+            return self.UNKNOWN
+
+        return self.names[self.locations[position]]
+
+    @staticmethod
+    def build(csv_path, path):
+        """
+        Build the database from a CSV of start_ip,end_ip,country,region rows,
+        like the free DB-IP and IP2Location lite exports. Addresses may be
+        dotted quads or integers, IPv6 ranges, in either form, are skipped.
+        """
+        starts, ends, locations = [], [], []
+        names = {}
+
+        with open(csv_path, newline='') as csv_file:
+            for row in csv.reader(csv_file):
+                if len(row) < 3:
+                    continue
+
+                try:
+                    start = int(row[0]) if row[0].isdigit() else int(ipaddress.IPv4Address(row[0]))
+                    end = int(row[1]) if row[1].isdigit() else int(ipaddress.IPv4Address(row[1]))
+                except ValueError:
+                    continue
+
+                if end > 0xFFFFFFFF:
+                    continue
+
+                name = (row[2] or None, row[3] if len(row) > 3 and row[3] else None)
+                starts.append(start)
+                ends.append(end)
+                locations.append(names.setdefault(name, len(names)))
+
+        order = np.argsort(np.array(starts, dtype=np.uint32), kind='stable')
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'starts.npy'), np.array(starts, dtype=np.uint32)[order])
+        np.save(os.path.join(path, 'ends.npy'), np.array(ends, dtype=np.uint32)[order])
+        np.save(os.path.join(path, 'locations.npy'), np.array(locations, dtype=np.int32)[order])
+
+        # names.json is written last, load() treats it as the marker of a complete build.
+        with open(os.path.join(path, 'names.json'), 'w') as names_file:
+            json.dump(sorted(names, key=names.get), names_file)
+
+        return len(starts)
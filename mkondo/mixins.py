@@ -0,0 +1,89 @@
+from marshmallow import post_dump
+
+from mkondo import db, write_behind, shards
+from mkondo.writebehind import apply_increments
+
+
+class CounterMixin:
+    """
+    Atomic counter updates for models looked up by a public id.
+
+    PUBLIC_ID names the public id column and COUNTERS the counter columns.
+    COUNTER_ROLLUPS maps a counter to the (table, key column, returned
+    attribute) of a rollup row incremented along with it, like the artist
+    statistics of a media's owner. Rows written often enough are promoted
+    to sharded counters, see ShardedCounters.
+    """
+
+    PUBLIC_ID = None
+    COUNTERS = ()
+    COUNTER_ROLLUPS = {}
+
+    @classmethod
+    def increment(cls, public_id, field, n=1):
+        """
+        Add n to a counter with a single UPDATE ... RETURNING, without
+        loading the row. Returns the row's id, rollup keys and new value,
+        None when no row has the id. When write behind counters are enabled
+        the increment is buffered instead, and the increments of a hot row
+        go to its counter shards, then the value returned is None.
+        """
+        if field not in cls.COUNTERS:
+            raise ValueError(f'{field} is not a counter of {cls.__tablename__}')
+
+        table = cls.__table__
+        rollup = cls.COUNTER_ROLLUPS.get(field)
+        rollup_keys = sorted({key for _, _, key in cls.COUNTER_ROLLUPS.values()})
+        returning = [table.c.id] + [table.c[name] for name in rollup_keys]
+        where = table.c[cls.PUBLIC_ID] == str(public_id)
+
+        if write_behind.enabled:
+            row = db.session.query(*returning, db.null().label(field)).filter(where).first()
+
+            if row is not None:
+                write_behind.add(table.name, row.id, field, n)
+
+                if rollup:
+                    write_behind.add(rollup[0], getattr(row, rollup[2]), field, n)
+
+            return row
+
+        sharded = shards.increment(cls, public_id, field, n)
+
+        if sharded is not None:
+            return sharded
+
+        result = db.session.execute(
+            table.update().where(where).values({field: table.c[field] + n}).returning(*returning, table.c[field])
+        )
+        row = result.first()
+
+        if row is None:
+            return None
+
+        if rollup:
+            apply_increments(db.session, db.metadata.tables, {(rollup[0], field): {getattr(row, rollup[2]): n}})
+
+        db.session.commit()
+        shards.observe(table.name, public_id, row.id, getattr(row, rollup_keys[0]) if rollup_keys else None)
+
+        return row
+
+
+class CounterSchemaMixin:
+    """
+    Serializes the counters of a CounterMixin model with the not yet folded
+    increments of its counter shards, in one query per dump.
+    """
+
+    @post_dump(pass_many=True, pass_original=True)
+    def add_shard_totals(self, data, original, many, **kwargs):
+        rows, items = (list(original), data) if many else ([original], [data])
+        totals = shards.bulk_totals(self.Meta.model.__tablename__, [row.id for row in rows])
+
+        for row, item in zip(rows, items):
+            for field, value in totals.get(row.id, {}).items():
+                if item.get(field) is not None:
+                    item[field] += value
+
+        return data
@@ -1,5 +1,7 @@
 import os
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 
 class Config(object):
     DEBUG = False
@@ -10,6 +12,46 @@ class Config(object):
     PROPAGATE_EXCEPTIONS = True
     SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY')
     SENDGRID_DEFAULT_FROM = os.environ.get('SENDGRID_DEFAULT_FROM')
+    POPULARITY_HALF_LIFE_DAYS = float(os.environ.get('POPULARITY_HALF_LIFE_DAYS', 7))
+    POPULARITY_TOP_N = int(os.environ.get('POPULARITY_TOP_N', 100))
+    POPULARITY_REFRESH_INTERVAL = int(os.environ.get('POPULARITY_REFRESH_INTERVAL', 15 * 60))
+    RECOMMENDER_ARTIFACT_DIR = os.environ.get('RECOMMENDER_ARTIFACT_DIR', os.path.join(ROOT_DIR, 'artifacts', 'recommender'))
+    RECOMMENDER_ARTIFACT_KEEP = int(os.environ.get('RECOMMENDER_ARTIFACT_KEEP', 3))
+    RECOMMENDER_SIMILARITY = os.environ.get('RECOMMENDER_SIMILARITY', 'jaccard')
+    RECOMMENDER_LSH = os.environ.get('RECOMMENDER_LSH', 'false').lower() in ('1', 'true', 'yes')
+    RECOMMENDER_LSH_PERMUTATIONS = int(os.environ.get('RECOMMENDER_LSH_PERMUTATIONS', 128))
+    RECOMMENDER_LSH_BANDS = int(os.environ.get('RECOMMENDER_LSH_BANDS', 64))
+    RECOMMENDER_ALS_FACTORS = int(os.environ.get('RECOMMENDER_ALS_FACTORS', 32))
+    RECOMMENDER_ALS_REGULARIZATION = float(os.environ.get('RECOMMENDER_ALS_REGULARIZATION', 0.05))
+    RECOMMENDER_ALS_ALPHA = float(os.environ.get('RECOMMENDER_ALS_ALPHA', 10))
+    RECOMMENDER_ALS_ITERATIONS = int(os.environ.get('RECOMMENDER_ALS_ITERATIONS', 10))
+    RECOMMENDER_TRAIN_INTERVAL = int(os.environ.get('RECOMMENDER_TRAIN_INTERVAL', 60 * 60))
+    MEDIA_NEIGHBORS_TOP_K = int(os.environ.get('MEDIA_NEIGHBORS_TOP_K', 20))
+    ARTIST_SIMILARITY_TOP_K = int(os.environ.get('ARTIST_SIMILARITY_TOP_K', 20))
+    ARTIST_SIMILARITY_INTERVAL = int(os.environ.get('ARTIST_SIMILARITY_INTERVAL', 30 * 60))
+    ARTIST_STATS_RECONCILE_INTERVAL = int(os.environ.get('ARTIST_STATS_RECONCILE_INTERVAL', 60 * 60))
+    COUNTER_FLUSH_INTERVAL = int(os.environ.get('COUNTER_FLUSH_INTERVAL', 10))
+    COUNTER_BUFFER_SIZE = int(os.environ.get('COUNTER_BUFFER_SIZE', 1000))
+    COUNTER_WRITE_BEHIND = os.environ.get('COUNTER_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+    COUNTER_WRITE_BEHIND_INTERVAL = int(os.environ.get('COUNTER_WRITE_BEHIND_INTERVAL', 5))
+    COUNTER_WRITE_BEHIND_MAX_PENDING = int(os.environ.get('COUNTER_WRITE_BEHIND_MAX_PENDING', 10000))
+    COUNTER_WRITE_BEHIND_SLOTS = int(os.environ.get('COUNTER_WRITE_BEHIND_SLOTS', 65536))
+    COUNTER_SHARDS = os.environ.get('COUNTER_SHARDS', 'false').lower() in ('1', 'true', 'yes')
+    COUNTER_SHARD_COUNT = int(os.environ.get('COUNTER_SHARD_COUNT', 16))
+    COUNTER_HOT_RATE = float(os.environ.get('COUNTER_HOT_RATE', 20))
+    COUNTER_HOT_WINDOW = int(os.environ.get('COUNTER_HOT_WINDOW', 10))
+    COUNTER_HOT_TTL = int(os.environ.get('COUNTER_HOT_TTL', 10 * 60))
+    COUNTER_SHARD_FOLD_INTERVAL = int(os.environ.get('COUNTER_SHARD_FOLD_INTERVAL', 30))
+    EVENTS_MAX_BATCH = int(os.environ.get('EVENTS_MAX_BATCH', 500))
+    INSIGHT_SNAPSHOT_TTL = int(os.environ.get('INSIGHT_SNAPSHOT_TTL', 10 * 60))
+    INSIGHT_SNAPSHOT_INTERVAL = int(os.environ.get('INSIGHT_SNAPSHOT_INTERVAL', 5 * 60))
+    INSIGHT_JOB_TIMEOUT = int(os.environ.get('INSIGHT_JOB_TIMEOUT', 10 * 60))
+    EXPORT_WATERMARK_LAG = int(os.environ.get('EXPORT_WATERMARK_LAG', 5 * 60))
+    GEOIP_DATABASE = os.environ.get('GEOIP_DATABASE', os.path.join(ROOT_DIR, 'artifacts', 'geoip'))
+    GEOIP_CACHE_SIZE = int(os.environ.get('GEOIP_CACHE_SIZE', 65536))
+    RECOMMENDATION_CACHE_SIZE = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 10000))
+    RECOMMENDATION_CACHE_TTL = int(os.environ.get('RECOMMENDATION_CACHE_TTL', 5 * 60))
+    RECOMMENDATION_CACHE_STAMPS = int(os.environ.get('RECOMMENDATION_CACHE_STAMPS', 65536))
 
 
 class Production(Config):
@@ -23,7 +65,14 @@ class Development(Config):
     TESTING = True
 
 
+class Testing(Config):
+    TESTING = True
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'testing')
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_SQLALCHEMY_DATABASE_URI')
+
+
 app_config = {
     'production': Production,
-    'development': Development
+    'development': Development,
+    'testing': Testing
 }
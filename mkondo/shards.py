@@ -0,0 +1,207 @@
+import logging
+import random
+import threading
+import time
+import types
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+
+from .writebehind import apply_increments
+
+
+class ShardedCounters:
+    """
+    Sharded counters for hot rows.
+
+    Every process counts the counter writes per row in windows of window
+    seconds. A row written more than hot_rate times a second is promoted in
+    hot_counters for ttl seconds, renewed while it stays hot. Increments of
+    a promoted row, and of the row it rolls up to, are upserted into one of
+    shard_count counter_shards slots chosen at random instead of updating
+    the row, so concurrent writers rarely wait on the same row lock.
+
+    Reads add the slots to the column with totals, the counter schemas do
+    it for every serialized row. The fold job moves the slots into the
+    columns and drops the expired promotions, exports fold first.
+    """
+
+    def __init__(self, db, app=None):
+        self.app = None
+        self.db = db
+        self.enabled = False
+        self.shard_count = 16
+        self.hot_rate = 20
+        self.window = 10
+        self.ttl = 600
+        self.hot_rows = {}
+        self.hot_loaded = 0
+        self.writes = {}
+        self.window_start = time.monotonic()
+        self.lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['COUNTER_SHARDS']
+        self.shard_count = app.config['COUNTER_SHARD_COUNT']
+        self.hot_rate = app.config['COUNTER_HOT_RATE']
+        self.window = app.config['COUNTER_HOT_WINDOW']
+        self.ttl = app.config['COUNTER_HOT_TTL']
+
+    def hot(self, table_name, public_id):
+        """
+        Return (row id, rollup id) when the row is promoted, from a per
+        process copy of hot_counters reloaded every window seconds.
+        """
+        if not self.enabled:
+            return None
+
+        if time.monotonic() - self.hot_loaded >= self.window:
+            self.hot_loaded = time.monotonic()
+            table = self.db.metadata.tables['hot_counters']
+
+            try:
+                with self.db.get_engine(self.app).connect() as connection:
+                    rows = connection.execute(
+                        select([table.c.table_name, table.c.public_id, table.c.row_id, table.c.rollup_id])
+                        .where(table.c.expires > datetime.utcnow())
+                    ).fetchall()
+            except Exception as e:
+                logging.error(e)
+            else:
+                self.hot_rows = {(row[0], row[1]): (row[2], row[3]) for row in rows}
+
+        return self.hot_rows.get((table_name, str(public_id)))
+
+    def observe(self, table_name, public_id, row_id, rollup_id=None):
+        """
+        Count a write to a row, promoting it once its rate crosses hot_rate.
+        """
+        if not self.enabled:
+            return
+
+        key = (table_name, str(public_id))
+
+        with self.lock:
+            if time.monotonic() - self.window_start >= self.window:
+                self.writes = {}
+                self.window_start = time.monotonic()
+
+            self.writes[key] = self.writes.get(key, 0) + 1
+            promote = self.writes[key] == int(self.hot_rate * self.window)
+
+        if promote:
+            self.promote(table_name, public_id, row_id, rollup_id)
+
+    def promote(self, table_name, public_id, row_id, rollup_id=None):
+        table = self.db.metadata.tables['hot_counters']
+        expires = datetime.utcnow() + timedelta(seconds=self.ttl)
+        statement = insert(table).values(
+            table_name=table_name, public_id=str(public_id), row_id=row_id, rollup_id=rollup_id,
+            promoted=datetime.utcnow(), expires=expires
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.table_name, table.c.public_id],
+            set_={'expires': statement.excluded.expires}
+        )
+
+        try:
+            with self.db.get_engine(self.app).begin() as connection:
+                connection.execute(statement)
+        except Exception as e:
+            logging.error(e)
+            return
+
+        self.hot_rows[(table_name, str(public_id))] = (row_id, rollup_id)
+
+    def add(self, table_name, row_id, field, value=1):
+        """
+        Upsert an increment into a random shard slot, the caller commits.
+        """
+        table = self.db.metadata.tables['counter_shards']
+        statement = insert(table).values(
+            table_name=table_name, row_id=row_id, field=field, shard=random.randrange(self.shard_count), value=value
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.table_name, table.c.row_id, table.c.field, table.c.shard],
+            set_={'value': table.c.value + statement.excluded.value}
+        )
+        self.db.session.execute(statement)
+
+    def increment(self, model, public_id, field, n=1):
+        """
+        Increment a counter of a promoted row through the shards, returns a
+        row like the model's increment, with no value, or None when the row
+        is not promoted.
+        """
+        hot = self.hot(model.__tablename__, public_id)
+
+        if hot is None:
+            return None
+
+        row_id, rollup_id = hot
+        rollup = model.COUNTER_ROLLUPS.get(field)
+        self.add(model.__tablename__, row_id, field, n)
+
+        if rollup and rollup_id is not None:
+            self.add(rollup[0], rollup_id, field, n)
+
+        self.db.session.commit()
+        self.observe(model.__tablename__, public_id, row_id, rollup_id)
+
+        return types.SimpleNamespace(**dict({field: None, 'id': row_id}, **({rollup[2]: rollup_id} if rollup else {})))
+
+    def totals(self, table_name, row_id):
+        """
+        The not yet folded increments of a row, {field: value}.
+        """
+        return self.bulk_totals(table_name, [row_id]).get(row_id, {})
+
+    def bulk_totals(self, table_name, row_ids):
+        """
+        The not yet folded increments of rows in one query,
+        {row id: {field: value}} for the rows that have any.
+        """
+        if not self.enabled or not row_ids:
+            return {}
+
+        table = self.db.metadata.tables['counter_shards']
+
+        rows = self.db.session.execute(
+            select([table.c.row_id, table.c.field, func.sum(table.c.value)])
+            .where((table.c.table_name == table_name) & table.c.row_id.in_(list(row_ids)))
+            .group_by(table.c.row_id, table.c.field)
+        ).fetchall()
+        totals = {}
+
+        for row_id, field, value in rows:
+            totals.setdefault(row_id, {})[field] = int(value)
+
+        return totals
+
+    def fold(self):
+        """
+        Move every shard slot into its row's column and drop expired
+        promotions in one transaction, returns the number of slots folded.
+        """
+        tables = self.db.metadata.tables
+        shards, hot_counters = tables['counter_shards'], tables['hot_counters']
+
+        with self.db.get_engine(self.app).begin() as connection:
+            rows = connection.execute(
+                shards.delete().returning(shards.c.table_name, shards.c.row_id, shards.c.field, shards.c.value)
+            ).fetchall()
+            increments = {}
+
+            for table_name, row_id, field, value in rows:
+                fields = increments.setdefault((table_name, field), {})
+                fields[row_id] = fields.get(row_id, 0) + int(value)
+
+            apply_increments(connection, tables, increments)
+            connection.execute(hot_counters.delete().where(hot_counters.c.expires <= datetime.utcnow()))
+
+        return len(rows)
@@ -1,9 +1,15 @@
 import os
 
 import sendgrid
+from flask import current_app
 from sendgrid.helpers.mail import *
 
-from mkondo import celery
+from mkondo import celery, artifacts, db, shards
+from media.models import MediaPopularity, GenrePopularity, MediaNeighbor, ArtistStats
+from media.lsh import MinHashLSHIndex
+from media.recommender import ImplicitALSRecommender, SimilarityRecommender
+from users.models import MediaUserHistory, ArtistSimilarity, InsightJob
+from users.insights import UsersInsights, InsightReports
 
 @celery.task
 def send_mail(to, subject, html_content):
@@ -18,3 +24,111 @@ def send_mail(to, subject, html_content):
     content = Content('text/html', html_content)
     mail = Mail(from_email, to_email, subject, html_content=content)
     response = sg.client.mail.send.post(request_body=mail.get())
+
+
+@celery.task
+def refresh_popularity_rankings():
+    """
+    Recompute the materialized, time decayed popularity rankings, overall,
+    per category and per genre.
+    """
+    half_life_days = current_app.config['POPULARITY_HALF_LIFE_DAYS']
+    amount = current_app.config['POPULARITY_TOP_N']
+
+    return {
+        'media': MediaPopularity.refresh(half_life_days=half_life_days, amount=amount),
+        'genres': GenrePopularity.refresh(half_life_days=half_life_days, amount=amount),
+    }
+
+
+@celery.task
+def train_recommender_models():
+    """
+    Train the recommender models offline and publish them as a new
+    memory mapped artifact version for the web workers, refreshing the
+    media neighbours table from the same listening matrix.
+    """
+    interactions = MediaUserHistory.load_interactions()
+
+    similarity = SimilarityRecommender(similarity=current_app.config['RECOMMENDER_SIMILARITY'])
+    similarity.fit(interactions)
+
+    als = ImplicitALSRecommender(
+        factors=current_app.config['RECOMMENDER_ALS_FACTORS'],
+        regularization=current_app.config['RECOMMENDER_ALS_REGULARIZATION'],
+        alpha=current_app.config['RECOMMENDER_ALS_ALPHA'],
+        iterations=current_app.config['RECOMMENDER_ALS_ITERATIONS']
+    )
+    als.fit(interactions)
+
+    MediaNeighbor.refresh(similarity.listeners, interactions.media_ids, amount=current_app.config['MEDIA_NEIGHBORS_TOP_K'])
+
+    arrays = {f'similarity.{name}': array for name, array in similarity.to_arrays().items()}
+    arrays.update({f'als.{name}': array for name, array in als.to_arrays().items()})
+    meta = {'similarity': {'similarity': similarity.similarity}, 'als': als.meta()}
+
+    # Exact sparse scoring is faster than the index at the catalogue sizes
+    # measured by benchmarks/lsh.py, the index is only built when enabled.
+    if current_app.config['RECOMMENDER_LSH']:
+        index = MinHashLSHIndex(
+            num_perm=current_app.config['RECOMMENDER_LSH_PERMUTATIONS'],
+            bands=current_app.config['RECOMMENDER_LSH_BANDS']
+        ).build(similarity.interactions)
+        arrays.update({f'lsh.{name}': array for name, array in index.to_arrays().items()})
+        meta['lsh'] = index.meta()
+
+    return artifacts.publish(arrays, meta=meta)
+
+
+@celery.task
+def refresh_artist_similarity(full=False):
+    """
+    Update the co-listening artist neighbours of artists with new plays.
+    """
+    return ArtistSimilarity.refresh(amount=current_app.config['ARTIST_SIMILARITY_TOP_K'], full=full)
+
+
+@celery.task
+def reconcile_artist_stats():
+    """
+    Recompute the artist statistics rollup from the source tables.
+    """
+    return ArtistStats.reconcile()
+
+
+@celery.task
+def fold_counter_shards():
+    """
+    Fold the counter shards of hot rows back into their columns.
+    """
+    return shards.fold()
+
+
+@celery.task
+def refresh_insight_snapshots():
+    """
+    Recompute the platform wide insight snapshots served to the dashboard.
+    """
+    return UsersInsights.refresh_audio_insights().computed.isoformat()
+
+
+@celery.task
+def run_insight_job(job_id):
+    """
+    Compute an insight report outside of the web workers.
+    """
+    job = InsightJob.fetch_by_id(job_id)
+
+    if job is None or job.status != InsightJob.PENDING:
+        return None
+
+    job.status = InsightJob.RUNNING
+    job.save()
+
+    try:
+        job.finish(result=InsightReports.compute(job.kind, job.params))
+    except Exception as e:
+        db.session.rollback()
+        job.finish(error=str(e))
+
+    return job.status
@@ -0,0 +1,251 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+
+# Rollup tables, keyed by the id of the row they roll up to. Their rows may
+# not exist yet, so they are upserted.
+KEY_COLUMNS = {'artist_stats': 'artist_id'}
+
+
+def apply_increments(connection, tables, increments):
+    """
+    Apply {(table, field): {row id: increment}} with one atomic
+    UPDATE table SET field = field + n per table, field and distinct n,
+    and one INSERT ... ON CONFLICT DO UPDATE per rollup table and field,
+    which creates the missing rows. The connection may be a session, then
+    the caller commits.
+    """
+    for (table_name, field), rows in increments.items():
+        table = tables[table_name]
+
+        if table_name in KEY_COLUMNS:
+            key_column = table.c[KEY_COLUMNS[table_name]]
+            statement = insert(table).values([
+                {key_column.name: row_id, field: value} for row_id, value in sorted(rows.items())
+            ])
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[key_column], set_={field: table.c[field] + statement.excluded[field]}
+            ))
+            continue
+
+        key_column = table.c.id
+        by_value = {}
+
+        for row_id, value in rows.items():
+            by_value.setdefault(value, []).append(row_id)
+
+        for value, row_ids in by_value.items():
+            connection.execute(table.update().where(key_column.in_(row_ids)).values({field: table.c[field] + value}))
+
+
+class WriteBehindCounters:
+    """
+    Counter increments buffered in shared memory and written behind.
+
+    The buffer is an open addressing hash table of (table, field, row) ->
+    increment allocated in anonymous shared memory when the app is created,
+    so uwsgi workers forked from the master all add to the same table. It is
+    flushed every interval seconds, or once max_pending increments are
+    buffered, as batched atomic ``UPDATE table SET field = field + n``
+    statements, one per table, field and increment.
+
+    A crash loses at most the increments buffered since the last flush, so
+    at most interval seconds or max_pending increments. When disabled every
+    increment is written immediately with the same atomic UPDATE.
+    """
+
+    TABLES = ('media', 'albums', 'playlists', 'artist_stats', 'notifications')
+    FIELDS = ('plays', 'likes', 'shares', 'page_views', 'comments', 'opened')
+    STATS = ('buffered', 'pending', 'flushed', 'flushes', 'failures', 'overflows', 'last_flush')
+
+    ROW_BITS = 48
+    ROW_MASK = (1 << ROW_BITS) - 1
+
+    def __init__(self, db, app=None):
+        self.db = db
+        self.app = None
+        self.enabled = False
+        self.interval = 5
+        self.max_pending = 10000
+        self.lock = None
+        self.keys = None
+        self.values = None
+        self.stats_array = None
+        self.flusher_pid = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['COUNTER_WRITE_BEHIND']
+        self.interval = app.config['COUNTER_WRITE_BEHIND_INTERVAL']
+        self.max_pending = app.config['COUNTER_WRITE_BEHIND_MAX_PENDING']
+
+        if not self.enabled:
+            return
+
+        # Allocated before uwsgi forks the workers, which then share it.
+        slots = 1 << max(int(app.config['COUNTER_WRITE_BEHIND_SLOTS']) - 1, 1).bit_length()
+        self.lock = multiprocessing.Lock()
+        self.keys = np.frombuffer(multiprocessing.RawArray('q', slots), dtype=np.int64)
+        self.values = np.frombuffer(multiprocessing.RawArray('q', slots), dtype=np.int64)
+        self.stats_array = np.frombuffer(multiprocessing.RawArray('q', len(self.STATS)), dtype=np.int64)
+        self.stats_array[self.STATS.index('last_flush')] = int(time.time())
+        atexit.register(self.flush)
+
+    def key(self, table, row_id, field):
+        return ((self.TABLES.index(table) + 1) << 56) | (self.FIELDS.index(field) << self.ROW_BITS) | int(row_id)
+
+    def _slot(self, key):
+        slots = len(self.keys)
+        slot = ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> (64 - (slots.bit_length() - 1))
+
+        for probe in range(slots):
+            position = (slot + probe) & (slots - 1)
+
+            if self.keys[position] == key or self.keys[position] == 0:
+                return position
+
+        return None
+
+    def add(self, table, row_id, field, value=1):
+        """
+        Add value to a counter column of a row, identified by its primary key.
+        """
+        if not self.enabled:
+            self.write({(table, field): {int(row_id): value}})
+            return
+
+        self._start_flusher()
+        key = self.key(table, row_id, field)
+
+        with self.lock:
+            position = self._slot(key)
+
+            if position is not None:
+                self.keys[position] = key
+                self.values[position] += value
+                self._count('buffered', value)
+                self._count('pending', value)
+
+            due = self.stats_array[self.STATS.index('pending')] >= self.max_pending or \
+                time.time() - self.stats_array[self.STATS.index('last_flush')] >= self.interval
+
+        if position is None:
+            # The buffer is full, write through rather than drop the increment.
+            self._count('overflows', 1, lock=True)
+            self.write({(table, field): {int(row_id): value}})
+        elif due:
+            self.flush()
+
+    def flush(self):
+        """
+        Write every buffered increment, returns the number applied.
+        """
+        if not self.enabled:
+            return 0
+
+        with self.lock:
+            used = np.flatnonzero(self.keys)
+            keys, values = self.keys[used].copy(), self.values[used].copy()
+            self.keys[used] = 0
+            self.values[used] = 0
+            self._count('pending', -int(values.sum()))
+            self.stats_array[self.STATS.index('last_flush')] = int(time.time())
+
+        if not len(used):
+            return 0
+
+        increments = {}
+
+        for key, value in zip(keys.tolist(), values.tolist()):
+            table, field = self.TABLES[(key >> 56) - 1], self.FIELDS[(key >> self.ROW_BITS) & 0xFF]
+            increments.setdefault((table, field), {})[key & self.ROW_MASK] = value
+
+        try:
+            self.write(increments)
+        except Exception as e:
+            logging.error(e)
+
+            # Put the increments back for the next flush.
+            with self.lock:
+                self._count('failures', 1)
+
+                for key, value in zip(keys.tolist(), values.tolist()):
+                    position = self._slot(key)
+
+                    if position is not None:
+                        self.keys[position] = key
+                        self.values[position] += value
+                        self._count('pending', value)
+
+            return 0
+
+        with self.lock:
+            self._count('flushed', int(values.sum()))
+            self._count('flushes', 1)
+
+        return int(values.sum())
+
+    def write(self, increments):
+        """
+        Apply {(table, field): {row id: increment}} in one transaction, one
+        UPDATE per table, field and distinct increment.
+        """
+        with self.db.get_engine(self.app).begin() as connection:
+            apply_increments(connection, self.db.metadata.tables, increments)
+
+    def stats(self):
+        """
+        Return the buffered, pending and flushed counts shared by all workers.
+        """
+        if not self.enabled:
+            return dict(enabled=False)
+
+        with self.lock:
+            stats = dict(zip(self.STATS, self.stats_array.tolist()))
+
+        return dict(
+            stats,
+            enabled=True,
+            slots=len(self.keys),
+            used=int(np.count_nonzero(self.keys)),
+            interval=self.interval,
+            max_pending=self.max_pending,
+            last_flush_age=int(time.time()) - stats['last_flush']
+        )
+
+    def _count(self, name, value, lock=False):
+        if lock:
+            with self.lock:
+                self.stats_array[self.STATS.index(name)] += value
+        else:
+            self.stats_array[self.STATS.index(name)] += value
+
+    def _start_flusher(self):
+        """
+        Start a flushing thread in this worker, so buffered increments are
+        written even when no new ones arrive. Needs uwsgi enable-threads.
+        """
+        if self.flusher_pid == os.getpid():
+            return
+
+        self.flusher_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(self.interval)
+
+                try:
+                    self.flush()
+                except Exception as e:
+                    logging.error(e)
+
+        threading.Thread(target=run, name='write-behind-counters', daemon=True).start()
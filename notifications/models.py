@@ -2,6 +2,7 @@ import uuid
 from datetime import datetime
 
 from mkondo import db
+from mkondo.mixins import CounterMixin
 
 
 notification_user_table = db.Table(
@@ -11,8 +12,10 @@ notification_user_table = db.Table(
 )
 
 
-class Notification(db.Model):
+class Notification(CounterMixin, db.Model):
     __tablename__ = 'notifications'
+    PUBLIC_ID = 'notification_id'
+    COUNTERS = ('opened',)
 
     id = db.Column(db.Integer, primary_key=True)
     notification_id = db.Column(db.String(50), unique=True, nullable=False)
@@ -34,6 +37,13 @@ class Notification(db.Model):
         """
         return cls.query.all()
 
+    @classmethod
+    def fetch_by_id(cls, notification_id):
+        """
+        Fetch a notification by it's id
+        """
+        return cls.query.filter_by(notification_id=notification_id).first()
+
     def save(self):
         """
         Save current notification
@@ -1,5 +1,6 @@
 from flask_restful import Resource, reqparse
 
+from mkondo import shards
 from .models import Notification
 from .schemas import NotificationSchema
 from users.models import User
@@ -25,7 +26,7 @@ class NotificationListResource(Resource):
 
         return {
             'success': True,
-            'notifications': notifications
+            'notifications': notifications_schema.dump(notifications)
         }, 200
 
     @staticmethod
@@ -60,7 +61,7 @@ class NotificationListResource(Resource):
 class NotificationOpenedResource(Resource):
     @staticmethod
     def post(notification_id):
-        notification = Notification.fetch_by_id(notification_id)
+        notification = Notification.increment(notification_id, 'opened')
 
         if not notification:
             return {
@@ -68,10 +69,6 @@ class NotificationOpenedResource(Resource):
                 'message': 'Notification not found'
             }, 404
 
-        notification.count = notification.count + 1
-
-        notification.save()
-
         return {
             'success': True,
             'message': 'Notifcation opened count increased'
@@ -89,5 +86,5 @@ class NotificationOpenedResource(Resource):
 
         return {
             'success': True,
-            'count': notification.opened
+            'count': notification.opened + shards.totals('notifications', notification.id).get('opened', 0)
         }
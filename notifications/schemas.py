@@ -1,9 +1,10 @@
 from mkondo import marshmallow
 from .models import Notification
 from users.schemas import UserSchema
+from mkondo.mixins import CounterSchemaMixin
 
 
-class NotificationSchema(marshmallow.SQLAlchemySchema):
+class NotificationSchema(CounterSchemaMixin, marshmallow.SQLAlchemySchema):
     users = marshmallow.Nested(UserSchema(dump_only=('user_id',), many=True))
 
     class Meta:
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from app import init_app
+from mkondo import db as _db, counters, sketches
+from mkondo.counters import flusher
+
+
+@pytest.fixture(scope='session')
+def app():
+    """
+    The app against the PostgreSQL database in TEST_SQLALCHEMY_DATABASE_URI,
+    the counters use PostgreSQL upserts so there is no SQLite fallback.
+    """
+    if not os.environ.get('TEST_SQLALCHEMY_DATABASE_URI'):
+        pytest.skip('TEST_SQLALCHEMY_DATABASE_URI is not set')
+
+    app = init_app()
+    # Keep the flusher thread out of the tests, they flush explicitly.
+    flusher.pid = os.getpid()
+
+    with app.app_context():
+        _db.create_all()
+        yield app
+        _db.session.remove()
+        _db.drop_all()
+
+
+@pytest.fixture
+def db(app):
+    yield _db
+    _db.session.rollback()
+    counters.flush()
+    sketches.flush()
+    _db.session.execute('TRUNCATE {} RESTART IDENTITY CASCADE'.format(
+        ', '.join(table.name for table in _db.metadata.sorted_tables)
+    ))
+    _db.session.commit()
+    # Drop the instances of the test, ones kept alive by reference cycles
+    # would clash with the restarted ids.
+    _db.session.remove()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def artist(db):
+    from users.models import User
+
+    user = User('Test Artist', 'artist@example.com', '255700000001', 'password', 'creator', '127.0.0.1')
+    db.session.add(user)
+    db.session.commit()
+
+    return user
+
+
+@pytest.fixture
+def make_media(db, artist):
+    from media.models import Media
+
+    def make_media(name='Song', category='audio', owner=None):
+        media = Media(name, 'A song', 'cover.jpg', 180, category, (owner or artist).id, 'song.mp3')
+        db.session.add(media)
+        db.session.commit()
+
+        return media
+
+    return make_media
+
+
+@pytest.fixture
+def headers(db):
+    """
+    Authorization headers of a new user of the given type.
+    """
+    from flask_jwt_extended import create_access_token
+    from mkondo.security import UserType
+    from users.models import User
+
+    def headers(user_type_key):
+        count = User.query.count()
+        user = User('Test User', f'user{count}@example.com', f'2557100000{count:02}', 'password', UserType[user_type_key].value, '127.0.0.1')
+        db.session.add(user)
+        db.session.commit()
+
+        return {'Authorization': f'Bearer {create_access_token(user)}'}
+
+    return headers
@@ -0,0 +1,50 @@
+import numpy as np
+
+from media.recommender import ImplicitALSRecommender, Interactions
+
+# Two taste clusters, users 0-3 play media 0-3 and users 4-7 play media 4-7,
+# each user skips one media of their cluster.
+USERS, MEDIA = zip(*[
+    (user, cluster + media)
+    for cluster in (0, 4)
+    for user in range(cluster, cluster + 4)
+    for media in range(4)
+    if media != user - cluster
+])
+
+
+def model():
+    als = ImplicitALSRecommender(factors=4, iterations=15)
+    als.fit(Interactions.from_ids(np.array(USERS), np.array(MEDIA)))
+
+    return als
+
+
+def test_the_skipped_media_of_the_cluster_ranks_first():
+    als = model()
+
+    for user in range(8):
+        recommended = als.recommend(user, amount=1)
+        cluster = user - user % 4
+
+        assert list(recommended['media_id_y']) == [cluster + user % 4]
+
+
+def test_listened_media_are_never_recommended():
+    als = model()
+    recommended = als.recommend(0, amount=10)
+
+    assert not set(recommended['media_id_y']) & set(als.get_user_media(0))
+    assert len(recommended) == 8 - 3
+    assert list(recommended['rank']) == [1, 2, 3, 4, 5]
+
+
+def test_unknown_users_get_no_recommendations():
+    assert model().recommend(99) == -1
+
+
+def test_the_model_round_trips_through_its_arrays():
+    als = model()
+    loaded = ImplicitALSRecommender.from_arrays(als.to_arrays(), **als.meta())
+
+    assert loaded.recommend(2).equals(als.recommend(2))
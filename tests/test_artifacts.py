@@ -0,0 +1,36 @@
+import numpy as np
+
+from mkondo.artifacts import ArtifactStore
+
+
+def store(tmp_path, keep=2):
+    class App:
+        config = dict(RECOMMENDER_ARTIFACT_DIR=str(tmp_path / 'artifacts'), RECOMMENDER_ARTIFACT_KEEP=keep)
+
+    return ArtifactStore(App())
+
+
+def test_workers_map_the_published_version(tmp_path):
+    publisher, worker = store(tmp_path), store(tmp_path)
+
+    assert worker.current() is None
+
+    first = publisher.publish({'model.ids': np.arange(3)}, meta={'model': {'scale': 2}})
+    artifact = worker.current()
+
+    assert artifact.version == first
+    assert list(artifact.section('model')['ids']) == [0, 1, 2]
+    assert isinstance(artifact.arrays['model.ids'], np.memmap)
+    assert artifact.load(lambda arrays, scale: arrays['ids'] * scale, 'model').tolist() == [0, 2, 4]
+    assert worker.current() is artifact
+
+    second = publisher.publish({'model.ids': np.arange(2)})
+
+    assert worker.current().version == second != first
+
+
+def test_old_versions_are_pruned(tmp_path):
+    artifacts = store(tmp_path)
+    versions = [artifacts.publish({'ids': np.arange(n)}) for n in range(3)]
+
+    assert artifacts.versions() == versions[1:]
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from events.ingest import ingest
+from media.models import Genre
+from users.models import User, MediaUserHistory, ArtistSimilarity
+
+
+def make_user(db, name, user_type='user'):
+    count = User.query.count()
+    user = User(name, f'similar{count}@example.com', f'2557200000{count:02}', 'password', user_type, '127.0.0.1')
+    db.session.add(user)
+    db.session.commit()
+
+    return user
+
+
+def test_artists_are_ranked_by_idf_weighted_genre_overlap(db):
+    artist, twin, near, other = [make_user(db, f'Artist {n}', 'creator') for n in range(4)]
+    listener = make_user(db, 'Listener')
+    bongo, gospel, rap = Genre.get_or_create('Bongo'), Genre.get_or_create('Gospel'), Genre.get_or_create('Rap')
+
+    for user, genres in ((artist, [bongo, gospel]), (twin, [bongo, gospel]), (near, [bongo]), (other, [rap]), (listener, [bongo])):
+        user.genres.extend(genres)
+
+    db.session.commit()
+
+    assert User.fetch_similar_artists(artist) == [twin, near]
+    assert User.fetch_similar_artists(near) == [artist, twin]
+
+
+def test_artists_are_ranked_by_shared_listeners(db, client, make_media):
+    artist, near, far = [make_user(db, f'Artist {n}', 'creator') for n in range(3)]
+    listener, fan, stranger = make_user(db, 'Listener'), make_user(db, 'Fan'), make_user(db, 'Stranger')
+    song, near_song, far_song = [make_media(f'Song {n}', owner=owner) for n, owner in enumerate((artist, near, far))]
+
+    for user, media in ((listener, song), (listener, near_song), (fan, song), (fan, far_song), (stranger, far_song)):
+        db.session.add(MediaUserHistory(user.id, media.id))
+
+    db.session.commit()
+
+    assert ArtistSimilarity.refresh() == 3
+    assert ArtistSimilarity.fetch_similar(artist) == [near, far]
+
+    response = client.get(f'/artists/{artist.user_id}/similar', query_string=dict(mode='listening'))
+    assert [similar['user_id'] for similar in response.get_json()['artists']] == [str(near.user_id), str(far.user_id)]
+
+
+def test_incremental_refresh_sees_backdated_plays(db, make_media):
+    first, second, third = [make_user(db, f'Artist {n}', 'creator') for n in range(3)]
+    listener, fan = make_user(db, 'Listener'), make_user(db, 'Fan')
+    song, other, third_song = [make_media(f'Song {n}', owner=owner) for n, owner in enumerate((first, second, third))]
+
+    ingest([dict(type='play', id=str(song.media_id))], user_id=str(listener.user_id), user_type='U')
+    ingest([dict(type='play', id=str(song.media_id)), dict(type='play', id=str(third_song.media_id))],
+           user_id=str(fan.user_id), user_type='U')
+    ArtistSimilarity.refresh(full=True)
+    assert ArtistSimilarity.query.filter_by(similar_artist_id=second.id).count() == 0
+
+    backdated = (datetime.utcnow() - timedelta(days=3)).isoformat()
+    ingest([dict(type='play', id=str(other.media_id), timestamp=backdated)], user_id=str(listener.user_id), user_type='U')
+
+    assert ArtistSimilarity.refresh() == 2
+    assert {row.artist_id for row in ArtistSimilarity.query.filter_by(similar_artist_id=second.id)} == {first.id}
@@ -0,0 +1,98 @@
+from media.models import Media, ArtistStats
+from users.insights import ArtistInsights
+from users.models import User, MediaUserHistory
+
+
+def test_a_listener_is_counted_on_their_first_play_of_the_artist(db, artist, make_media):
+    media, other = make_media(), make_media('Other')
+    listener = User('Listener', 'listener@example.com', '255700000100', 'password', 'user', '127.0.0.1')
+    db.session.add(listener)
+    db.session.commit()
+
+    for played in (media, other):
+        db.session.add(MediaUserHistory(listener.id, played.id))
+        ArtistStats.record_play(played, listener.id, plays=2, new_listener=True)
+        db.session.commit()
+
+    stats = ArtistStats.fetch_by_artist_id(artist.id)
+    assert (stats.plays, stats.listeners, stats.reconciled) == (4, 1, None)
+
+    assert ArtistStats.reconcile([artist.id]) == 1
+
+    stats = ArtistStats.fetch_by_artist_id(artist.id)
+    assert (stats.listeners, stats.media_count) == (1, 2)
+    assert sum(row['count'] for row in stats.audience) == 1
+    assert stats.reconciled is not None
+
+
+def test_reconcile_upserts_the_counters_from_the_source_tables(db, artist, make_media):
+    media = make_media()
+    make_media('Other')
+    Media.increment(media.media_id, 'plays', 3)
+    Media.increment(media.media_id, 'likes')
+    db.session.execute(ArtistStats.__table__.update().values(plays=100, likes=100))
+    db.session.commit()
+
+    assert ArtistStats.reconcile() == 1
+
+    stats = ArtistStats.fetch_by_artist_id(artist.id)
+    db.session.refresh(stats)
+    assert (stats.plays, stats.likes, stats.media_count, stats.comments) == (3, 1, 2, 0)
+    assert stats.reconciled is not None and stats.audience == []
+
+
+def test_reconcile_zeroes_artists_without_media(db, artist, make_media):
+    media = make_media()
+    Media.increment(media.media_id, 'plays')
+    db.session.delete(media)
+    db.session.commit()
+
+    assert ArtistStats.reconcile([artist.id]) == 0
+    assert ArtistStats.fetch_by_artist_id(artist.id).plays == 0
+
+
+def test_insights_of_an_unreconciled_artist_do_not_write(db, artist, make_media):
+    media = make_media()
+    Media.increment(media.media_id, 'plays', 2)
+
+    data = ArtistInsights.fetch_artist_data(artist.id)
+    db.session.rollback()
+
+    assert (data['plays'], data['media']) == (2, 1)
+    assert ArtistStats.fetch_by_artist_id(artist.id).reconciled is None
+
+
+def test_deleting_a_media_subtracts_everything_it_counted(db, client, headers, artist, make_media):
+    from events.ingest import ingest
+    from media.models import Comment
+
+    media, other = make_media(), make_media('Other')
+    listeners = []
+
+    for n in range(2):
+        listener = User(f'Listener {n}', f'listener{n}@example.com', f'25570000010{n}', 'password', 'user', '127.0.0.1')
+        db.session.add(listener)
+        db.session.commit()
+        listeners.append(listener)
+
+    ingest([dict(type='play', id=str(media.media_id), count=3), dict(type='like', id=str(media.media_id))],
+           user_id=str(listeners[0].user_id), user_type='U')
+    ingest([dict(type='play', id=str(media.media_id)), dict(type='play', id=str(other.media_id), count=2)],
+           user_id=str(listeners[1].user_id), user_type='U')
+    db.session.add(Comment('Nice', media.id, listeners[0].id))
+    ArtistStats.increment(artist.id, comments=1)
+    db.session.commit()
+    ArtistStats.reconcile([artist.id])
+
+    response = client.delete(f'/media/{media.media_id}', headers=headers('SA'))
+    assert response.status_code == 204
+
+    stats = ArtistStats.fetch_by_artist_id(artist.id)
+    db.session.refresh(stats)
+    counted = [getattr(stats, name) for name in ArtistStats.COUNTERS]
+
+    assert counted == [2, 0, 0, 0, 1, 1]
+
+    ArtistStats.reconcile([artist.id])
+    db.session.refresh(stats)
+    assert [getattr(stats, name) for name in ArtistStats.COUNTERS] == counted
@@ -0,0 +1,34 @@
+import numpy as np
+
+from benchmarks.recommenders import evaluate, precision_recall, split
+from benchmarks.synthetic import generate_interactions
+
+
+def test_synthetic_history_has_roughly_the_requested_distinct_pairs():
+    interactions = generate_interactions(5000)
+    pairs = set(zip(interactions.user_codes.tolist(), interactions.media_codes.tolist()))
+
+    assert len(pairs) == len(interactions)
+    assert 4500 <= len(interactions) <= 5000
+
+
+def test_precision_and_recall_skip_users_without_held_out_media():
+    recommended = {1: ['a', 'b'] + ['x'] * 8, 2: ['c'], 3: ['d']}
+    relevant = {1: {'a', 'b', 'c', 'e'}, 2: {'c'}, 3: set()}
+
+    precision, recall = precision_recall(recommended, relevant)
+
+    assert precision == (0.2 + 0.1) / 2
+    assert recall == (0.5 + 1.0) / 2
+
+
+def test_evaluation_reports_timings_and_accuracy():
+    interactions = generate_interactions(2000)
+    train, test = split(interactions)
+    users = np.unique(test.users[test.user_codes])[:20].tolist()
+
+    result = evaluate('popularity', 2000, train, test, users)
+
+    assert result['train_rows'] + len(test) == len(interactions)
+    assert result['evaluated_users'] == 20
+    assert 0 <= result['precision@10'] <= 1 and 0 <= result['recall@10'] <= 1
@@ -0,0 +1,64 @@
+import multiprocessing
+
+import pytest
+
+from mkondo.cache import RecommendationCache
+
+
+@pytest.fixture
+def cache():
+    class App:
+        config = dict(RECOMMENDATION_CACHE_SIZE=2, RECOMMENDATION_CACHE_TTL=60, RECOMMENDATION_CACHE_STAMPS=64)
+
+    return RecommendationCache(App())
+
+
+def test_entries_are_tagged_with_the_model_version(cache):
+    cache.set('similar', 'user', ['a', 'b'], version='1')
+
+    assert cache.get('similar', 'user', '1') == ['a', 'b']
+    assert cache.get('similar', 'user', '2') is None
+
+
+def test_least_recently_used_users_are_evicted(cache):
+    for user in ('first', 'second', 'third'):
+        cache.set('similar', user, [user])
+
+    assert cache.get('similar', 'first') is None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_invalidation_drops_every_strategy_of_the_user(cache):
+    cache.set('similar', 'user', ['a'])
+    cache.set('popular', 'user', ['b'])
+    cache.invalidate('user')
+
+    assert cache.get('similar', 'user') is None and cache.get('popular', 'user') is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_invalidation_reaches_forked_workers(cache):
+    cache.set('similar', 'user', ['a'])
+    worker = multiprocessing.get_context('fork').Process(target=cache.invalidate, args=('user',))
+    worker.start()
+    worker.join()
+
+    # This process' entry is untouched, its stamp was bumped by the worker.
+    assert 'user' in cache.entries
+    assert cache.get('similar', 'user') is None
+
+
+def test_stats_are_summed_over_the_workers(cache):
+    def work():
+        cache.set('similar', 'other', ['b'])
+        cache.get('similar', 'other')
+
+    cache.set('similar', 'user', ['a'])
+    cache.get('similar', 'user')
+    worker = multiprocessing.get_context('fork').Process(target=work)
+    worker.start()
+    worker.join()
+    stats = cache.stats()
+
+    assert (stats['hits'], stats['misses'], stats['size']) == (2, 0, 2)
+    assert stats['worker']['size'] == 1
@@ -0,0 +1,24 @@
+from media.models import Media, ArtistStats
+
+
+def test_increment_adds_to_the_row_and_creates_the_rollup(db, artist, make_media):
+    media = make_media()
+
+    row = Media.increment(media.media_id, 'plays')
+    Media.increment(media.media_id, 'plays', 2)
+
+    assert row.id == media.id and row.owner_id == artist.id and row.plays == 1
+    assert db.session.query(Media.plays).filter_by(id=media.id).scalar() == 3
+    assert ArtistStats.fetch_by_artist_id(artist.id).plays == 3
+    assert ArtistStats.fetch_by_artist_id(artist.id).reconciled is None
+
+
+def test_increment_of_a_missing_row_keeps_the_session(db, artist, make_media):
+    media = make_media()
+    media.name = 'Renamed'
+
+    assert Media.increment('00000000-0000-0000-0000-000000000000', 'likes') is None
+
+    db.session.commit()
+    db.session.expire_all()
+    assert Media.query.get(media.id).name == 'Renamed'
@@ -0,0 +1,67 @@
+import time
+
+from datetime import date
+
+from media.models import DailyCounter
+from mkondo import counters
+from mkondo.counters import PeriodicFlusher
+
+
+def stored(db, media):
+    return db.session.query(DailyCounter.value).filter_by(
+        entity_type='media', entity_id=str(media.media_id), metric='plays', granularity='day'
+    ).scalar()
+
+
+def test_increments_are_rolled_up_into_days_weeks_and_months(db, make_media):
+    media = make_media()
+    counters.add('media', media.media_id, 'plays', 2, day=date(2026, 10, 12))
+    counters.add('media', media.media_id, 'plays', day=date(2026, 10, 14))
+
+    assert counters.flush() == 4
+
+    def series(granularity):
+        return DailyCounter.series('media', [str(media.media_id)], ['plays'], granularity,
+                                   date(2026, 10, 13), date(2026, 10, 31))['plays']
+
+    assert series('day') == [{'bucket': '2026-10-14', 'value': 1}]
+    assert series('week') == [{'bucket': '2026-10-12', 'value': 3}]
+    assert series('month') == [{'bucket': '2026-10-01', 'value': 3}]
+
+
+def test_an_idle_buffer_is_flushed_once_due(db, make_media, monkeypatch):
+    media = make_media()
+    monkeypatch.setattr(counters, 'last_flush', time.monotonic())
+    counters.add('media', media.media_id, 'plays', 2)
+    local = PeriodicFlusher()
+    local.register(counters)
+
+    assert local.tick() == 0 and stored(db, media) is None
+
+    monkeypatch.setattr(counters, 'last_flush', time.monotonic() - counters.flush_interval)
+
+    assert local.tick() == 3
+    assert stored(db, media) == 2
+
+
+def test_the_flusher_thread_writes_without_new_increments(db, make_media, monkeypatch):
+    media = make_media()
+    monkeypatch.setattr(counters, 'flush_interval', 0.05)
+    monkeypatch.setattr(counters, 'last_flush', time.monotonic())
+    local = PeriodicFlusher(interval=0.01)
+    local.register(counters)
+    counters.add('media', media.media_id, 'plays')
+    local.start()
+
+    try:
+        for _ in range(100):
+            db.session.rollback()
+
+            if stored(db, media) is not None:
+                break
+
+            time.sleep(0.01)
+    finally:
+        local.buffers.clear()
+
+    assert stored(db, media) == 1
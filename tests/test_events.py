@@ -0,0 +1,101 @@
+import pytest
+
+from events import ingest as ingest_module
+from events.ingest import ingest
+from events.models import PlayEvent
+from media.models import Media, ArtistStats
+from users.models import MediaUserHistory
+
+
+@pytest.fixture
+def listener(db):
+    from users.models import User
+
+    user = User('Test Listener', 'listener@example.com', '255700000002', 'password', 'user', '127.0.0.1')
+    db.session.add(user)
+    db.session.commit()
+
+    return user
+
+
+def test_statuses_follow_the_request_order(db, artist, make_media, listener):
+    media = make_media()
+
+    results = ingest([
+        dict(type='play', id=str(media.media_id), count=2),
+        dict(type='play', entity='album', id=str(media.media_id)),
+        dict(type='like', id='missing'),
+        dict(type='like', id=str(media.media_id)),
+        dict(type='share'),
+    ], user_id=str(listener.user_id), user_type='U')
+
+    assert [result['status'] for result in results] == [200, 400, 404, 200, 400]
+    assert db.session.query(Media.plays, Media.likes).filter_by(id=media.id).one() == (2, 1)
+    assert db.session.query(MediaUserHistory.plays).filter_by(media_id=media.id).scalar() == 2
+    assert PlayEvent.query.count() == 2
+
+    # The first counts of an artist create their statistics row.
+    stats = ArtistStats.fetch_by_artist_id(artist.id)
+    assert (stats.plays, stats.likes) == (2, 1)
+
+
+def test_visitors_can_not_like(db, make_media):
+    media = make_media()
+
+    results = ingest([dict(type='like', id=str(media.media_id)), dict(type='play', id=str(media.media_id))], user_type='V')
+
+    assert [result['status'] for result in results] == [403, 200]
+    assert PlayEvent.query.filter_by(user_id=None).count() == 1
+
+
+def test_a_failed_batch_writes_nothing(db, make_media, listener, monkeypatch):
+    media = make_media()
+
+    def fail(*args):
+        raise RuntimeError('database unavailable')
+
+    monkeypatch.setattr(ingest_module, 'apply_increments', fail)
+    results = ingest([
+        dict(type='play', id=str(media.media_id)),
+        dict(type='like', id='missing'),
+    ], user_id=str(listener.user_id), user_type='U')
+
+    assert [result['status'] for result in results] == [500, 404]
+    assert MediaUserHistory.query.count() == 0
+    assert PlayEvent.query.count() == 0
+    assert db.session.query(Media.plays).filter_by(id=media.id).scalar() == 0
+
+
+def test_a_like_counts_once():
+    from events.schemas import EventSchema
+
+    assert EventSchema().validate(dict(type='like', id='media', count=1)) == {}
+    assert 'count' in EventSchema().validate(dict(type='like', id='media', count=100))
+    assert EventSchema().validate(dict(type='play', id='media', count=100)) == {}
+
+
+def test_a_batch_is_posted_with_one_token(client, headers, make_media):
+    media = make_media()
+
+    response = client.post('/events', json=dict(events=[
+        dict(type='page_view', id=str(media.media_id)),
+        dict(type='rewind', id=str(media.media_id)),
+    ]), headers=headers('U'))
+
+    assert [result['status'] for result in response.get_json()['events']] == [200, 400]
+
+
+def test_a_play_is_recorded_in_one_statement(db, artist, make_media, listener):
+    media = make_media()
+
+    MediaUserHistory.record_play(listener.user_id, media.media_id)
+    played = MediaUserHistory.record_play(listener.user_id, media.media_id)
+    db.session.commit()
+
+    assert (played.user_id, played.id, played.owner_id, played.plays) == (listener.id, media.id, artist.id, 2)
+    assert db.session.query(Media.plays).filter_by(id=media.id).scalar() == 2
+    assert PlayEvent.query.filter_by(user_id=listener.id, media_id=media.id).count() == 2
+
+    missing = MediaUserHistory.record_play(listener.user_id, '00000000-0000-0000-0000-000000000000')
+    assert (missing.user_id, missing.id) == (listener.id, None)
+    assert MediaUserHistory.record_play('00000000-0000-0000-0000-000000000000', media.media_id) is None
@@ -0,0 +1,85 @@
+import csv
+import gzip
+import io
+from datetime import datetime, timedelta
+
+from events.ingest import ingest
+from media.models import Media
+from mkondo.export import Export
+from users.models import MediaUserHistory
+
+
+def test_tables_are_streamed_as_gzip_csv_without_contact_details(db, artist, tmp_path):
+    path = tmp_path / 'users.csv.gz'
+    users = Export('users', chunk_size=1, lag=0)
+
+    assert users.write(str(path)) == 1
+
+    with gzip.open(str(path), 'rt') as export_file:
+        header, *rows = list(csv.reader(export_file))
+
+    assert 'email' not in header and 'password' not in header
+    assert [dict(zip(header, row))['user_id'] for row in rows] == [str(artist.user_id)]
+    assert Export('users', since=users.watermark, lag=0).write(str(path)) == 0
+
+
+def test_exports_are_served_to_super_admins(client, headers):
+    admin = headers('SA')
+
+    assert client.get('/exports/passwords', headers=admin).status_code == 404
+
+    response = client.get('/exports/users', headers=admin)
+    assert response.status_code == 200 and 'X-Export-Watermark' in response.headers
+    assert next(csv.reader(io.StringIO(gzip.decompress(response.data).decode())))[:2] == ['id', 'user_id']
+
+
+def export(table, since=None, lag=0):
+    table_export = Export(table, since=since, lag=lag)
+
+    for _ in table_export:
+        pass
+
+    return table_export
+
+
+def test_changed_rows_are_exported_again(db, artist, make_media):
+    media = make_media()
+    MediaUserHistory.record_play(artist.user_id, media.media_id)
+    db.session.commit()
+    first = {table: export(table) for table in ('history', 'media', 'users')}
+
+    assert [first[table].rows for table in ('history', 'media', 'users')] == [1, 1, 1]
+    assert all(export(table, first[table].watermark).rows == 0 for table in first)
+
+    # A counter update, a backdated play and a profile change.
+    Media.increment(media.media_id, 'likes')
+    ingest([dict(type='play', id=str(media.media_id), timestamp=(datetime.utcnow() - timedelta(days=3)).isoformat())],
+           user_id=str(artist.user_id), user_type='C')
+    artist.about = 'Singer'
+    artist.save()
+
+    assert [export(table, first[table].watermark).rows for table in ('history', 'media', 'users')] == [1, 1, 1]
+
+
+def test_single_plays_move_the_watermarks(db, artist, make_media):
+    media = make_media()
+    watermarks = {table: export(table).watermark for table in ('media', 'history')}
+
+    MediaUserHistory.record_play(artist.user_id, media.media_id)
+    db.session.commit()
+
+    assert export('media', watermarks['media']).rows == 1
+    assert export('history', watermarks['history']).rows == 1
+
+
+def test_rows_committed_late_with_an_older_watermark_are_not_missed(db, artist, make_media):
+    first = export('media', lag=60)
+    assert first.rows == 0
+
+    # A transaction that set updated before the export but committed after it.
+    media = make_media()
+    media.updated = datetime.utcnow() - timedelta(seconds=10)
+    db.session.commit()
+
+    assert first.watermark < media.updated
+    assert export('media', first.watermark).rows == 1
@@ -0,0 +1,45 @@
+from mkondo.geoip import GeoIP
+
+CSV = '''\
+1.0.0.0,1.0.0.255,AU,Queensland
+41.59.0.0,41.59.255.255,TZ,Dar es Salaam
+3232235520,3232301055,ZZ,
+::ffff:0.0.0.0,::ffff:0.255.255.255,ZZ,Mapped
+281470681743360,281470698520575,ZZ,Mapped
+broken
+'''
+
+
+def build(tmp_path):
+    csv_path = tmp_path / 'ranges.csv'
+    csv_path.write_text(CSV)
+
+    return GeoIP.build(str(csv_path), str(tmp_path / 'geoip'))
+
+
+def test_build_skips_ipv6_ranges(tmp_path):
+    assert build(tmp_path) == 3
+
+
+def test_lookup(tmp_path):
+    build(tmp_path)
+    geoip = GeoIP()
+    geoip.path = str(tmp_path / 'geoip')
+
+    assert geoip.lookup('41.59.10.1') == ('TZ', 'Dar es Salaam')
+    assert geoip.lookup('1.0.0.255') == ('AU', 'Queensland')
+    assert geoip.lookup('192.168.1.1') == ('ZZ', None)
+    assert geoip.lookup('1.0.1.0') == GeoIP.UNKNOWN
+    assert geoip.lookup('::1') == GeoIP.UNKNOWN
+    assert geoip.lookup(None) == GeoIP.UNKNOWN
+
+
+def test_lookups_before_the_build_are_not_cached(tmp_path):
+    geoip = GeoIP()
+    geoip.path = str(tmp_path / 'geoip')
+
+    assert geoip.lookup('41.59.10.1') == GeoIP.UNKNOWN
+
+    build(tmp_path)
+
+    assert geoip.lookup('41.59.10.1') == ('TZ', 'Dar es Salaam')
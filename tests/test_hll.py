@@ -0,0 +1,80 @@
+import time
+
+import numpy as np
+
+from media.models import ListenerSketch
+from mkondo import sketches
+from mkondo.counters import flusher
+from mkondo.hll import HyperLogLog
+from users.insights import UsersInsights
+from users.models import MediaUserHistory
+
+
+def test_count_is_within_the_error_bound():
+    for n in (10, 1000, 100000):
+        assert abs(HyperLogLog().add(np.arange(n)).count() - n) <= max(2, 0.05 * n)
+
+
+def test_adding_twice_is_a_no_op():
+    sketch = HyperLogLog().add(np.arange(5000))
+    registers = sketch.registers.copy()
+
+    assert np.array_equal(sketch.add(np.arange(5000)).registers, registers)
+
+
+def test_merge_is_the_sketch_of_the_union():
+    left, right = HyperLogLog().add(np.arange(0, 6000)), HyperLogLog().add(np.arange(4000, 10000))
+    union = HyperLogLog().add(np.arange(10000))
+
+    assert np.array_equal(HyperLogLog().merge(left).merge(right).registers, union.registers)
+    assert np.array_equal(HyperLogLog.union([left.to_bytes(), right.to_bytes()]).registers, union.registers)
+    assert HyperLogLog.union([]) is None
+
+
+def test_serialization_round_trips():
+    sketch = HyperLogLog().add(np.arange(300))
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+
+    assert restored.precision == sketch.precision
+    assert np.array_equal(restored.registers, sketch.registers)
+
+
+def test_listeners_are_estimated_per_media_artist_and_category(db, artist, make_media):
+    media, other = make_media(), make_media('Other')
+
+    for user_id, played in ((1, media), (2, media), (2, other), (2, media)):
+        ListenerSketch.record(user_id, played.id, artist.id, 'audio')
+
+    sketches.flush()
+
+    assert ListenerSketch.estimate('media', [media.id]) == 2
+    assert ListenerSketch.estimate('media', [other.id]) == 1
+    assert ListenerSketch.estimate('artist', [artist.id]) == 2
+    assert ListenerSketch.estimate('category', ['audio']) == 2
+
+
+def test_audio_listeners_are_estimated_once_rebuilt(db, artist, make_media):
+    media = make_media()
+    db.session.add(MediaUserHistory(artist.id, media.id))
+    db.session.commit()
+
+    # A listen recorded before the rebuild, of a user missing from the history.
+    ListenerSketch.record(artist.id + 1000, media.id, artist.id, 'audio')
+    sketches.flush()
+
+    assert UsersInsights.compute_audio_insights()['listeners'] == 1
+    assert ListenerSketch.rebuild() > 0
+    assert UsersInsights.compute_audio_insights()['listeners'] == 2
+
+
+def test_idle_listeners_are_flushed_by_the_shared_flusher(db, artist, make_media, monkeypatch):
+    media = make_media()
+    monkeypatch.setattr(sketches, 'last_flush', time.monotonic())
+    sketches.add('media', media.id, 1)
+
+    assert ListenerSketch.estimate('media', [media.id]) is None
+
+    monkeypatch.setattr(sketches, 'last_flush', time.monotonic() - sketches.flush_interval)
+
+    assert flusher.tick() == 1
+    assert ListenerSketch.estimate('media', [media.id]) == 1
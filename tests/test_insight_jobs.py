@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+from mkondo import counters, tasks
+from users.insights import InsightReports
+from users.models import InsightJob
+
+
+def test_a_job_is_queued_once_and_polled_until_done(db, client, headers, monkeypatch):
+    queued = []
+    monkeypatch.setattr(tasks.run_insight_job, 'delay', queued.append)
+    admin = headers('SA')
+
+    response = client.post('/insights/jobs', json=dict(kind='audio'), headers=admin)
+    job_id = response.get_json()['job_id']
+    assert response.status_code == 202 and queued == [job_id]
+
+    response = client.post('/insights/jobs', json=dict(kind='audio'), headers=admin)
+    assert response.status_code == 200 and response.get_json()['job_id'] == job_id
+
+    assert client.get(f'/insights/jobs/{job_id}', headers=admin).get_json()['status'] == 'pending'
+    assert tasks.run_insight_job(job_id) == 'done'
+
+    polled = client.get(f'/insights/jobs/{job_id}', headers=admin).get_json()
+    assert polled['status'] == 'done' and polled['result']['users'] == 1
+
+
+def job(db, status, age=0):
+    job = InsightJob('audio', {}, 'fingerprint')
+    job.status = status
+    job.created = datetime.utcnow() - timedelta(seconds=age)
+    job.save()
+
+    return job
+
+
+def test_only_done_and_recent_jobs_are_reused(db):
+    job(db, InsightJob.FAILED)
+    job(db, InsightJob.RUNNING, age=3600)
+
+    assert InsightJob.fetch_reusable('fingerprint', 600) is None
+
+    pending = job(db, InsightJob.PENDING, age=60)
+    assert InsightJob.fetch_reusable('fingerprint', 600).job_id == pending.job_id
+
+    done = job(db, InsightJob.DONE, age=7200)
+    assert InsightJob.fetch_reusable('fingerprint', 30).job_id == done.job_id
+
+
+def test_artist_fingerprint_follows_the_series(db, artist, make_media):
+    media = make_media()
+    today = datetime.utcnow().date()
+    params = dict(artist_id=artist.id, start=(today - timedelta(days=7)).isoformat(), end=today.isoformat(), granularity='day')
+    before = InsightReports.fingerprint('artist', params)
+
+    assert InsightReports.fingerprint('artist', params) == before
+
+    counters.add('media', media.media_id, 'plays', 1)
+    counters.flush()
+
+    assert InsightReports.fingerprint('artist', params) != before
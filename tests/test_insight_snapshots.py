@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from mkondo import tasks
+from users.insights import UsersInsights
+from users.models import InsightSnapshot, MediaUserHistory
+
+
+def test_audio_insights_are_counted_and_computed_once(db, monkeypatch, artist, make_media):
+    queued = []
+    monkeypatch.setattr(tasks.refresh_insight_snapshots, 'delay', lambda: queued.append(1))
+    song, video = make_media('Song'), make_media('Video', 'video')
+    db.session.add_all([MediaUserHistory(artist.id, song.id), MediaUserHistory(artist.id, video.id)])
+    db.session.commit()
+
+    insights = UsersInsights.fetch_audio_insights()
+
+    assert (insights['artists'], insights['publishers'], insights['listeners'], insights['users']) == (1, 0, 1, 1)
+    assert not insights['stale'] and not queued
+    assert UsersInsights.fetch_audio_insights()['computed'] == insights['computed']
+
+
+def test_claim_is_held_for_its_duration(db):
+    assert InsightSnapshot.claim('refresh', 60)
+    assert not InsightSnapshot.claim('refresh', 60)
+
+    db.session.query(InsightSnapshot).filter_by(name='refresh')\
+        .update({'computed': datetime.utcnow() - timedelta(seconds=61)})
+    db.session.commit()
+
+    assert InsightSnapshot.claim('refresh', 60)
+
+
+def test_a_stale_snapshot_queues_one_refresh(db, monkeypatch):
+    queued = []
+    monkeypatch.setattr(tasks.refresh_insight_snapshots, 'delay', lambda: queued.append(1))
+    InsightSnapshot.store(UsersInsights.AUDIO, dict(listeners=1))
+    db.session.query(InsightSnapshot).update({'computed': datetime.utcnow() - timedelta(days=1)})
+    db.session.commit()
+
+    assert UsersInsights.fetch_audio_insights()['stale']
+    assert UsersInsights.fetch_audio_insights()['stale']
+    assert len(queued) == 1
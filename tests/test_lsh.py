@@ -0,0 +1,64 @@
+import numpy as np
+
+from media.lsh import MinHashLSHIndex
+from media.recommender import Interactions, SimilarityRecommender
+
+
+def model():
+    random = np.random.RandomState(0)
+    users = random.randint(0, 300, size=4000)
+    # Listeners of neighbouring media overlap, so there are clear neighbours.
+    media = (users // 10 + random.randint(0, 3, size=len(users))) * 7
+    similarity = SimilarityRecommender()
+    similarity.fit(Interactions.from_ids(users, media))
+
+    return similarity
+
+
+def test_candidates_include_the_exact_neighbours():
+    similarity = model()
+    index = MinHashLSHIndex(num_perm=64, bands=32).build(similarity.interactions)
+    exact = similarity.get_similar_items([similarity.media[5]])
+    candidates = set(similarity.media[index.candidates(np.array([5]))].tolist())
+
+    assert set(exact['media_id_y'][exact['score'] >= 0.4]) <= candidates
+    assert len(candidates) < len(similarity.media)
+
+
+def test_similar_items_through_the_index_match_the_exact_ones():
+    similarity = model()
+    index = MinHashLSHIndex.from_arrays(
+        MinHashLSHIndex(num_perm=64, bands=32).build(similarity.interactions).to_arrays(), num_perm=64, bands=32
+    )
+
+    for position in range(0, 30, 3):
+        exact = similarity.get_similar_items([similarity.media[position]])
+        approximate = similarity.get_similar_items([similarity.media[position]], index=index)
+        strong = exact[exact['score'] >= 0.4]
+
+        assert set(strong['media_id_y']) <= set(approximate['media_id_y'])
+        assert list(approximate['score'][:len(strong)]) == list(strong['score'])
+
+
+def test_recommendations_through_the_index_match_the_exact_ones():
+    similarity = model()
+    index = MinHashLSHIndex.from_arrays(
+        MinHashLSHIndex(num_perm=64, bands=32).build(similarity.interactions).to_arrays(), num_perm=64, bands=32
+    )
+
+    # Only weak neighbours, below the LSH threshold, may be missed.
+    for user in similarity.users[:20]:
+        exact = similarity.recommend(user)
+        approximate = similarity.recommend(user, index=index)
+        strong = list(exact['media_id_y'][exact['score'] >= 0.2])
+
+        assert list(approximate['media_id_y'][:len(strong)]) == strong
+
+
+def test_the_index_is_opt_in_with_the_class_defaults():
+    from mkondo.settings import Config
+
+    index = MinHashLSHIndex()
+
+    assert Config.RECOMMENDER_LSH is False
+    assert (Config.RECOMMENDER_LSH_PERMUTATIONS, Config.RECOMMENDER_LSH_BANDS) == (index.num_perm, index.bands)
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from media.models import Genre, GenrePopularity, MediaPopularity
+from users.models import User, MediaUserHistory
+
+
+def listen(db, media, listeners):
+    for n in range(listeners):
+        count = User.query.count()
+        user = User(f'Listener {count}', f'listener{count}@example.com', f'2557000002{count:02}', 'password', 'user', '127.0.0.1')
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(MediaUserHistory(user.id, media.id))
+
+    db.session.commit()
+
+
+def test_media_are_ranked_by_listeners_per_category(db, make_media):
+    song, hit, video, archived = make_media('Song'), make_media('Hit'), make_media('Video', 'video'), make_media('Old')
+    archived.archived = True
+
+    for media, listeners in ((song, 1), (hit, 3), (video, 2), (archived, 4)):
+        listen(db, media, listeners)
+
+    assert MediaPopularity.refresh() == 6
+    assert [media.name for media in MediaPopularity.top(MediaPopularity.ALL, 10)] == ['Hit', 'Video', 'Song']
+    assert [media.name for media in MediaPopularity.top('audio', 1)] == ['Hit']
+
+
+def test_listeners_decay_by_their_age_in_utc(db, artist, make_media):
+    media = make_media()
+    history = MediaUserHistory(artist.id, media.id)
+    history.last_played = datetime.utcnow() - timedelta(days=7)
+    db.session.add(history)
+    db.session.commit()
+
+    db.session.execute("SET LOCAL TIME ZONE 'Africa/Dar_es_Salaam'")
+    MediaPopularity.refresh(half_life_days=7)
+
+    assert MediaPopularity.query.filter_by(category=MediaPopularity.ALL).one().score == pytest.approx(0.5, abs=1e-3)
+
+
+def test_media_are_ranked_by_genre_overlap_weighted_by_popularity(db, make_media):
+    bongo, gospel = Genre.get_or_create('Bongo'), Genre.get_or_create('Gospel')
+    both, bongo_hit, gospel_hit = make_media('Both'), make_media('Bongo Hit'), make_media('Gospel Hit')
+    both.genres.extend([bongo, gospel])
+    bongo_hit.genres.append(bongo)
+    gospel_hit.genres.append(gospel)
+
+    for media, listeners in ((both, 2), (bongo_hit, 3), (gospel_hit, 1)):
+        listen(db, media, listeners)
+
+    assert GenrePopularity.refresh() == 4
+    assert [media.name for media in GenrePopularity.recommend([bongo.id, gospel.id], 10)] == ['Both', 'Bongo Hit', 'Gospel Hit']
+    assert [media.name for media in GenrePopularity.recommend([bongo.id], 10, exclude=[both.id])] == ['Bongo Hit']
+
+
+def test_new_users_get_their_genres_then_the_popular_media(db, client, artist, make_media):
+    bongo = Genre.get_or_create('Bongo')
+    song, hit = make_media('Song'), make_media('Hit')
+    song.genres.append(bongo)
+    listen(db, song, 1)
+    listen(db, hit, 2)
+    MediaPopularity.refresh()
+    GenrePopularity.refresh()
+
+    response = client.get(f'/media/recommended/{artist.user_id}/similar')
+    assert response.get_json()['strategy'] == 'popular'
+    assert [media['name'] for media in response.get_json()['media']] == ['Hit', 'Song']
+
+    artist.genres.append(bongo)
+    db.session.commit()
+
+    response = client.get(f'/media/recommended/{artist.user_id}/similar')
+    assert response.get_json()['strategy'] == 'genre'
+    assert [media['name'] for media in response.get_json()['media']] == ['Song']
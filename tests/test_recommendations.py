@@ -0,0 +1,53 @@
+import pytest
+
+
+@pytest.mark.parametrize('amount', [0, -1, 101, 'many'])
+def test_batch_amount_must_be_a_bounded_positive_int(client, headers, amount):
+    response = client.post(
+        '/media/recommended/similar/batch', json=dict(user_ids=['a'], amount=amount), headers=headers('SA')
+    )
+
+    assert response.status_code == 400
+    assert 'amount' in response.get_json()['message']
+
+
+def test_neighbors_are_refreshed_from_the_loaded_interactions(db, artist, make_media, headers):
+    from media.models import MediaNeighbor
+    from media.recommender import SimilarityRecommender
+    from users.models import User, MediaUserHistory
+
+    first, second, third = make_media('First'), make_media('Second'), make_media('Third')
+    headers('U')
+    listener = User.query.filter(User.id != artist.id).one()
+
+    for user, media in ((artist, first), (artist, second), (listener, first), (listener, second), (listener, third)):
+        db.session.add(MediaUserHistory(user.id, media.id))
+
+    db.session.commit()
+
+    interactions = MediaUserHistory.load_interactions()
+    similarity = SimilarityRecommender()
+    similarity.fit(interactions)
+
+    assert MediaNeighbor.refresh(similarity.listeners, interactions.media_ids, amount=1, chunk_size=2) == 3
+
+    neighbors = MediaNeighbor.fetch_neighbors(first.media_id)
+    assert [neighbor.media_id for neighbor in neighbors] == [second.media_id]
+    assert neighbors[0].score == 1.0
+
+
+def test_neighbors_are_served_in_rank_order_with_their_age(db, client, make_media):
+    from media.models import MediaNeighbor
+
+    first, second, third = make_media('First'), make_media('Second'), make_media('Third')
+    db.session.add_all([
+        MediaNeighbor(media_id=first.id, rank=1, neighbor_id=third.id, score=0.5),
+        MediaNeighbor(media_id=first.id, rank=2, neighbor_id=second.id, score=0.25),
+    ])
+    db.session.commit()
+
+    response = client.get(f'/media/{first.media_id}/similar')
+
+    assert [media['name'] for media in response.get_json()['media']] == ['Third', 'Second']
+    assert response.get_json()['age_seconds'] >= 0
+    assert client.get(f'/media/{second.media_id}/similar').status_code == 404
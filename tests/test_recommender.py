@@ -0,0 +1,84 @@
+import numpy as np
+import pandas
+import pytest
+
+from benchmarks.similarity import legacy_cooccurence_matrix
+from media.recommender import Interactions, SimilarityRecommender
+
+HISTORY = pandas.DataFrame({
+    'user_id': [1, 1, 2, 2, 2, 3, 3, 4],
+    'media_id_y': ['a', 'b', 'a', 'b', 'c', 'b', 'c', 'd'],
+})
+
+
+def model(similarity='jaccard'):
+    model = SimilarityRecommender(similarity)
+    model.create(HISTORY, 'user_id', 'media_id_y')
+
+    return model
+
+
+def test_scores_match_the_set_based_loop():
+    similarity = model()
+    user_media = similarity.get_user_media(1)
+    expected = legacy_cooccurence_matrix(HISTORY, user_media, similarity.get_all_media_train_data())
+
+    assert np.allclose(similarity.construct_cooccurence_matrix(user_media).toarray(), expected)
+
+
+def test_recommendations_rank_the_media_the_user_has_not_played():
+    recommended = model().recommend(1)
+
+    assert list(recommended['media_id_y']) == ['c', 'd']
+    assert list(recommended['score']) == [0.5, 0.0] and list(recommended['rank']) == [1, 2]
+    assert model().recommend('unknown') == -1
+
+
+def test_cosine_similarity():
+    matrix = model('cosine').construct_cooccurence_matrix(['b'])
+
+    # b and c share 2 of their 3 and 2 listeners.
+    assert matrix[0, 2] == pytest.approx(2 / np.sqrt(6))
+
+
+def test_a_model_loaded_from_its_arrays_recommends_the_same():
+    trained = model()
+    loaded = SimilarityRecommender.from_arrays(trained.to_arrays())
+
+    assert loaded.recommend(1).equals(trained.recommend(1))
+
+
+def test_batch_recommendations_match_the_single_user_ones():
+    similarity = model()
+    batch = dict(similarity.recommend_batch([1, 2, 99, 4], chunk_size=2))
+
+    assert batch[99] == []
+
+    for user in (1, 2, 4):
+        assert set(batch[user]) == set(similarity.recommend(user)['media_id_y'])
+
+    assert batch[1] == ['c', 'd']
+
+
+def test_create_is_an_adapter_over_fit():
+    fitted = SimilarityRecommender()
+    fitted.fit(Interactions.from_frame(HISTORY, 'user_id', 'media_id_y'))
+
+    assert fitted.recommend(1).equals(model().recommend(1))
+
+
+def test_history_is_loaded_in_chunks_as_encoded_interactions(db, artist, make_media):
+    from users.models import MediaUserHistory
+
+    first, second = make_media('First'), make_media('Second')
+    history = MediaUserHistory(artist.id, first.id)
+    history.plays = 3
+    db.session.add_all([history, MediaUserHistory(artist.id, second.id)])
+    db.session.commit()
+
+    interactions = MediaUserHistory.load_interactions(chunk_size=1)
+
+    assert interactions.users.tolist() == [artist.id]
+    assert dict(zip(interactions.media[interactions.media_codes].tolist(), interactions.plays.tolist())) == {
+        str(first.media_id): 3.0, str(second.media_id): 1.0
+    }
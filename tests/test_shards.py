@@ -0,0 +1,44 @@
+import pytest
+
+from media.models import Media, ArtistStats
+from media.schemas import MediaSchema
+from mkondo import shards
+from mkondo.export import Export
+
+
+@pytest.fixture
+def sharded(db, monkeypatch):
+    monkeypatch.setattr(shards, 'enabled', True)
+    monkeypatch.setattr(shards, 'hot_rows', {})
+    monkeypatch.setattr(shards, 'hot_loaded', 0)
+    monkeypatch.setattr(shards, 'writes', {})
+    return shards
+
+
+def test_increments_of_a_promoted_row_are_served_before_the_fold(db, artist, make_media, sharded):
+    media, other = make_media(), make_media('Other')
+    sharded.promote('media', media.media_id, media.id, artist.id)
+
+    Media.increment(media.media_id, 'likes', 3)
+    Media.increment(other.media_id, 'likes')
+    db.session.expire_all()
+
+    assert db.session.query(Media.likes).filter_by(id=media.id).scalar() == 0
+    assert sharded.totals('media', media.id) == {'likes': 3}
+    assert sharded.totals('artist_stats', artist.id) == {'likes': 3}
+    assert MediaSchema().dump(media)['likes'] == 3
+    assert [item['likes'] for item in MediaSchema(many=True).dump([media, other])] == [3, 1]
+
+
+def test_export_folds_the_shards_into_the_columns(db, artist, make_media, sharded, tmp_path):
+    media = make_media()
+    sharded.promote('media', media.media_id, media.id, artist.id)
+    Media.increment(media.media_id, 'plays', 2)
+    Media.increment(media.media_id, 'plays', 5)
+
+    Export('media').write(tmp_path / 'media.csv.gz')
+    db.session.expire_all()
+
+    assert sharded.totals('media', media.id) == {}
+    assert db.session.query(Media.plays).filter_by(id=media.id).scalar() == 7
+    assert ArtistStats.fetch_by_artist_id(artist.id).plays == 7
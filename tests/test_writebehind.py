@@ -0,0 +1,55 @@
+import atexit
+import os
+
+import pytest
+
+from media.models import Media, ArtistStats
+from mkondo.writebehind import WriteBehindCounters
+
+
+@pytest.fixture
+def write_behind(app, db, monkeypatch):
+    monkeypatch.setitem(app.config, 'COUNTER_WRITE_BEHIND', True)
+    monkeypatch.setitem(app.config, 'COUNTER_WRITE_BEHIND_INTERVAL', 3600)
+    monkeypatch.setitem(app.config, 'COUNTER_WRITE_BEHIND_SLOTS', 64)
+    write_behind = WriteBehindCounters(db, app)
+    # Keep the flusher thread out of the tests, they flush explicitly.
+    write_behind.flusher_pid = os.getpid()
+    yield write_behind
+    atexit.unregister(write_behind.flush)
+
+
+def test_flush_applies_buffered_increments_and_creates_rollup_rows(db, artist, make_media, write_behind):
+    media = make_media()
+
+    write_behind.add('media', media.id, 'plays', 2)
+    write_behind.add('media', media.id, 'plays')
+    write_behind.add('artist_stats', artist.id, 'plays', 3)
+
+    assert db.session.query(Media.plays).filter_by(id=media.id).scalar() == 0
+    assert write_behind.stats()['pending'] == 6
+
+    assert write_behind.flush() == 6
+    assert db.session.query(Media.plays).filter_by(id=media.id).scalar() == 3
+    assert ArtistStats.fetch_by_artist_id(artist.id).plays == 3
+    assert write_behind.stats()['pending'] == 0 and write_behind.stats()['used'] == 0
+
+
+def test_failed_flush_puts_the_increments_back(db, artist, make_media, write_behind, monkeypatch):
+    media = make_media()
+    write = write_behind.write
+
+    def fail(increments):
+        raise RuntimeError('database unavailable')
+
+    write_behind.add('media', media.id, 'likes', 4)
+    monkeypatch.setattr(write_behind, 'write', fail)
+
+    assert write_behind.flush() == 0
+    assert write_behind.stats()['pending'] == 4 and write_behind.stats()['failures'] == 1
+
+    write_behind.add('media', media.id, 'likes')
+    monkeypatch.setattr(write_behind, 'write', write)
+
+    assert write_behind.flush() == 5
+    assert db.session.query(Media.likes).filter_by(id=media.id).scalar() == 5
@@ -1,72 +1,222 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
 import pandas
-import requests
 
+from flask import current_app
+from flask_restful import reqparse, inputs
 from sqlalchemy import func
-from mkondo import db
-from media.models import Media, Comment, Album
-from users.models import MediaUserHistory, User
+from mkondo import db, shards
+from mkondo.counters import GRANULARITIES
+from media.models import Media, Album, ArtistStats, DailyCounter, ListenerSketch
+from users.models import MediaUserHistory, User, InsightSnapshot, InsightJob
+
+
+range_parser = reqparse.RequestParser(trim=True, bundle_errors=True)
+range_parser.add_argument('from', dest='start', type=inputs.date, required=False, location='args')
+range_parser.add_argument('to', dest='end', type=inputs.date, required=False, location='args')
+range_parser.add_argument('granularity', type=str, required=False, default='day', choices=GRANULARITIES, location='args')
+
+MAX_BUCKETS = 180
+BUCKET_DAYS = {'day': 1, 'week': 7, 'month': 30}
+
+
+def time_range(args):
+    """
+    Resolve the parsed from/to/granularity arguments, defaulting to the last
+    30 days. Ranges with more than MAX_BUCKETS buckets are read from the
+    next coarser rollup, so a year of daily data is served weekly.
+    """
+    end = args['end'].date() if args.get('end') else datetime.utcnow().date()
+    start = args['start'].date() if args.get('start') else end - timedelta(days=30)
+    granularity = args.get('granularity') or 'day'
+
+    while (end - start).days / BUCKET_DAYS[granularity] > MAX_BUCKETS and granularity != GRANULARITIES[-1]:
+        granularity = GRANULARITIES[GRANULARITIES.index(granularity) + 1]
+
+    return start, end, granularity
 
 
 class ArtistInsights:
     @classmethod
-    def fetch_artist_data(cls, artist_id):
-        query = Media.query.filter_by(owner_id=artist_id).with_entities(Media.id, Media.shares, Media.likes)
-        data = db.session.query(func.sum(Media.shares), func.sum(Media.likes)).filter_by(owner_id=artist_id).all()
-        shares, likes = data[0][0], data[0][1]
-        media_ids = [media.id for media in query.all()]
-        artist_comments_count = Comment.query.filter(Comment.media_id.in_(media_ids)).count()
-        histories = MediaUserHistory.query.filter(MediaUserHistory.media_id.in_(media_ids)).all()
-        plays = 0
-
-        for h in histories:
-            plays += h.plays
-
-        ip_addresses = list(set([history.user.locality for history in histories]))
-        audience = []
-
-        for ip_address in ip_addresses:
-            result = requests.get(f'http://api.ipstack.com/{ip_address}?access_key=e17511b1b202682166e46cb188347457').json()
-            audience.append({'country': result['country_name'], 'region': result['region_name']})
-        
-        audience_data = []
-
-        for a in audience:
-            b = {'count': 0, 'country': a['country'], 'region': a['region']}
-
-            for c in audience:
-                if c['country'] == b['country'] and c['region'] == b['region']:
-                    b['count'] += 1
-            
-            if b in audience_data:
-                continue
-            else:
-                audience_data.append(b)
-        
+    def fetch_artist_data(cls, artist_id, start=None, end=None, granularity='day'):
+        stats = ArtistStats.fetch_by_artist_id(artist_id)
+
+        # Rows created by an increment only hold the deltas since then, until
+        # the reconcile job stores them the statistics are computed per read.
+        if stats is None or stats.reconciled is None:
+            stats = ArtistStats.compute(artist_id)
+
+        # Counters of a hot artist are partly held in its shards until folded.
+        sharded = shards.totals('artist_stats', artist_id)
+
         return dict(
             success=True,
-            shares=shares,
-            plays=plays,
-            likes=likes,
-            comments=artist_comments_count,
-            audience=audience_data,
+            shares=stats.shares + sharded.get('shares', 0),
+            plays=stats.plays + sharded.get('plays', 0),
+            likes=stats.likes + sharded.get('likes', 0),
+            comments=stats.comments,
+            listeners=stats.listeners,
+            media=stats.media_count,
+            audience=stats.audience,
+            **cls.fetch_series(artist_id, start, end, granularity)
+        )
+
+    @staticmethod
+    def fetch_series(artist_id, start, end, granularity):
+        """
+        Time series of the artist's media counters, summed per bucket, and
+        the distinct listeners over the range.
+        """
+        if start is None:
+            start, end, granularity = time_range({})
+
+        media_ids = db.session.query(Media.media_id).filter(Media.owner_id == artist_id)
+
+        return dict(
+            granularity=granularity,
+            start=start.isoformat(),
+            end=end.isoformat(),
+            range_listeners=ListenerSketch.estimate('artist', [artist_id], start, end) or 0,
+            series=DailyCounter.series('media', media_ids, DailyCounter.METRICS, granularity, start, end)
         )
 
 
 class UsersInsights:
+    AUDIO = 'audio'
+
     @staticmethod
-    def fetch_audio_insights():
-        albums = Album.query.all()
-        songs = Media.query.filter_by(category='audio').with_entities(Media.id, Media.owner_id).all()
-        song_ids = [song.id for song in songs]
-        listener_count = MediaUserHistory.query.filter(MediaUserHistory.media_id.in_(song_ids)).with_entities(MediaUserHistory.user_id).distinct().count()
-        publisher_count = len(list(set([album.publisher for album in albums])))
-        artist_count = len(list(set([song.owner_id for song in songs])))
-        total_users = len(User.query.all())
+    def compute_audio_insights():
+        """
+        Count artists, publishers, listeners and users in a single statement.
+        Listeners are estimated from the audio listener sketches once they
+        have been rebuilt from the history, which avoids scanning it.
+        """
+        audio = db.session.query(Media.id).filter(Media.category == 'audio')
+        artists = db.session.query(func.count(func.distinct(Media.owner_id))).filter(Media.category == 'audio')
+        publishers = db.session.query(func.count(func.distinct(Album.publisher)))
+        listeners = db.session.query(func.count(func.distinct(MediaUserHistory.user_id)))\
+            .filter(MediaUserHistory.media_id.in_(audio))
+        users = db.session.query(func.count(User.id))
+
+        estimated = ListenerSketch.estimate('category', ['audio']) if ListenerSketch.rebuilt() else None
+        counts = db.session.query(
+            artists.label('artists'),
+            publishers.label('publishers'),
+            (db.literal(estimated) if estimated is not None else listeners.as_scalar()).label('listeners'),
+            users.label('users')
+        ).one()
+
+        return counts._asdict()
+
+    @classmethod
+    def refresh_audio_insights(cls):
+        """
+        Recompute and store the audio insights snapshot.
+        """
+        return InsightSnapshot.store(cls.AUDIO, cls.compute_audio_insights())
+
+    @classmethod
+    def fetch_audio_insights(cls):
+        """
+        Serve the precomputed snapshot. A snapshot older than the TTL is
+        still served, marked stale, while a refresh is queued, at most once
+        per snapshot interval across the workers.
+        """
+        snapshot = InsightSnapshot.fetch(cls.AUDIO)
+
+        if snapshot is None:
+            snapshot = cls.refresh_audio_insights()
+
+        stale = snapshot.age() > current_app.config['INSIGHT_SNAPSHOT_TTL']
+
+        if stale and InsightSnapshot.claim(f'{cls.AUDIO}:refresh', current_app.config['INSIGHT_SNAPSHOT_INTERVAL']):
+            from mkondo.tasks import refresh_insight_snapshots
+            refresh_insight_snapshots.delay()
 
         return dict(
             success=True,
-            artists=artist_count,
-            publishers=publisher_count,
-            listeners=listener_count,
-            users=total_users
+            computed=snapshot.computed.isoformat(),
+            stale=stale,
+            **snapshot.data
         )
+
+
+class InsightReports:
+    """
+    Insight computations run as Celery jobs, keyed by a fingerprint of
+    their inputs so an unchanged report is served from the last job.
+    """
+
+    KINDS = ('artist', 'audio')
+
+    @staticmethod
+    def inputs(kind, params):
+        """
+        A cheap summary of the data a report is computed from, it changes
+        whenever the report would.
+        """
+        if kind == 'artist':
+            artist_id = params['artist_id']
+            start = datetime.strptime(params['start'], '%Y-%m-%d').date()
+            end = datetime.strptime(params['end'], '%Y-%m-%d').date()
+            stats = ArtistStats.fetch_by_artist_id(artist_id)
+            media_ids = db.session.query(Media.media_id).filter(Media.owner_id == artist_id)
+
+            # The series, sketches and shards are written ahead of the
+            # statistics row, which lags behind write behind and shards.
+            return dict(
+                stats=[getattr(stats, name) for name in ArtistStats.COUNTERS] + [str(stats.reconciled)] if stats else None,
+                series=DailyCounter.totals('media', media_ids, DailyCounter.METRICS, params['granularity'], start, end),
+                listeners=ListenerSketch.estimate('artist', [artist_id], start, end),
+                sharded=shards.totals('artist_stats', artist_id)
+            )
+
+        snapshot = InsightSnapshot.fetch(UsersInsights.AUDIO)
+
+        return str(snapshot.computed) if snapshot else None
+
+    @classmethod
+    def fingerprint(cls, kind, params):
+        """
+        Hash the report kind, its parameters and its inputs.
+        """
+        payload = json.dumps([kind, params, cls.inputs(kind, params)], sort_keys=True, default=str)
+
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def compute(kind, params):
+        """
+        Compute a report, called from the insight job task.
+        """
+        if kind == 'artist':
+            return ArtistInsights.fetch_artist_data(
+                params['artist_id'],
+                datetime.strptime(params['start'], '%Y-%m-%d').date(),
+                datetime.strptime(params['end'], '%Y-%m-%d').date(),
+                params['granularity']
+            )
+
+        return UsersInsights.fetch_audio_insights()
+
+    @classmethod
+    def submit(cls, kind, params):
+        """
+        Return the job computing a report, reusing the last one computed from
+        the same inputs, or queue a new one. The flag tells if it was reused.
+        """
+        fingerprint = cls.fingerprint(kind, params)
+        job = InsightJob.fetch_reusable(fingerprint, current_app.config['INSIGHT_JOB_TIMEOUT'])
+
+        if job:
+            return job, True
+
+        job = InsightJob(kind, params, fingerprint)
+        job.save()
+
+        from mkondo.tasks import run_insight_job
+        run_insight_job.delay(job.job_id)
+
+        return job, False
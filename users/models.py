@@ -1,11 +1,13 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
-import pandas
-import numpy
-from sklearn.model_selection import train_test_split
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select, func, desc, text
+from sqlalchemy.dialects.postgresql import JSON, insert
 
-from mkondo import db, argon_2
+from media.recommender import Interactions, index_of, jaccard_neighbors
+from mkondo import db, argon_2, geoip
 
 media_user_favourites_table = db.Table(
     'media_user_favourites',
@@ -22,6 +24,8 @@ class MediaUserHistory(db.Model):
     user_id = db.Column(db.ForeignKey('users.id'), nullable=False)
     media_id = db.Column(db.ForeignKey('media.id'), nullable=False)
     plays = db.Column(db.Integer, nullable=False, default=1)
+    last_played = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     user = db.relationship('User', back_populates='history')
     media = db.relationship('Media')
 
@@ -40,24 +44,119 @@ class MediaUserHistory(db.Model):
     def increase_plays(cls, user_id, media_id):
         user_media_history = cls.query.filter_by(user_id=user_id, media_id=media_id).first()
         user_media_history.plays = user_media_history.plays + 1
+        user_media_history.last_played = datetime.utcnow()
         db.session.add(user_media_history)
         db.session.commit()
 
     @classmethod
-    def get_train_data(cls):
-        user_history_data = pandas.read_sql_table(cls.__tablename__, con=db.engine)
-        media_data = pandas.read_sql_table('media', con=db.engine, columns=['id', 'media_id', 'plays'])
+    def record_play(cls, user_id, media_id):
+        """
+        Record one play of a media by a user, both public ids, in a single
+        statement: the media's plays are incremented, the history row is
+        upserted and the play appended to play_events. The caller commits.
+
+        Returns (user_id, id, owner_id, category, plays) with the internal
+        user and media ids, the media's owner and category and the user's
+        plays of it. Only
+        user_id is set when the media does not exist and None is returned
+        when the user does not exist.
+        """
+        return db.session.execute(text("""
+            WITH listener AS (
+                SELECT id FROM users WHERE user_id = :user_id
+            ), played AS (
+                UPDATE media SET plays = plays + 1, updated = :played
+                WHERE media_id = :media_id AND EXISTS (SELECT 1 FROM listener)
+                RETURNING id, owner_id, category
+            ), history AS (
+                INSERT INTO media_user_history (user_id, media_id, plays, last_played, updated)
+                SELECT listener.id, played.id, 1, :played, :played FROM listener, played
+                ON CONFLICT (user_id, media_id) DO UPDATE
+                SET plays = media_user_history.plays + 1, last_played = excluded.last_played, updated = excluded.updated
+                RETURNING user_id, media_id, plays
+            ), logged AS (
+                INSERT INTO play_events (user_id, media_id, played)
+                SELECT user_id, media_id, :played FROM history
+            )
+            SELECT listener.id AS user_id, played.id, played.owner_id, played.category, history.plays
+            FROM listener LEFT JOIN played ON true LEFT JOIN history ON true
+        """), dict(user_id=str(user_id), media_id=str(media_id), played=datetime.utcnow())).first()
 
-        media_df = pandas.merge(user_history_data, media_data, left_on='media_id', right_on='id', how='left')
-        media_grouped = media_df.groupby(['media_id_y']).agg({'plays_x': 'count'}).reset_index()
-        grouped_sum = media_grouped['plays_x'].sum()
-        media_grouped['percentage'] = media_grouped['plays_x'].div(grouped_sum) * 100
-        media_grouped.sort_values(['plays_x', 'media_id_y'], ascending=[0, 1])
-        users = media_df['user_id'].unique()
-        media = media_df['media_id_x'].unique()
-        train_data, test_data = train_test_split(media_df, test_size=0.20, random_state=0)
+    @classmethod
+    def record_plays(cls, user_id, plays):
+        """
+        Add a batch of plays, {media id: (plays, last played)}, to a user's
+        history with one multi row upsert, the caller commits.
+        """
+        updated = datetime.utcnow()
+        statement = insert(cls.__table__).values([
+            dict(user_id=user_id, media_id=media_id, plays=count, last_played=last_played, updated=updated)
+            for media_id, (count, last_played) in plays.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.__table__.c.user_id, cls.__table__.c.media_id],
+            set_={
+                'plays': cls.__table__.c.plays + statement.excluded.plays,
+                'last_played': func.greatest(cls.__table__.c.last_played, statement.excluded.last_played),
+                'updated': statement.excluded.updated
+            }
+        )
+        db.session.execute(statement)
+
+    @classmethod
+    def load_interactions(cls, chunk_size=100000):
+        """
+        Stream the (user, media, plays) columns through a server side cursor
+        into compact int32/float32 arrays, without loading whole tables.
+        """
+        media_table = db.metadata.tables['media']
+        user_ids, media_ids, plays = [], [], []
+
+        with db.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(
+                select([cls.user_id, cls.media_id, cls.plays])
+            )
+
+            while True:
+                rows = result.fetchmany(chunk_size)
+
+                if not rows:
+                    break
+
+                chunk = np.array([tuple(row) for row in rows], dtype=np.int64)
+                user_ids.append(chunk[:, 0].astype(np.int32))
+                media_ids.append(chunk[:, 1].astype(np.int32))
+                plays.append(chunk[:, 2].astype(np.float32))
+
+            public_media_ids = dict(connection.execute(select([media_table.c.id, media_table.c.media_id])).fetchall())
+
+        if not user_ids:
+            interactions = Interactions.from_ids(np.array([], dtype=np.int32), np.array([], dtype=str))
+            interactions.media_ids = np.array([], dtype=np.int64)
+
+            return interactions
 
-        return train_data
+        user_ids = np.concatenate(user_ids)
+        media_ids = np.concatenate(media_ids)
+        plays = np.concatenate(plays)
+
+        # Media are keyed by their public media_id, users by the internal
+        # id used by the history table. Codes index the sorted id arrays.
+        users, user_codes = np.unique(user_ids, return_inverse=True)
+        internal_media, media_codes = np.unique(media_ids, return_inverse=True)
+        public_media = np.array([public_media_ids[media_id] for media_id in internal_media.tolist()])
+        order = np.argsort(public_media)
+        position = np.empty(len(order), dtype=np.int32)
+        position[order] = np.arange(len(order), dtype=np.int32)
+
+        return Interactions(
+            user_codes.astype(np.int32),
+            position[media_codes],
+            plays,
+            users,
+            public_media[order],
+            internal_media[order]
+        )
 
     def save(self):
         db.session.add(self)
@@ -66,8 +165,8 @@ class MediaUserHistory(db.Model):
 
 genre_user_table = db.Table(
     'genre_user',
-    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), nullable=False),
-    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), nullable=False)
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), nullable=False, index=True),
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
 )
 
 
@@ -83,8 +182,11 @@ class User(db.Model):
     user_type = db.Column(db.String(50), nullable=False)
     joined = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     last_active = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     country = db.Column(db.String(50), nullable=False, default='TZ')
     locality = db.Column(db.String(50), nullable=False)
+    geo_country = db.Column(db.String(100), nullable=True)
+    geo_region = db.Column(db.String(100), nullable=True)
     avatar_url = db.Column(db.Text, nullable=True)
     cover_url = db.Column(db.Text, nullable=True)
     about = db.Column(db.Text, nullable=True)
@@ -212,6 +314,51 @@ class User(db.Model):
         """
         return cls.query.filter(user_type='creator').filter(cls.genres.any(name=genre.lower())).all()
 
+    def locate(self, ip_address):
+        """
+        Record the address the user connected from and resolve where it is.
+        """
+        self.locality = ip_address
+        self.geo_country, self.geo_region = geoip.lookup(ip_address)
+
+    @classmethod
+    def fetch_similar_artists(cls, artist, amount=10):
+        """
+        Rank the other artists by the IDF weighted Jaccard similarity of
+        their genres to the artist's, in a single query over the genre_user
+        inverted index. A genre weighs ln(1 + artists / artists in the genre)
+        so sharing a niche genre counts for more than sharing a common one.
+        """
+        creator_genres = db.session.query(genre_user_table.c.user_id, genre_user_table.c.genre_id)\
+            .join(cls, cls.id == genre_user_table.c.user_id)\
+            .filter(cls.user_type == 'creator', cls.archived == False)\
+            .distinct().cte('creator_genres')
+
+        artists = db.session.query(func.count(func.distinct(creator_genres.c.user_id))).as_scalar()
+        genre_weights = db.session.query(
+            creator_genres.c.genre_id,
+            func.ln(1.0 + db.cast(artists, db.Float) / func.count()).label('weight')
+        ).group_by(creator_genres.c.genre_id).cte('genre_weights')
+
+        artist_genres = db.session.query(genre_user_table.c.genre_id).filter(genre_user_table.c.user_id == artist.id)
+        artist_weight = db.session.query(func.coalesce(func.sum(genre_weights.c.weight), 0.0))\
+            .filter(genre_weights.c.genre_id.in_(artist_genres)).as_scalar()
+
+        weights = db.session.query(creator_genres.c.user_id, func.sum(genre_weights.c.weight).label('weight'))\
+            .join(genre_weights, genre_weights.c.genre_id == creator_genres.c.genre_id)\
+            .group_by(creator_genres.c.user_id).cte('artist_weights')
+
+        overlaps = db.session.query(creator_genres.c.user_id, func.sum(genre_weights.c.weight).label('overlap'))\
+            .join(genre_weights, genre_weights.c.genre_id == creator_genres.c.genre_id)\
+            .filter(creator_genres.c.genre_id.in_(artist_genres), creator_genres.c.user_id != artist.id)\
+            .group_by(creator_genres.c.user_id).cte('overlaps')
+
+        similarity = overlaps.c.overlap / (weights.c.weight + artist_weight - overlaps.c.overlap)
+
+        return cls.query.join(overlaps, overlaps.c.user_id == cls.id)\
+            .join(weights, weights.c.user_id == cls.id)\
+            .order_by(desc(similarity), cls.id).limit(amount).all()
+
     @classmethod
     def fetch_by_id(cls, user_id):
         """
@@ -330,3 +477,217 @@ class Follower(db.Model):
         """
         db.session.add(self)
         db.session.commit()
+
+
+class ArtistSimilarity(db.Model):
+    __tablename__ = 'artist_similarity'
+    __table_args__ = (
+        db.PrimaryKeyConstraint('artist_id', 'rank'),
+    )
+
+    artist_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    rank = db.Column(db.Integer, nullable=False)
+    similar_artist_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    refreshed = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    @classmethod
+    def fetch_similar(cls, artist, amount=10):
+        """
+        Return the precomputed co-listening neighbours of an artist, best first.
+        """
+        return User.query.join(cls, cls.similar_artist_id == User.id)\
+            .filter(cls.artist_id == artist.id, User.archived == False)\
+            .order_by(cls.rank).limit(amount).all()
+
+    @staticmethod
+    def load_listeners(chunk_size=100000):
+        """
+        Stream the distinct (listener, artist) pairs of the listening history
+        into a binary listeners x artists matrix and the sorted artist ids.
+        """
+        media_table = db.metadata.tables['media']
+        pairs = []
+
+        with db.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(
+                select([MediaUserHistory.user_id, media_table.c.owner_id])
+                .select_from(MediaUserHistory.__table__.join(media_table, media_table.c.id == MediaUserHistory.media_id))
+                .distinct()
+            )
+
+            while True:
+                rows = result.fetchmany(chunk_size)
+
+                if not rows:
+                    break
+
+                pairs.append(np.array([tuple(row) for row in rows], dtype=np.int64))
+
+        pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+        listeners, listener_codes = np.unique(pairs[:, 0], return_inverse=True)
+        artists, artist_codes = np.unique(pairs[:, 1], return_inverse=True)
+        matrix = sparse.csc_matrix(
+            (np.ones(len(pairs), dtype=np.float32), (listener_codes, artist_codes)),
+            shape=(len(listeners), len(artists))
+        )
+
+        return matrix, artists
+
+    @classmethod
+    def refresh(cls, amount=20, full=False):
+        """
+        Recompute the top co-listening neighbours of the artists whose
+        listener sets changed since the last refresh.
+
+        The Jaccard similarity of two artists only changes when one of them
+        gains a listener, and history rows are only ever added, so the
+        artists to recompute are the ones with new plays plus every artist
+        sharing a listener with them. New plays are found by the updated
+        column, last_played keeps the client time of backdated events.
+        """
+        started = datetime.utcnow()
+        watermark = None if full else db.session.query(func.max(cls.refreshed)).scalar()
+        matrix, artists = cls.load_listeners()
+
+        if watermark is None:
+            affected = np.arange(len(artists))
+        else:
+            media_table = db.metadata.tables['media']
+            changed = db.session.query(media_table.c.owner_id).distinct()\
+                .join(MediaUserHistory, MediaUserHistory.media_id == media_table.c.id)\
+                .filter(MediaUserHistory.updated >= watermark).all()
+            columns = index_of(artists, [owner_id for owner_id, in changed])
+            columns = columns[columns >= 0]
+            co_listened = (matrix[:, columns].T @ matrix).indices if len(columns) else np.array([], dtype=np.int64)
+            affected = np.union1d(columns, co_listened)
+
+        rows, neighbors, scores = jaccard_neighbors(matrix, affected, amount=amount)
+        ranks = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left') + 1
+
+        if watermark is None:
+            cls.query.delete()
+        else:
+            cls.query.filter(cls.artist_id.in_(artists[affected].tolist())).delete(synchronize_session=False)
+
+        db.session.bulk_insert_mappings(cls, [
+            dict(artist_id=int(artists[row]), rank=int(rank), similar_artist_id=int(artists[neighbor]), score=float(score), refreshed=started)
+            for row, rank, neighbor, score in zip(rows, ranks, neighbors, scores)
+        ])
+        db.session.commit()
+
+        return len(affected)
+
+
+class InsightSnapshot(db.Model):
+    __tablename__ = 'insight_snapshots'
+
+    name = db.Column(db.String(100), primary_key=True)
+    data = db.Column(JSON, nullable=False)
+    computed = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def fetch(cls, name):
+        """
+        Fetch a snapshot by name.
+        """
+        return cls.query.filter_by(name=name).first()
+
+    @classmethod
+    def store(cls, name, data):
+        """
+        Save a freshly computed snapshot, replacing the previous one.
+        """
+        snapshot = db.session.merge(cls(name=name, data=data, computed=datetime.utcnow()))
+        db.session.commit()
+
+        return snapshot
+
+    @classmethod
+    def claim(cls, name, seconds):
+        """
+        Take the marker row name for seconds with one atomic upsert, returns
+        False while another process holds it.
+        """
+        now = datetime.utcnow()
+        statement = insert(cls.__table__).values(name=name, data={}, computed=now)
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.__table__.c.name],
+            set_={'computed': statement.excluded.computed},
+            where=cls.__table__.c.computed <= now - timedelta(seconds=seconds)
+        ).returning(cls.__table__.c.name)
+        claimed = db.session.execute(statement).first() is not None
+        db.session.commit()
+
+        return claimed
+
+    def age(self):
+        """
+        Seconds since the snapshot was computed.
+        """
+        return (datetime.utcnow() - self.computed).total_seconds()
+
+
+class InsightJob(db.Model):
+    __tablename__ = 'insight_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(50), nullable=False, unique=True, index=True)
+    kind = db.Column(db.String(20), nullable=False)
+    params = db.Column(JSON, nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    result = db.Column(JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished = db.Column(db.DateTime, nullable=True)
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, kind, params, fingerprint):
+        self.job_id = str(uuid.uuid4())
+        self.kind = kind
+        self.params = params
+        self.fingerprint = fingerprint
+        self.status = self.PENDING
+
+    @classmethod
+    def fetch_by_id(cls, job_id):
+        """
+        Fetch a job by its public job id.
+        """
+        return cls.query.filter_by(job_id=job_id).first()
+
+    @classmethod
+    def fetch_reusable(cls, fingerprint, timeout):
+        """
+        Return the latest job computed from the same inputs, or being
+        computed if it was queued less than timeout seconds ago, a job
+        pending or running for longer is assumed lost.
+        """
+        queued_after = datetime.utcnow() - timedelta(seconds=timeout)
+
+        return cls.query.filter(
+            cls.fingerprint == fingerprint,
+            (cls.status == cls.DONE) | (cls.status.in_([cls.PENDING, cls.RUNNING]) & (cls.created > queued_after))
+        ).order_by(desc(cls.created)).first()
+
+    def finish(self, result=None, error=None):
+        """
+        Store the outcome of the job.
+        """
+        self.status = self.FAILED if error else self.DONE
+        self.result = result
+        self.error = error
+        self.finished = datetime.utcnow()
+        self.save()
+
+    def save(self):
+        """
+        Save the job to the database.
+        """
+        db.session.add(self)
+        db.session.commit()
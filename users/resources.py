@@ -6,18 +6,19 @@ from datetime import timedelta
 from flask import render_template
 from flask_cors import cross_origin
 from flask_jwt_extended import create_access_token, decode_token
-from flask_restful import Resource, reqparse, request
+from flask_restful import Resource, reqparse, request, inputs
 from marshmallow.fields import Boolean
 from sqlalchemy.sql import or_
 
-from media.models import Media, Genre
+from media.models import Media, Genre, ArtistStats, ListenerSketch
 from media.schemas import MediaSchema
-from mkondo import sendgrid, argon_2, pagination
+from mkondo import db, sendgrid, argon_2, pagination, recommendation_cache, counters
+from mkondo.counters import GRANULARITIES
 from mkondo.security import authorized_users
 from mkondo.tasks import send_mail
-from .models import User, ResetToken, MediaUserHistory, Follower
+from .models import User, ResetToken, MediaUserHistory, Follower, ArtistSimilarity, InsightJob
 from .schemas import UserSchema, ArtistSchema
-from users.insights import ArtistInsights, UsersInsights
+from users.insights import ArtistInsights, UsersInsights, InsightReports, range_parser, time_range
 
 user_schema = UserSchema()
 users_schema = UserSchema(many=True)
@@ -67,6 +68,7 @@ class UserListResource(Resource):
 
         user_data = user_schema.load(json_data)
         user = User(**user_data)
+        user.locate(request.remote_addr)
 
         try:
             user.save()
@@ -290,6 +292,12 @@ class UserLoginResource(Resource):
                        'message': 'username and password do not match.'
                    }, 400
 
+        # Also retried while the address is unresolved, the GeoIP database
+        # may have been built since.
+        if user.locality != request.remote_addr or user.geo_country is None:
+            user.locate(request.remote_addr)
+            user.save()
+
         access_token = create_access_token(user, fresh=True, expires_delta=timedelta(weeks=12.0))
 
         return {
@@ -591,37 +599,36 @@ class UserMediaHistoryResource(Resource):
     @staticmethod
     def post(user_id):
         json_data = UserMediaHistoryResource.parser.parse_args()
-        user = User.fetch_by_id(user_id)
 
-        if not user:
+        try:
+            play = MediaUserHistory.record_play(user_id, json_data['media_id'])
+
+            if play and play.id:
+                ArtistStats.record_play(play, play.user_id, new_listener=play.plays == 1)
+                db.session.commit()
+        except:
+            db.session.rollback()
+
+            return {
+                       'success': False,
+                       'message': 'There was an error adding the media to history'
+                   }, 500
+
+        if not play:
             return {
                        'success': False,
                        'message': 'User not found'
                    }, 404
 
-        media = Media.fetch_by_id(json_data['media_id'])
-
-        if not media:
+        if not play.id:
             return {
                        'success': False,
                        'message': 'Media not found'
                    }, 404
 
-        media.plays = media.plays + 1
-
-        if MediaUserHistory.exists(user.id, media.id):
-            MediaUserHistory.increase_plays(user.id, media.id)
-        else:
-            user_history = MediaUserHistory(user.id, media.id)
-
-            try:
-                media.save()
-                user_history.save()
-            except:
-                return {
-                           'success': False,
-                           'message': 'There was an error adding the media to history'
-                       }, 500
+        recommendation_cache.invalidate(user_id)
+        counters.add('media', json_data['media_id'], 'plays')
+        ListenerSketch.record(play.user_id, play.id, play.owner_id, play.category)
 
         return {
                    'success': True,
@@ -817,7 +824,9 @@ class ArtistInsightsResource(Resource):
                 'message': 'There is no artist with the provided id'
             }, 404
 
-        return ArtistInsights.fetch_artist_data(artist.id)
+        start, end, granularity = time_range(range_parser.parse_args())
+
+        return ArtistInsights.fetch_artist_data(artist.id, start, end, granularity)
 
 
 class AudioUsersInsightsResource(Resource):
@@ -826,6 +835,65 @@ class AudioUsersInsightsResource(Resource):
         return UsersInsights.fetch_audio_insights()
 
 
+class InsightJobListResource(Resource):
+    parser = reqparse.RequestParser(trim=True, bundle_errors=True)
+    parser.add_argument('kind', type=str, required=True, choices=InsightReports.KINDS, location='json')
+    parser.add_argument('artist_id', type=str, required=False, location='json')
+    parser.add_argument('from', dest='start', type=inputs.date, required=False, location='json')
+    parser.add_argument('to', dest='end', type=inputs.date, required=False, location='json')
+    parser.add_argument('granularity', type=str, required=False, default='day', choices=GRANULARITIES, location='json')
+
+    @staticmethod
+    @authorized_users(['SA', 'A', 'C'])
+    def post():
+        json_data = InsightJobListResource.parser.parse_args()
+        params = {}
+
+        if json_data['kind'] == 'artist':
+            artist = User.fetch_artist_by_id(json_data['artist_id'])
+
+            if not artist:
+                return {
+                    'success': False,
+                    'message': 'There is no artist with the provided id'
+                }, 404
+
+            start, end, granularity = time_range(json_data)
+            params = dict(artist_id=artist.id, start=start.isoformat(), end=end.isoformat(), granularity=granularity)
+
+        job, reused = InsightReports.submit(json_data['kind'], params)
+
+        return {
+            'success': True,
+            'job_id': job.job_id,
+            'status': job.status
+        }, 200 if reused else 202
+
+
+class InsightJobResource(Resource):
+    @staticmethod
+    @authorized_users(['SA', 'A', 'C'])
+    def get(job_id):
+        job = InsightJob.fetch_by_id(job_id)
+
+        if not job:
+            return {
+                'success': False,
+                'message': 'Insight job not found'
+            }, 404
+
+        return {
+            'success': True,
+            'job_id': job.job_id,
+            'kind': job.kind,
+            'status': job.status,
+            'created': job.created.isoformat(),
+            'finished': job.finished.isoformat() if job.finished else None,
+            'result': job.result,
+            'error': job.error
+        }, 200
+
+
 class UserMediaResource(Resource):
     @staticmethod
     def get(user_id):
@@ -852,8 +920,12 @@ class UserMediaResource(Resource):
 
 
 class SimilarArtistsResource(Resource):
+    parser = reqparse.RequestParser(trim=True)
+    parser.add_argument('mode', type=str, required=False, default='genre', choices=('genre', 'listening'), location='args')
+
     @staticmethod
     def get(artist_id):
+        args = SimilarArtistsResource.parser.parse_args()
         artist = User.fetch_artist_by_id(artist_id)
 
         if not artist:
@@ -862,32 +934,10 @@ class SimilarArtistsResource(Resource):
                 'message': 'Artist not found'
             }, 404
         
-        artist_genres = artist.genres
-        artists = User.query.filter_by(user_type='creator').filter(User.id != artist.id).filter()
-        
-        similar_artists = []
-
-        for artist in artists:
-            if len(similar_artists) == 10:
-                break
-            if len(artist.genres) == 0:
-                continue
-            if artist.genres == artist_genres:
-                similar_artists.append(artist)
-            elif len(artist_genres) < len(artist.genres):
-                g = artist.genres
-                genres = artist.genres[0:len(artist_genres)]
-                if genres == artist_genres:
-                    similar_artists.append(artist)
-                elif lambda artist_genres, g: any(i in g for i in artist_genres)(artist_genres, g):
-                    similar_artists.append(artist)
-            elif len(artist.genres) < len(artist_genres):
-                g = artist.genres
-                genres = artist_genres[0:len(artist.genres)]
-                if genres == artist.genres:
-                    similar_artists.append(artist)
-                elif lambda g, artist_genres: any(i in artist_genres for i in g)(g, artist_genres):
-                    similar_artists.append(artist)
+        if args['mode'] == 'listening':
+            similar_artists = ArtistSimilarity.fetch_similar(artist)
+        else:
+            similar_artists = User.fetch_similar_artists(artist)
 
         if len(similar_artists) == 0:
             return {
@@ -1,6 +1,10 @@
 from flask_cors import CORS
 
 from app import init_app
+from mkondo import celery
+
+# The celery app is exported for 'celery -A wsgi worker'.
+__all__ = ['app', 'celery']
 
 app = init_app()
 